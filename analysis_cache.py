@@ -0,0 +1,135 @@
+"""
+Analysis Result Cache
+Persistent, size-bounded SQLite cache of design analysis results keyed on image content
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "CRYSTALVIZ_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "crystalviz")
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DESIGN_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "design_rules.py")
+
+
+def rules_fingerprint(path=DESIGN_RULES_PATH):
+    """Hash the design rules source so cached analyses expire when the rules change"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return "unknown"
+
+
+def image_digest(image):
+    """Hash decoded image content (raw bytes or a NumPy array including its shape)"""
+    digest = hashlib.sha256()
+    if hasattr(image, "tobytes"):
+        digest.update(repr((getattr(image, "shape", None), str(getattr(image, "dtype", "")))).encode())
+        digest.update(image.tobytes())
+    else:
+        digest.update(bytes(image))
+    return digest.hexdigest()
+
+
+def analysis_key(image, model_id, prompts, precision=None, max_new_tokens=None):
+    """Build the cache key for one image analysed by one model with a prompt set
+
+    precision and max_new_tokens are part of the key, since int8 or shorter
+    answers must not be served for full-precision or longer requests.
+    """
+    payload = json.dumps([image_digest(image), model_id, list(prompts), precision, max_new_tokens])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AnalysisCache:
+    """Content-addressed result cache with LRU eviction by total stored size"""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, rules_version=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "analysis.sqlite")
+        self.max_bytes = max_bytes
+        self.rules_version = rules_version or rules_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._check_rules_version(self.rules_version)
+        self._conn.commit()
+
+    def _check_rules_version(self, version):
+        """Drop every entry if the design rules changed since they were cached"""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'rules_version'").fetchone()
+        if row is None or row[0] != version:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('rules_version', ?)", (version,)
+            )
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store a JSON-serialisable value and evict least recently used entries"""
+        encoded = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, encoded, len(encoded), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self):
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
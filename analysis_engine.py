@@ -0,0 +1,199 @@
+"""
+Batched Design Analysis Engine
+Runs a set of analysis prompts against one image in a single batched model call
+
+For LLaVA, the vision tower runs once per distinct image in a batch and its
+features are shared by every prompt row of that image; the language model still
+processes each row's image tokens and prompt.
+"""
+
+import os
+
+import cv2
+from PIL import Image
+
+from perf_trace import stage
+
+# LLaVA 1.5 conversation template; the image placeholder is expanded by the processor
+LLAVA_PROMPT_TEMPLATE = "USER: <image>\n{prompt} ASSISTANT:"
+# Always passed to generate(): the generation config's max_length (20) is shorter than
+# the hundreds of tokens an image expands to, which transformers rejects
+DEFAULT_MAX_NEW_TOKENS = 200
+# Cap on (image, prompt) rows per generate call: each LLaVA row carries a 576-token image
+# prefix and its key/value cache. Unset: the size of the largest prompt set in the call
+MODEL_BATCH_ROWS = int(os.environ.get("CRYSTALVIZ_MODEL_BATCH_ROWS") or 0) or None
+
+
+class BatchingUnavailable(RuntimeError):
+    """The pipeline cannot run batched generation; callers use per-prompt calls instead"""
+
+
+def to_pil_rgb(image):
+    """Convert an OpenCV BGR array (or an existing PIL image) to an RGB PIL image"""
+    if isinstance(image, Image.Image):
+        return image.convert("RGB")
+    if image.ndim == 2:
+        return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_GRAY2RGB))
+    return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+
+def format_llava_prompt(prompt):
+    """Wrap a plain question in the LLaVA conversation template"""
+    return LLAVA_PROMPT_TEMPLATE.format(prompt=prompt)
+
+
+def result_title(index):
+    """Title used for the n-th analysis result (0-based index)"""
+    return f"Analysis {index + 1}"
+
+
+def _shares_image_features(processor, model):
+    """Whether image features can be computed separately and passed to generate()
+
+    Needs a LLaVA-style processor that expands image tokens itself, and a
+    transformers release whose generate() accepts pre-encoded mm_encoder_outputs.
+    """
+    return (
+        all(hasattr(processor, name) for name in ("image_processor", "image_token", "replace_image_token"))
+        and hasattr(model, "get_image_features")
+        and getattr(model, "_supports_mm_encoder_outputs", lambda: False)()
+    )
+
+
+def _encode_images_once(processor, model, images, texts):
+    """generate() inputs whose rows share one vision-tower pass per distinct image
+
+    Rows that pass the same image object reuse its projected features instead of
+    each row's pixels going through the vision tower again.
+    """
+    import torch
+    from transformers.modeling_outputs import BaseModelOutputWithPooling
+
+    distinct = {}
+    for image in images:
+        distinct.setdefault(id(image), (len(distinct), image))
+    index = [distinct[id(image)][0] for image in images]
+    image_inputs = processor.image_processor([image for _, image in distinct.values()], return_tensors="pt")
+
+    # Expand each row's <image> placeholder to the image's token count, as the processor would
+    texts = [
+        text.replace(processor.image_token, processor.replace_image_token(image_inputs, i))
+        for text, i in zip(texts, index)
+    ]
+    inputs = processor.tokenizer(texts, padding=True, return_tensors="pt").to(model.device)
+    with torch.inference_mode():
+        features = model.get_image_features(
+            pixel_values=image_inputs["pixel_values"].to(model.device, model.dtype),
+            vision_feature_layer=model.config.vision_feature_layer,
+            vision_feature_select_strategy=model.config.vision_feature_select_strategy,
+        ).pooler_output
+    inputs["mm_encoder_outputs"] = {"image": BaseModelOutputWithPooling(pooler_output=[features[i] for i in index])}
+    return inputs
+
+
+def generate_batch(pipe, images, prompts, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+    """Run one batched generate call over matching lists of images and prompts
+
+    Returns the generated answer for each (image, prompt) pair, in order, without
+    the echoed prompt. Rows that pass the same image object share one vision
+    encoding (LLaVA on transformers releases that accept pre-encoded images);
+    otherwise the processor encodes every row's image. Raises BatchingUnavailable
+    if the pipeline does not expose a multimodal processor that supports batching.
+    """
+    import torch
+
+    processor = getattr(pipe, "processor", None)
+    if processor is None:
+        raise BatchingUnavailable("Pipeline has no processor; batched generation unavailable")
+
+    tokenizer = getattr(processor, "tokenizer", None)
+    if tokenizer is not None:
+        # Decoder-only models must be left padded so every row ends at the generation point
+        tokenizer.padding_side = "left"
+
+    texts = [format_llava_prompt(prompt) for prompt in prompts]
+    if _shares_image_features(processor, pipe.model):
+        inputs = _encode_images_once(processor, pipe.model, images, texts)
+    else:
+        try:
+            inputs = processor(images=images, text=texts, padding=True, return_tensors="pt")
+        except TypeError as e:
+            # Processors without a joint images/text call (non-LLaVA models)
+            raise BatchingUnavailable(f"Processor does not support batched image and text input: {e}") from e
+        inputs = inputs.to(pipe.model.device)
+
+    with torch.inference_mode():
+        output_ids = pipe.model.generate(**inputs, max_new_tokens=max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
+
+    # Rows are left padded to the same length, so every answer starts at the same column
+    answer_ids = output_ids[:, inputs["input_ids"].shape[1]:]
+    return [text.strip() for text in processor.batch_decode(answer_ids, skip_special_tokens=True)]
+
+
+def _analyze_sequential(pipe, image, prompts, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, trace=None):
+    """Fallback path: one pipeline call per prompt, matching the original behaviour"""
+    results = {}
+    for i, prompt in enumerate(prompts):
+        try:
+            with stage(f"model.prompt_{i + 1}", trace, page="vision_model"):
+                results[result_title(i)] = pipe(
+                    image, prompt=prompt, max_new_tokens=max_new_tokens or DEFAULT_MAX_NEW_TOKENS
+                )[0]["generated_text"]
+        except Exception as e:
+            results[result_title(i)] = f"Error: {e}"
+    return results
+
+
+def analyze_requests(pipe, requests, batch_size=None, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, trace=None):
+    """Analyze several (image, prompts) requests using bounded, padded model batches
+
+    Every (image, prompt) pair becomes one row; rows from different requests are
+    mixed freely and grouped into batches of at most batch_size rows (default:
+    CRYSTALVIZ_MODEL_BATCH_ROWS, else the size of the largest prompt set). Returns one {"Analysis N": text} dict per
+    request, in input order. Each generate call (or, on the fallback path, each
+    prompt) is timed as a stage of trace, or of the process metrics without one.
+    Only pipelines that cannot batch fall back to per-prompt calls; any other
+    error from the batched path propagates.
+    """
+    requests = [(to_pil_rgb(image), list(prompts)) for image, prompts in requests]
+    rows = [(i, j) for i, (_, prompts) in enumerate(requests) for j in range(len(prompts))]
+    batch_size = batch_size or MODEL_BATCH_ROWS or max((len(prompts) for _, prompts in requests), default=1)
+
+    results = [{} for _ in requests]
+    try:
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            with stage("model.generate_batch", trace, page="vision_model"):
+                texts = generate_batch(
+                    pipe,
+                    [requests[i][0] for i, _ in chunk],
+                    [requests[i][1][j] for i, j in chunk],
+                    max_new_tokens
+                )
+            for (i, j), text in zip(chunk, texts):
+                results[i][result_title(j)] = text
+    except BatchingUnavailable:
+        # Older transformers releases or non-LLaVA models: fall back to per-prompt calls
+        return [_analyze_sequential(pipe, image, prompts, max_new_tokens, trace) for image, prompts in requests]
+
+    # Restore prompt order within each result map
+    return [
+        {result_title(j): result[result_title(j)] for j in range(len(prompts))}
+        for result, (_, prompts) in zip(results, requests)
+    ]
+
+
+def analyze_images(pipe, images, prompts, batch_size=None, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+    """Analyze several images against the same prompts; one result dict per image"""
+    prompts = list(prompts)
+    return analyze_requests(pipe, [(image, prompts) for image in images], batch_size, max_new_tokens)
+
+
+def analyze_image(pipe, image, prompts, batch_size=None, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+    """Analyze one image against every prompt, batching the prompts together
+
+    The image is converted to RGB once and, for LLaVA, encoded by the vision tower
+    once for all of its prompt rows. Returns a dict of {"Analysis N": text} in
+    prompt order.
+    """
+    return analyze_images(pipe, [image], prompts, batch_size, max_new_tokens)[0]
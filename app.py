@@ -1,17 +1,38 @@
-import streamlit as st
-import cv2
-import pytesseract
-import numpy as np
-from transformers import pipeline
+from import_budget import timed_imports, import_report
+
+# OpenCV and the Tesseract bindings are imported once an image is uploaded
+with timed_imports("startup"):
+    import streamlit as st
+    from model_registry import ModelRegistry
+    from inference_server import make_vision_batcher
+    from analysis_cache import AnalysisCache
+    from perf_trace import Trace, METRICS_PORT, start_metrics_server
 
 st.set_page_config(page_title="AI Design Rater", layout="wide")
 
-# Initialize model
+# Initialize model (loaded on first analysis, not at startup)
 @st.cache_resource
-def load_model():
-    return pipeline("image-to-text", model="llava-hf/llava-1.5-7b-hf")
+def get_vision_batcher():
+    # Shared across sessions so concurrent uploads are batched together
+    return make_vision_batcher(ModelRegistry())
 
-llava = load_model()
+@st.cache_resource
+def get_analysis_cache():
+    return AnalysisCache()
+
+@st.cache_resource
+def get_ocr_cache():
+    # Same on-disk OCR cache as the Text Extractor page
+    from ocr_engine import open_ocr_cache
+    return open_ocr_cache()
+
+@st.cache_resource
+def get_metrics_server():
+    # Prometheus endpoint on CRYSTALVIZ_METRICS_PORT, started once per process
+    return start_metrics_server() if METRICS_PORT else None
+
+get_metrics_server()
+trace = Trace("Design Rater")
 
 # UI
 st.title("📊 AI Design Quality Rater")
@@ -20,6 +41,10 @@ st.subheader("Upload an image of your table/graph for instant feedback")
 uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "png", "jpeg"])
 
 if uploaded_file is not None:
+    with timed_imports("Design Rater"):
+        from ocr_engine import cached_ocr_image_words
+        from preprocessing import decode_image, prepare_model_image
+    
     # Display image
     col1, col2 = st.columns(2)
     
@@ -29,9 +54,11 @@ if uploaded_file is not None:
     with col2:
         with st.spinner("Analyzing design..."):
             # Process image
-            image = cv2.imdecode(np.frombuffer(uploaded_file.read(), cv2.IMREAD_COLOR), cv2.IMREAD_COLOR)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            text = pytesseract.image_to_string(gray)
+            # Decode once; the OCR and model inputs are both derived from this buffer
+            with trace.stage("decode"):
+                image = decode_image(uploaded_file.getvalue())
+            with trace.stage("ocr"):
+                text = cached_ocr_image_words(image, get_ocr_cache())["text"]
             
             # Get feedback
             prompt = """Analyze this table/graph design and:
@@ -39,7 +66,20 @@ if uploaded_file is not None:
             2. Check alignment, whitespace, fonts
             3. Suggest improvements"""
             
-            feedback = llava(image, prompt=prompt)[0]["generated_text"]
+            cache = get_analysis_cache()
+            with trace.stage("cache_lookup"):
+                cache_key = get_vision_batcher().cache_key(image, [prompt])
+                cached = cache.get(cache_key)
+            if cached is None:
+                with trace.stage("preprocess"):
+                    model_image = prepare_model_image(image)
+                with trace.stage("model"):
+                    feedback = get_vision_batcher().submit((model_image, [prompt])).result()["Analysis 1"]
+                # Failed runs are not cached, so the next upload retries the model
+                if not str(feedback).startswith("Error:"):
+                    cache.put(cache_key, {"feedback": feedback})
+            else:
+                feedback = cached["feedback"]
             
             st.success("Analysis Complete!")
             st.subheader("Design Feedback")
@@ -47,6 +87,12 @@ if uploaded_file is not None:
             
             st.subheader("Extracted Text")
             st.text(text)
+            
+            trace.finish()
+            with st.expander(f"⏱️ Performance ({trace.total_seconds() * 1000:.0f} ms)"):
+                st.dataframe(trace.rows(), hide_index=True)
+                st.caption("Startup report: import time on first use in this server process")
+                st.dataframe(import_report(), hide_index=True)
 
 # Streamlit CSS customization
 st.markdown("""
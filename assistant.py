@@ -0,0 +1,97 @@
+"""
+AI Assistant Generation
+Builds assistant prompts and streams text-generation output with latency statistics
+
+Each prompt is a fixed instruction prefix, the design rules most relevant to
+the question (retrieved by rule_index) and the question. The retrieved rules
+keep prompts short, so there is no fixed preamble long enough to be worth
+caching its attention key/values across turns.
+"""
+
+import threading
+import time
+
+from rule_index import DEFAULT_K, relevant_rules, rule_label
+
+# Identical for every turn; the retrieved rules and the question follow it
+ASSISTANT_PREFIX = """You are an expert data visualization consultant.
+Provide practical, actionable advice based on the professional design standards below.
+"""
+QUESTION_TEMPLATE = "\nDesign standards:\n{rules}\n\nQuestion: {question}\nAnswer:"
+
+def build_assistant_prompt(question, k=DEFAULT_K):
+    """Fixed prefix, the top-k design rules for the question, then the question"""
+    rules = "\n".join(f"- {rule_label(rule)}" for rule in relevant_rules(question, k))
+    return ASSISTANT_PREFIX + QUESTION_TEMPLATE.format(rules=rules, question=question)
+
+
+def _make_streamer(tokenizer, stats, start):
+    """TextIteratorStreamer that also records time-to-first-token and token count"""
+    from transformers import TextIteratorStreamer
+
+    class TimedStreamer(TextIteratorStreamer):
+        def put(self, value):
+            is_prompt = self.skip_prompt and self.next_tokens_are_prompt
+            if not is_prompt:
+                if stats["tokens"] == 0:
+                    stats["ttft_seconds"] = time.perf_counter() - start
+                stats["tokens"] += value.numel()
+            super().put(value)
+
+    return TimedStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+
+def stream_generate(pipe, prompt, max_length=300, stats=None):
+    """Yield generated text incrementally from a text-generation pipeline
+
+    Generation runs in a background thread. If a stats dict is passed it is filled
+    with ttft_seconds, tokens, total_seconds and tokens_per_second as output arrives.
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"ttft_seconds": None, "tokens": 0, "total_seconds": None, "tokens_per_second": None})
+
+    tokenizer = pipe.tokenizer
+    start = time.perf_counter()
+    streamer = _make_streamer(tokenizer, stats, start)
+    inputs = tokenizer(prompt, return_tensors="pt").to(pipe.model.device)
+    errors = []
+
+    def generate():
+        try:
+            pipe.model.generate(
+                **inputs,
+                streamer=streamer,
+                max_length=max_length,
+                pad_token_id=tokenizer.eos_token_id
+            )
+        except Exception as e:
+            errors.append(e)
+            # Unblock the consumer, which would otherwise wait on the streamer forever
+            streamer.end()
+
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    for chunk in streamer:
+        if chunk:
+            yield chunk
+    thread.join()
+
+    if errors:
+        raise errors[0]
+
+    stats["total_seconds"] = time.perf_counter() - start
+    if stats["ttft_seconds"] is not None and stats["tokens"] > 1:
+        decode_seconds = stats["total_seconds"] - stats["ttft_seconds"]
+        stats["tokens_per_second"] = (stats["tokens"] - 1) / decode_seconds if decode_seconds else None
+
+
+def format_stats(stats):
+    """Short caption describing generation latency"""
+    parts = []
+    if stats.get("ttft_seconds") is not None:
+        parts.append(f"first token {stats['ttft_seconds']:.2f}s")
+    if stats.get("tokens_per_second") is not None:
+        parts.append(f"{stats['tokens_per_second']:.1f} tokens/sec")
+    if stats.get("tokens"):
+        parts.append(f"{stats['tokens']} tokens")
+    return "⏱️ " + " · ".join(parts) if parts else ""
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+CrystalViz Batch Analyzer
+Score a directory (or manifest) of chart and table images from the command line
+
+Runs the same OCR and design analysis as the Design Analyzer page and streams one
+JSON object per image to a JSONL file. Examples:
+
+    python batch_analyze.py screenshots/ -o results.jsonl
+    python batch_analyze.py manifest.txt -o results.jsonl --resume
+    python batch_analyze.py screenshots/ --no-model --workers 8
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def find_images(source):
+    """List image paths from a directory tree or a manifest file
+
+    A manifest is either one path per line or JSONL with a "path" field; relative
+    paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+
+def _failed(analysis):
+    """Whether any answer is a model error; such analyses are neither cached nor resumed"""
+    return any(str(r).startswith("Error:") for r in analysis.values())
+
+
+def load_checkpoint(output_path):
+    """Paths already recorded in an existing output file
+
+    Records with an "error" or "ocr_error" field (unreadable image, failed model
+    batch, failed OCR) or an analysis containing model errors are not counted,
+    so a resumed run retries them.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                failed = record.get("ocr_error") or _failed(record.get("analysis") or {})
+                if "error" not in record and not failed:
+                    done.add(record["path"])
+            except (ValueError, KeyError):
+                # A partially written final line from an interrupted run
+                continue
+    return done
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def submit_ahead(pool, fn, items, batch_size, window):
+    """Yield (item, future) batches in order, keeping up to window items submitted ahead
+
+    Later batches run in the pool while the caller handles the current one, instead
+    of the pool idling until the next batch is submitted.
+    """
+    items = iter(items)
+    in_flight = deque()
+
+    def fill():
+        for item in itertools.islice(items, max(window - len(in_flight), 0)):
+            in_flight.append((item, pool.submit(fn, item)))
+
+    fill()
+    while in_flight:
+        batch = [in_flight.popleft() for _ in range(min(batch_size, len(in_flight)))]
+        fill()
+        yield batch
+
+
+def analyze_batch(paths, ocr_texts, registry, cache, prompts, model_batch_size, skip_obvious=True,
+                  max_new_tokens=None, classifications=None):
+    """Run design analysis for one batch of images, consulting the result cache
+
+    With prompts=None each image is classified and gets the table or graph prompt
+    set; obvious cases (see image_classifier.rule_based_results) skip the model
+    unless skip_obvious is False. classifications maps paths to labels already
+    computed by audit_file, so those images are not classified again.
+    """
+    from analysis_cache import analysis_key
+    from analysis_engine import DEFAULT_MAX_NEW_TOKENS, analyze_requests
+    from image_classifier import classify_image, prompts_for, rule_based_results
+    from model_registry import LLAVA_MODEL_ID
+    from preprocessing import decode_image, prepare_model_image
+
+    records = {}
+    classifications = dict(classifications or {})
+    pending = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                image = decode_image(f.read())
+        except (OSError, ValueError):
+            records[path] = {"path": path, "error": "Could not read image"}
+            continue
+        if path not in classifications:
+            classification = classify_image(image)
+            classifications[path] = {key: classification[key] for key in ("label", "confidence", "scores")}
+        classification = classifications[path]
+        image_prompts = prompts or prompts_for(classification["label"])
+        key = analysis_key(image, LLAVA_MODEL_ID, image_prompts, registry.precision("image_to_text"),
+                           max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
+        cached = cache.get(key)
+        quick = rule_based_results(classification) if skip_obvious and prompts is None else None
+        if cached is not None:
+            records[path] = {"path": path, "analysis": cached, "cached": True}
+        elif quick is not None:
+            records[path] = {"path": path, "analysis": quick, "cached": False, "model": False}
+        else:
+            pending.append((path, image, image_prompts, key))
+
+    if pending:
+        pipe = registry.get("image_to_text")
+        requests = [(prepare_model_image(image), image_prompts) for _, image, image_prompts, _ in pending]
+        analyses = analyze_requests(pipe, requests, model_batch_size, max_new_tokens or DEFAULT_MAX_NEW_TOKENS)
+        for (path, _, _, key), analysis in zip(pending, analyses):
+            if not _failed(analysis):
+                cache.put(key, analysis)
+            records[path] = {"path": path, "analysis": analysis, "cached": False}
+
+    for path in paths:
+        if path in classifications:
+            records[path]["classification"] = classifications[path]
+        if path in ocr_texts:
+            records[path]["text"] = ocr_texts[path]
+    return [records[path] for path in paths]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch design analysis for chart and table images")
+    parser.add_argument("source", help="Directory of images, or a manifest file listing image paths")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file to write results to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="OCR worker processes")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per vision-model batch")
+    parser.add_argument("--lookahead", type=int, default=None,
+                        help="Images submitted for OCR ahead of the current batch (default: 2 per worker)")
+    parser.add_argument("--model-batch-size", type=int, default=None,
+                        help="Maximum (image, prompt) rows per generate call "
+                             "(default: CRYSTALVIZ_MODEL_BATCH_ROWS, else one prompt set)")
+    parser.add_argument("--max-new-tokens", type=int, default=None,
+                        help="Tokens generated per answer (default: analysis_engine.DEFAULT_MAX_NEW_TOKENS)")
+    parser.add_argument("--resume", action="store_true", help="Skip images already in the output file")
+    parser.add_argument("--no-model", action="store_true", help="Only run OCR, skip the vision model")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip OCR")
+    parser.add_argument("--general-prompts", action="store_true",
+                        help="Use the general prompt set for every image instead of routing by image type")
+    parser.add_argument("--always-model", action="store_true",
+                        help="Run the vision model even when the classifier settles the result")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    paths = find_images(args.source)
+    done = load_checkpoint(args.output) if args.resume else set()
+    todo = [path for path in paths if path not in done]
+    print(f"Found {len(paths)} images, {len(todo)} to process", file=sys.stderr)
+    if not todo:
+        return 0
+
+    registry = cache = prompts = None
+    if not args.no_model:
+        from analysis_cache import AnalysisCache
+        from design_rules import get_general_analysis_prompts
+        from model_registry import ModelRegistry
+        registry = ModelRegistry()
+        cache = AnalysisCache()
+        prompts = get_general_analysis_prompts() if args.general_prompts else None
+
+    from misleading_detector import audit_file
+
+    lookahead = args.lookahead if args.lookahead is not None else 2 * args.workers
+    processed = 0
+    start = time.perf_counter()
+    mode = "a" if args.resume else "w"
+    with open(args.output, mode) as out, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if out.tell() and not _ends_with_newline(args.output):
+            # Start after an interrupted run's partial last line rather than on it
+            out.write("\n")
+        # OCR and pixel measurements run per file in the process pool, ahead of the model batches
+        audit = partial(audit_file, ocr=not args.no_ocr)
+        for submitted in submit_ahead(pool, audit, todo, args.batch_size, args.batch_size + lookahead):
+            batch = [path for path, _ in submitted]
+            ocr_texts = {}
+            audits = {}
+            errors = {}
+            for path, future in submitted:
+                try:
+                    audits[path] = future.result()[1]
+                except Exception as e:
+                    errors[path] = str(e)
+                    continue
+                if audits[path]["text"] is not None:
+                    ocr_texts[path] = audits[path]["text"]
+                if audits[path]["ocr_error"]:
+                    errors[path] = audits[path]["ocr_error"]
+
+            if args.no_model:
+                records = [{"path": path, "text": ocr_texts.get(path, "")} for path in batch]
+                for record in records:
+                    if record["path"] in audits:
+                        record["classification"] = audits[record["path"]]["classification"]
+            else:
+                try:
+                    records = analyze_batch(
+                        batch, ocr_texts, registry, cache, prompts, args.model_batch_size,
+                        skip_obvious=not args.always_model, max_new_tokens=args.max_new_tokens,
+                        classifications={path: audit["classification"] for path, audit in audits.items()}
+                    )
+                except Exception as e:
+                    records = [{"path": path, "error": str(e)} for path in batch]
+            for record in records:
+                if record["path"] in audits:
+                    record["misleading"] = audits[record["path"]]["misleading"]
+                if record["path"] in errors:
+                    record["ocr_error"] = errors[record["path"]]
+
+            for record in records:
+                out.write(json.dumps(record) + "\n")
+            out.flush()
+
+            processed += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"{processed}/{len(todo)} images  {processed / elapsed:.2f} images/sec", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {processed} images in {elapsed:.1f}s ({processed / elapsed:.2f} images/sec)",
+          file=sys.stderr)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Analysis cache: {stats['hits']} hits, {stats['misses']} misses", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
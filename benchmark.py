@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+CrystalViz Benchmark
+Time the analysis, OCR and visualization hot paths on a fixed synthetic corpus
+
+The corpus (chart and table images plus CSVs of increasing size) is generated
+from fixed seeds, so runs on the same machine are comparable. The vision model
+is replaced by stubs for both the per-prompt and the batched generate paths, so
+the Design Analyzer numbers measure everything around the model and the suite
+runs offline. benchmark_baseline.json is a reference run; record your own
+baseline before comparing, since timings only compare on the same machine. Examples:
+
+    python benchmark.py -o bench.json
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --quick --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+
+IMAGE_KINDS = ("bar", "line", "pie", "scatter", "table")
+IMAGES_PER_KIND = 2
+CSV_ROWS = (10_000, 100_000, 1_000_000)
+QUICK_CSV_ROWS = (10_000, 100_000)
+CATEGORIES = ("Electronics", "Clothing", "Food", "Books", "Sports", "Home", "Toys", "Garden")
+REGIONS = ("North", "South", "East", "West")
+# A benchmark regresses when its median time exceeds the baseline by more than this fraction
+DEFAULT_TOLERANCE = 0.25
+COLORS = [(180, 119, 31), (14, 127, 255), (44, 160, 44), (40, 39, 214), (189, 103, 148)]
+
+
+class StubVisionPipeline:
+    """Stand-in for the image-to-text pipeline: fixed answers after an optional fixed delay
+
+    It has no processor, so analyze_requests() takes its per-prompt path.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, image, prompt=None, max_new_tokens=None):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return [{"generated_text": f"Stub analysis of a {image.size[0]}x{image.size[1]} image: {prompt}"}]
+
+
+class _StubInputs(dict):
+    """Processor output: a dict of tensors that can be moved to a device"""
+
+    def to(self, device):
+        return self
+
+
+class _StubProcessor:
+    """Tokenizes each prompt to one token per word and decodes answers from the last batch's prompts"""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, images, text, padding=True, return_tensors="pt"):
+        import torch
+
+        self.texts = list(text)
+        length = max(len(prompt.split()) for prompt in self.texts)
+        input_ids = torch.ones((len(self.texts), length), dtype=torch.long)
+        return _StubInputs(input_ids=input_ids, attention_mask=torch.ones_like(input_ids))
+
+    def batch_decode(self, ids, skip_special_tokens=True):
+        return [f"Stub analysis ({ids.shape[1]} tokens) of: {prompt}" for prompt in self.texts]
+
+
+class _StubModel:
+    device = "cpu"
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def generate(self, input_ids, attention_mask=None, max_new_tokens=8):
+        import torch
+
+        self.pipe.calls += 1
+        self.pipe.rows += len(input_ids)
+        if self.pipe.delay:
+            time.sleep(self.pipe.delay)
+        return torch.cat([input_ids, torch.zeros((len(input_ids), max_new_tokens), dtype=torch.long)], dim=1)
+
+
+class StubBatchingPipeline:
+    """Stand-in with a processor and model, so analyze_requests() takes its batched generate path
+
+    Each generate call answers every row of its batch after one delay, like a
+    padded batch costing about as much as a single prompt.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.rows = 0
+        self.processor = _StubProcessor()
+        self.model = _StubModel(self)
+
+
+def _axes(image, rng):
+    height, width = image.shape[:2]
+    cv2.line(image, (60, height - 50), (width - 20, height - 50), (0, 0, 0), 2)
+    cv2.line(image, (60, 20), (60, height - 50), (0, 0, 0), 2)
+    step = int(rng.choice([10, 20, 50]))
+    for i in range(5):
+        cv2.putText(image, str(i * step), (15, height - 45 - i * 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+
+
+def synthetic_image(kind, seed=0, size=(800, 600)):
+    """Deterministic BGR image of a bar, line, pie or scatter chart, or a ruled table"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    image = np.full((height, width, 3), 255, np.uint8)
+    if kind == "bar":
+        _axes(image, rng)
+        slot = (width - 100) // 6
+        for i in range(6):
+            value = int(rng.integers(50, height - 120))
+            x = 90 + i * slot
+            cv2.rectangle(image, (x, height - 50 - value), (x + slot * 2 // 3, height - 51), COLORS[0], -1)
+            cv2.putText(image, CATEGORIES[i], (x, height - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
+    elif kind == "line":
+        _axes(image, rng)
+        xs = np.linspace(70, width - 30, 60)
+        ys = np.clip(height / 2 - np.cumsum(rng.normal(0, 10, 60)), 30, height - 60)
+        cv2.polylines(image, [np.stack([xs, ys], 1).astype(np.int32)], False, COLORS[0], 2)
+    elif kind == "pie":
+        shares = rng.random(len(COLORS))
+        angles = np.cumsum(np.r_[0, shares / shares.sum() * 360])
+        radius = min(width, height) * 3 // 8
+        for i, color in enumerate(COLORS):
+            cv2.ellipse(image, (width // 2, height // 2), (radius, radius), 0, angles[i], angles[i + 1], color, -1)
+    elif kind == "scatter":
+        _axes(image, rng)
+        for _ in range(150):
+            center = (int(rng.integers(80, width - 30)), int(rng.integers(30, height - 60)))
+            cv2.circle(image, center, 4, COLORS[0], -1)
+    elif kind == "table":
+        rows, columns = 12, 5
+        column_width = (width - 40) // columns
+        for row in range(rows):
+            y = 40 + row * 42
+            cv2.line(image, (20, y - 28), (width - 20, y - 28), (0, 0, 0), 1)
+            for column in range(columns):
+                text = REGIONS[column % len(REGIONS)] if row == 0 else f"{int(rng.integers(100, 99999)):,}"
+                cv2.putText(image, text, (35 + column * column_width, y),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 1)
+    else:
+        raise ValueError(f"Unknown image kind: {kind}")
+    if kind != "table":
+        cv2.putText(image, f"Synthetic {kind} chart", (width // 3, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    return image
+
+
+def synthetic_frame(rows, seed=0):
+    """Deterministic sales table shaped like the Data Visualizer's sample data"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Date": pd.date_range("2020-01-01", periods=rows, freq="min"),
+        "Category": rng.choice(CATEGORIES, rows),
+        "Region": rng.choice(REGIONS, rows),
+        "Sales": rng.gamma(2.0, 500.0, rows).round(2),
+        "Profit": rng.normal(100.0, 40.0, rows).round(2),
+        "Quantity": rng.integers(1, 50, rows),
+    })
+
+
+def write_corpus(directory, csv_rows=CSV_ROWS):
+    """Write the image and CSV corpus into directory, reusing files that already exist
+
+    Returns {"images": [path, ...], "csvs": {rows: path}}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    images = []
+    for kind in IMAGE_KINDS:
+        for seed in range(IMAGES_PER_KIND):
+            path = os.path.join(directory, f"{kind}_{seed}.png")
+            if not os.path.exists(path):
+                cv2.imwrite(path, synthetic_image(kind, seed))
+            images.append(path)
+    csvs = {}
+    for rows in csv_rows:
+        path = os.path.join(directory, f"sales_{rows}.csv")
+        if not os.path.exists(path):
+            synthetic_frame(rows).to_csv(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+        csvs[rows] = path
+    return {"images": images, "csvs": csvs}
+
+
+def time_call(function, repeat=3, warmup=1, items=1):
+    """Median, min and max wall time of function() over repeat runs after warmup runs
+
+    items is how many units of work one call processes (images, rows), used for
+    the throughput figure.
+    """
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "median_seconds": median,
+        "min_seconds": min(times),
+        "max_seconds": max(times),
+        "runs": repeat,
+        "items": items,
+        "items_per_second": items / median if median else None,
+    }
+
+
+def _rows_label(rows):
+    return f"{rows // 1_000_000}m" if rows % 1_000_000 == 0 else f"{rows // 1_000}k"
+
+
+def bench_design_analyzer(paths, repeat, model_delay=0.0):
+    """Classification, pixel measurements and stubbed-model analysis of every corpus image"""
+    from analysis_cache import AnalysisCache
+    from batch_analyze import analyze_batch
+    from image_classifier import classify_image
+    from misleading_detector import detect_misleading
+    from model_registry import ModelRegistry
+    from preprocessing import decode_image
+
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(decode_image(f.read()))
+
+    def measure():
+        for image in images:
+            detect_misleading(image, label=classify_image(image)["label"])
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        runs = iter(range(2 * (repeat + 1)))
+
+        def analyze(stub):
+            # A fresh cache per run, so every image reaches the (stub) model path
+            cache = AnalysisCache(os.path.join(cache_dir, f"run{next(runs)}.sqlite"))
+            registry = ModelRegistry(loader=lambda spec: stub(model_delay))
+            analyze_batch(paths, {}, registry, cache, None, None, skip_obvious=False)
+
+        return {
+            "design.classify": time_call(lambda: [classify_image(image) for image in images],
+                                         repeat, items=len(images)),
+            "design.measure": time_call(measure, repeat, items=len(images)),
+            "design.analyze_stub_model": time_call(lambda: analyze(StubVisionPipeline), repeat,
+                                                   items=len(images)),
+            "design.analyze_stub_batched": time_call(lambda: analyze(StubBatchingPipeline), repeat,
+                                                     items=len(images)),
+        }
+
+
+def bench_ocr(paths, repeat):
+    """OCR throughput on the corpus images, uncached and as OCR cache hits"""
+    from ocr_engine import cached_ocr_image_words, ocr_backend, ocr_image_words, open_ocr_cache
+    from preprocessing import decode_image
+
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(decode_image(f.read()))
+    try:
+        ocr_image_words(images[0], workers=1)
+    except Exception as e:
+        return {"ocr.image": {"skipped": f"OCR unavailable: {e}"}}
+
+    results = {"ocr.image": time_call(lambda: [ocr_image_words(image, workers=1) for image in images],
+                                      repeat, items=len(images))}
+    results["ocr.image"]["backend"] = ocr_backend()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = open_ocr_cache(os.path.join(cache_dir, "ocr.sqlite"))
+        results["ocr.cache_hit"] = time_call(
+            lambda: [cached_ocr_image_words(image, cache, workers=1) for image in images],
+            repeat, items=len(images))
+    return results
+
+
+def bench_ingest(csvs, repeat):
+    """Streaming CSV ingest (chunked read, downcasting, category totals and sampling)"""
+    from data_ingest import StreamingAggregator, read_csv_streaming
+
+    results = {}
+    for rows, path in sorted(csvs.items()):
+        ingest = lambda: read_csv_streaming(path, StreamingAggregator(value="Sales", category="Category"),
+                                            date_columns=("Date",))
+        results[f"ingest.csv_{_rows_label(rows)}"] = time_call(ingest, repeat, items=rows)
+    return results
+
+
+def bench_figures(csvs, repeat):
+    """Schema profiling and the Data Visualizer's figure builds, including JSON serialization"""
+    import plotly.express as px
+
+    from downsampling import downsample_line, downsample_scatter
+    from schema_inference import profile_frame
+
+    results = {}
+    for rows, path in sorted(csvs.items()):
+        frame = pd.read_csv(path, parse_dates=["Date"])
+        label = _rows_label(rows)
+
+        def line():
+            return px.line(downsample_line(frame, "Date", "Sales"), x="Date", y="Sales").to_json()
+
+        def bar():
+            totals = frame.groupby("Category", observed=True)["Sales"].sum().reset_index()
+            return px.bar(totals, x="Category", y="Sales").to_json()
+
+        def scatter():
+            plot_data = downsample_scatter(frame, "Sales", "Profit", color="Region")
+            return px.scatter(plot_data, x="Sales", y="Profit", color="Region", render_mode="webgl").to_json()
+
+        results[f"schema.profile_{label}"] = time_call(lambda: profile_frame(frame), repeat, items=rows)
+        for name, build in (("line", line), ("bar", bar), ("scatter", scatter)):
+            results[f"figure.{name}_{label}"] = time_call(build, repeat, items=rows)
+    return results
+
+
+SUITES = {
+    "design": lambda corpus, args: bench_design_analyzer(corpus["images"], args.repeat, args.model_delay),
+    "ocr": lambda corpus, args: bench_ocr(corpus["images"], args.repeat),
+    "ingest": lambda corpus, args: bench_ingest(corpus["csvs"], args.repeat),
+    "figures": lambda corpus, args: bench_figures(corpus["csvs"], args.repeat),
+}
+
+
+def environment():
+    """Machine and library details stored with every result file"""
+    import plotly
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "opencv": cv2.__version__,
+        "plotly": plotly.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def summary_rows(results):
+    """One table row per benchmark: median milliseconds, throughput and why it was skipped"""
+    rows = []
+    for name, result in results.items():
+        timed = "median_seconds" in result
+        rows.append({
+            "benchmark": name,
+            "median_ms": round(result["median_seconds"] * 1000, 2) if timed else None,
+            "items_per_second": round(result["items_per_second"], 1) if timed else None,
+            "note": result.get("skipped") or result.get("backend") or "",
+        })
+    return rows
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Rows comparing median times against a baseline's; benchmarks missing from either side are left out
+
+    ratio is current / baseline, so values above 1 + tolerance are regressions.
+    """
+    rows = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference or "median_seconds" not in current or "median_seconds" not in reference:
+            continue
+        ratio = current["median_seconds"] / reference["median_seconds"] if reference["median_seconds"] else None
+        rows.append({
+            "benchmark": name,
+            "baseline_ms": round(reference["median_seconds"] * 1000, 2),
+            "current_ms": round(current["median_seconds"] * 1000, 2),
+            "ratio": round(ratio, 3) if ratio is not None else None,
+            "regressed": ratio is not None and ratio > 1 + tolerance,
+        })
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CrystalViz analysis, OCR and visualization paths")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file")
+    parser.add_argument("--suites", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--corpus", help="Directory for the synthetic corpus (default: a temporary directory)")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"Skip the largest CSVs (rows: {', '.join(map(str, QUICK_CSV_ROWS))})")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (the median is reported)")
+    parser.add_argument("--model-delay", type=float, default=0.0,
+                        help="Seconds the stub vision model sleeps per prompt (per batch on the batched path)")
+    parser.add_argument("--baseline", help="Compare against a results file and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown as a fraction of the baseline median")
+    parser.add_argument("--save-baseline", help="Also write the results to this file for later comparisons")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from precision_report import format_table
+
+    args = parse_args(argv)
+    csv_rows = QUICK_CSV_ROWS if args.quick else CSV_ROWS
+
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus = write_corpus(args.corpus or scratch, csv_rows)
+        results = {}
+        for suite in args.suites:
+            start = time.perf_counter()
+            results.update(SUITES[suite](corpus, args))
+            print(f"{suite}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    report = {"environment": environment(), "settings": {"quick": args.quick, "repeat": args.repeat,
+                                                         "model_delay": args.model_delay},
+              "results": results}
+    print(format_table(summary_rows(results)))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("platform") != report["environment"]["platform"]:
+            print("Warning: the baseline was recorded on a different platform", file=sys.stderr)
+        comparison = compare_results(results, baseline.get("results", {}), args.tolerance)
+        if comparison:
+            print()
+            print(format_table(comparison))
+        regressions = [row["benchmark"] for row in comparison if row["regressed"]]
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Chart Lint
+Deterministic checks of Plotly figures against the design rules, without a model
+"""
+
+import base64
+import time
+
+import numpy as np
+
+from design_rules import CHART_TYPES_TO_AVOID, GRAPH_RULES, MISLEADING_ELEMENTS
+
+WARNING = "warning"
+INFO = "info"
+
+# Trace types that draw lengths from a baseline, so their value axis must include zero
+BASELINE_TRACE_TYPES = ("bar", "histogram", "funnel", "waterfall")
+THREE_D_TRACE_TYPES = ("scatter3d", "surface", "mesh3d", "cone", "streamtube", "volume", "isosurface")
+
+_RULES = {}
+
+
+def rule(name, guideline, severity=WARNING):
+    """Register a check; it receives a figure spec and returns a message, a list of messages or None"""
+    def register(check):
+        _RULES[name] = {"name": name, "guideline": guideline, "severity": severity, "check": check}
+        return check
+    return register
+
+
+def registered_rules():
+    """Names of all registered rules in evaluation order"""
+    return list(_RULES)
+
+
+def figure_spec(figure):
+    """Plain {"data": [...], "layout": {...}} dict for a Plotly figure or an existing spec"""
+    if hasattr(figure, "to_plotly_json"):
+        figure = figure.to_plotly_json()
+    return {"data": list(figure.get("data") or []), "layout": dict(figure.get("layout") or {})}
+
+
+def _values(array):
+    """Numeric array from a list, numpy array or Plotly's base64 typed-array encoding"""
+    if array is None:
+        return np.array([], dtype=float)
+    if isinstance(array, dict) and "bdata" in array:
+        values = np.frombuffer(base64.b64decode(array["bdata"]), dtype=array["dtype"])
+        return values.astype(float)
+    try:
+        return np.asarray(array, dtype=float).ravel()
+    except (TypeError, ValueError):
+        return np.array([], dtype=float)
+
+
+def _axis_name(trace, letter):
+    """Layout key of the axis a trace is drawn on, e.g. "yaxis" or "yaxis2" """
+    reference = trace.get(f"{letter}axis") or letter
+    return f"{letter}axis{reference[1:]}"
+
+
+def _axis_setting(layout, axis, key, default=None):
+    """Effective axis setting: the figure's own layout, then its template, then the Plotly default"""
+    value = (layout.get(axis) or {}).get(key)
+    if value is None:
+        template_layout = (layout.get("template") or {}).get("layout") or {}
+        value = (template_layout.get(axis[:5]) or {}).get(key)
+    return default if value is None else value
+
+
+def _title_text(title):
+    if isinstance(title, dict):
+        return title.get("text")
+    return title
+
+
+def _cartesian_traces(spec):
+    return [trace for trace in spec["data"]
+            if trace.get("type", "scatter") not in ("pie", "funnelarea", "sunburst", "treemap",
+                                                     "scatterpolar", "barpolar", "table")]
+
+
+@rule("avoided_chart_type", ", ".join(CHART_TYPES_TO_AVOID))
+def check_avoided_chart_type(spec):
+    labels = {
+        "pie": "pie chart",
+        "funnel": "funnel chart",
+        "funnelarea": "funnel chart",
+        "scatterpolar": "radar chart",
+        "barpolar": "radar chart",
+    }
+    found = []
+    for trace in spec["data"]:
+        trace_type = trace.get("type", "scatter")
+        label = "donut chart" if trace_type == "pie" and trace.get("hole") else labels.get(trace_type)
+        if label and label not in found:
+            found.append(label)
+    return [f"Avoid {label}s: compare the values with a sorted bar chart instead" for label in found]
+
+
+@rule("truncated_value_axis", MISLEADING_ELEMENTS["axis_and_scale"][1])
+def check_truncated_value_axis(spec):
+    layout = spec["layout"]
+    messages = []
+    for trace in spec["data"]:
+        trace_type = trace.get("type", "scatter")
+        if trace_type not in BASELINE_TRACE_TYPES:
+            continue
+        letter = "x" if trace.get("orientation") == "h" else "y"
+        axis = _axis_name(trace, letter)
+        value_range = _axis_setting(layout, axis, "range")
+        if value_range and not (min(value_range) <= 0 <= max(value_range)):
+            messages.append(
+                f"{trace_type.capitalize()} lengths are drawn from {min(value_range):g} instead of zero "
+                f"on {axis}, which exaggerates differences"
+            )
+    return messages
+
+
+@rule("line_axis_from_zero", MISLEADING_ELEMENTS["axis_and_scale"][1], severity=INFO)
+def check_line_axis_from_zero(spec):
+    layout = spec["layout"]
+    for trace in spec["data"]:
+        if trace.get("type", "scatter") != "scatter" or "lines" not in (trace.get("mode") or "lines"):
+            continue
+        axis = _axis_name(trace, "y")
+        if _axis_setting(layout, axis, "rangemode") == "tozero":
+            continue
+        value_range = _axis_setting(layout, axis, "range")
+        values = _values(trace.get("y"))
+        values = values[np.isfinite(values)]
+        low = min(value_range) if value_range else (values.min() if len(values) else 0)
+        high = max(value_range) if value_range else (values.max() if len(values) else 0)
+        # Only worth a note when the hidden part of the axis is large relative to the range shown
+        if low > 0 and high > low and low > (high - low):
+            return (f"The y-axis starts at {low:,.4g}, not zero: changes look larger than they are. "
+                    f"Say so in the title or set rangemode='tozero' if magnitude matters")
+    return None
+
+
+@rule("dual_axes", MISLEADING_ELEMENTS["axis_and_scale"][0])
+def check_dual_axes(spec):
+    layout = spec["layout"]
+    overlaid = sorted(key for key, value in layout.items()
+                      if key[1:5] == "axis" and isinstance(value, dict) and value.get("overlaying"))
+    if overlaid:
+        return (f"Separate overlaid axes ({', '.join(overlaid)}): readers will compare series "
+                f"drawn on different scales")
+    return None
+
+
+@rule("three_d", MISLEADING_ELEMENTS["visual_distortions"][0])
+def check_three_d(spec):
+    types = sorted({trace.get("type") for trace in spec["data"]} & set(THREE_D_TRACE_TYPES))
+    if types:
+        return f"3D traces ({', '.join(types)}) distort proportions; use a 2D chart"
+    return None
+
+
+@rule("legend_instead_of_labels", GRAPH_RULES["de_cluttering"][4], severity=INFO)
+def check_legend_instead_of_labels(spec):
+    layout = spec["layout"]
+    if layout.get("showlegend") is False:
+        return None
+    traces = _cartesian_traces(spec)
+    in_legend = [trace for trace in traces if trace.get("showlegend", True) is not False]
+    labelled = any("text" in (trace.get("mode") or "") or trace.get("texttemplate") for trace in traces)
+    if len(in_legend) >= 2 and not labelled:
+        return f"{len(in_legend)} series are identified only by a legend; label them directly at the end of each series"
+    return None
+
+
+@rule("gridlines", GRAPH_RULES["de_cluttering"][1], severity=INFO)
+def check_gridlines(spec):
+    if not _cartesian_traces(spec):
+        return None
+    layout = spec["layout"]
+    gridded = [axis for axis in ("xaxis", "yaxis") if _axis_setting(layout, axis, "showgrid", True)]
+    if gridded:
+        return f"Gridlines are shown on {' and '.join(gridded)}; remove them or make them lighter"
+    return None
+
+
+@rule("missing_labels", GRAPH_RULES["general_tips"][3])
+def check_missing_labels(spec):
+    layout = spec["layout"]
+    missing = []
+    if not _title_text(layout.get("title")):
+        missing.append("a chart title")
+    if _cartesian_traces(spec):
+        for axis, label in (("xaxis", "an x-axis title"), ("yaxis", "a y-axis title")):
+            if not _title_text((layout.get(axis) or {}).get("title")):
+                missing.append(label)
+    if missing:
+        return f"Add {' and '.join(missing)}"
+    return None
+
+
+def lint_figure(figure, rules=None):
+    """Run registered rules on a Plotly figure or figure spec dict
+
+    Returns {"findings": [...], "timings": {rule: seconds}, "seconds": total}.
+    Each finding is {"rule", "severity", "message", "guideline"}; a rule that
+    raises is reported as a finding instead of aborting the run.
+    """
+    start = time.perf_counter()
+    spec = figure_spec(figure)
+    findings = []
+    timings = {}
+    for name in rules or registered_rules():
+        entry = _RULES[name]
+        rule_start = time.perf_counter()
+        try:
+            result = entry["check"](spec)
+        except Exception as e:
+            result = f"Rule failed: {e}"
+        timings[name] = time.perf_counter() - rule_start
+        messages = [result] if isinstance(result, str) else (result or [])
+        findings.extend(
+            {"rule": name, "severity": entry["severity"], "message": message,
+             "guideline": entry["guideline"]}
+            for message in messages
+        )
+    return {"findings": findings, "timings": timings, "seconds": time.perf_counter() - start}
@@ -0,0 +1,141 @@
+"""
+Streaming CSV Ingestion
+Read large CSV files in chunks with compact dtypes and incremental chart aggregates
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_registry import current_rss_bytes
+
+DEFAULT_CHUNK_ROWS = 200_000
+DEFAULT_SAMPLE_ROWS = 100_000
+# Text columns with fewer distinct values than this fraction of rows become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def downcast_frame(frame, date_columns=()):
+    """Convert a chunk to compact dtypes: small numeric types, categoricals for repeated text"""
+    for column in frame.columns:
+        series = frame[column]
+        if column in date_columns:
+            frame[column] = pd.to_datetime(series, errors="coerce")
+        elif pd.api.types.is_integer_dtype(series):
+            frame[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            frame[column] = pd.to_numeric(series, downcast="float")
+        elif (series.dtype == object or pd.api.types.is_string_dtype(series)) \
+                and series.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+            frame[column] = series.astype("category")
+    return frame
+
+
+class StreamingAggregator:
+    """Incrementally computes what each Data Visualizer chart needs from CSV chunks
+
+    - per-category sum and count of the value column (Bar and Pie charts)
+    - a uniform random sample of rows (Line, Scatter and Box charts)
+    """
+
+    def __init__(self, value="Sales", category="Category", sample_rows=DEFAULT_SAMPLE_ROWS, seed=42):
+        self.value = value
+        self.category = category
+        self.sample_rows = sample_rows
+        self.rows = 0
+        self._sums = None
+        self._counts = None
+        self._sample = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        """Fold one chunk into the running aggregates"""
+        offset = self.rows
+        self.rows += len(chunk)
+
+        if self.category in chunk.columns and self.value in chunk.columns:
+            # Accumulate in float64 even when the chunk was downcast to float32; numbers stored
+            # as text (a column with a few "n/a" entries) are parsed, and unparseable values skipped
+            values = pd.to_numeric(chunk[self.value], errors="coerce").astype("float64")
+            grouped = values.groupby(chunk[self.category], observed=True).agg(["sum", "count"])
+            # Chunks can have different category sets; align on plain labels
+            grouped.index = grouped.index.astype(object)
+            if self._sums is None:
+                self._sums, self._counts = grouped["sum"], grouped["count"]
+            else:
+                self._sums = self._sums.add(grouped["sum"], fill_value=0)
+                self._counts = self._counts.add(grouped["count"], fill_value=0)
+
+        # Keep the rows with the smallest random keys seen so far: a uniform sample
+        keyed = chunk.assign(
+            _sample_key=self._rng.random(len(chunk)),
+            _row=np.arange(offset, offset + len(chunk))
+        )
+        if self._sample is not None:
+            keyed = pd.concat([self._sample, keyed], ignore_index=True)
+        self._sample = keyed.nsmallest(self.sample_rows, "_sample_key")
+
+    def category_totals(self):
+        """Series of value sums indexed by category"""
+        if self._sums is None:
+            return pd.Series(dtype=float, name=self.value)
+        totals = self._sums.sort_index()
+        totals.name = self.value
+        totals.index.name = self.category
+        return totals
+
+    def category_counts(self):
+        """Series of row counts indexed by category"""
+        if self._counts is None:
+            return pd.Series(dtype=int)
+        return self._counts.sort_index().astype(int)
+
+    def sample(self):
+        """Sampled rows in their original file order"""
+        if self._sample is None:
+            return pd.DataFrame()
+        ordered = self._sample.sort_values("_row")
+        return ordered.drop(columns=["_sample_key", "_row"]).reset_index(drop=True)
+
+
+def aggregate_frames(frames, aggregator, progress_callback=None, on_chunk=None):
+    """Fold an iterable of DataFrame chunks into an aggregator
+
+    on_chunk, if given, receives every chunk as well (e.g. to persist it).
+    Returns ingest statistics: rows, seconds, rows_per_second and peak_rss_bytes
+    (the largest resident set size observed between chunks).
+    """
+    start = time.perf_counter()
+    peak_rss = current_rss_bytes()
+    for chunk in frames:
+        aggregator.update(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        rss = current_rss_bytes()
+        if rss is not None:
+            peak_rss = max(peak_rss or 0, rss)
+        if progress_callback is not None:
+            progress_callback(aggregator.rows)
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": aggregator.rows,
+        "seconds": seconds,
+        "rows_per_second": aggregator.rows / seconds if seconds else None,
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def read_csv_streaming(source, aggregator, chunk_rows=DEFAULT_CHUNK_ROWS, date_columns=(),
+                       progress_callback=None, on_chunk=None):
+    """Stream a CSV through an aggregator chunk by chunk, downcasting each chunk
+
+    Returns the same statistics as aggregate_frames().
+    """
+    reader = pd.read_csv(source, chunksize=chunk_rows, low_memory=True)
+    chunks = (
+        downcast_frame(chunk, [column for column in date_columns if column in chunk.columns])
+        for chunk in reader
+    )
+    return aggregate_frames(chunks, aggregator, progress_callback, on_chunk)
@@ -0,0 +1,162 @@
+"""
+Dataset Cache
+Uploaded datasets stored once as Parquet, keyed by content hash, and reloaded memory-mapped
+"""
+
+import hashlib
+import os
+import shutil
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analysis_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+COMPLETE_MARKER = "_COMPLETE"
+HASH_BLOCK_BYTES = 8 * 1024 * 1024
+DEFAULT_BATCH_ROWS = 200_000
+
+
+def fingerprint(source):
+    """SHA-256 of raw bytes or of a seekable file object's full contents"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+    position = source.tell()
+    source.seek(0)
+    for block in iter(lambda: source.read(HASH_BLOCK_BYTES), b""):
+        digest.update(block)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+class _PartWriter:
+    """Writes a dataset as numbered Parquet parts; published atomically on success"""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.parts = 0
+        self.tmp_dir = os.path.join(cache.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+
+    def __enter__(self):
+        os.makedirs(self.tmp_dir)
+        return self
+
+    def write(self, frame):
+        """Append one chunk; each chunk keeps its own schema so dtypes may differ"""
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_table(table, os.path.join(self.tmp_dir, f"part-{self.parts:05d}.parquet"))
+        self.parts += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            return False
+        open(os.path.join(self.tmp_dir, COMPLETE_MARKER), "w").close()
+        final_dir = self.cache.path_for(self.key)
+        try:
+            os.replace(self.tmp_dir, final_dir)
+        except OSError:
+            # Another session finished converting the same dataset first
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self.cache.evict(keep=self.key)
+        return False
+
+
+class DatasetCache:
+    """Content-addressed Parquet store with least-recently-used eviction by disk size"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or os.path.join(DEFAULT_CACHE_DIR, "datasets")
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        """Directory holding the Parquet parts for a dataset"""
+        return os.path.join(self.directory, key)
+
+    def contains(self, key):
+        """Whether a complete conversion of this dataset is on disk"""
+        return os.path.exists(os.path.join(self.path_for(key), COMPLETE_MARKER))
+
+    def _parts(self, key):
+        """Sorted Parquet part paths for a dataset"""
+        directory = self.path_for(key)
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet")
+        )
+
+    def _touch(self, key):
+        """Record an access; the marker's mtime drives eviction order"""
+        try:
+            os.utime(os.path.join(self.path_for(key), COMPLETE_MARKER))
+        except FileNotFoundError:
+            # Evicted by another session; readers of the parts fail on their own
+            pass
+
+    def iter_frames(self, key, batch_rows=DEFAULT_BATCH_ROWS):
+        """Yield the stored dataset in batches of rows, read through a memory map"""
+        self._touch(key)
+        for part in self._parts(key):
+            parquet_file = pq.ParquetFile(part, memory_map=True)
+            for batch in parquet_file.iter_batches(batch_size=batch_rows):
+                yield batch.to_pandas()
+
+    def load(self, key):
+        """The whole stored dataset as one DataFrame, or None if it is not cached"""
+        if not self.contains(key):
+            return None
+        self._touch(key)
+        try:
+            frames = [pq.read_table(part, memory_map=True).to_pandas() for part in self._parts(key)]
+        except FileNotFoundError:
+            # Evicted by another session while reading
+            return None
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def writer(self, key):
+        """Context manager for writing a dataset chunk by chunk"""
+        return _PartWriter(self, key)
+
+    def store(self, key, frame):
+        """Store a complete DataFrame under key"""
+        with self.writer(key) as part_writer:
+            part_writer.write(frame)
+
+    def _entries(self):
+        """(last_access, size, key) for every complete dataset"""
+        entries = []
+        for key in os.listdir(self.directory):
+            if key.startswith("."):
+                continue
+            try:
+                last_access = os.path.getmtime(os.path.join(self.path_for(key), COMPLETE_MARKER))
+                size = sum(os.path.getsize(part) for part in self._parts(key))
+            except FileNotFoundError:
+                # Incomplete, or evicted by another session while listing
+                continue
+            entries.append((last_access, size, key))
+        return entries
+
+    def total_bytes(self):
+        """Disk space used by all complete datasets"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """Remove least recently used datasets until the cache fits in max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.path_for(key), ignore_errors=True)
+            total -= size
@@ -150,6 +150,17 @@ def get_graph_analysis_prompts():
         "Suggest improvements for better data communication."
     ]
 
+def get_general_analysis_prompts():
+    """Generate general-purpose analysis prompts for any visualization"""
+    return [
+        "Rate this visualization from 1-10 on clarity and readability. Explain your rating.",
+        "What are the strengths and weaknesses of this design?",
+        "Suggest 3 specific improvements for this visualization.",
+        "Is this chart type appropriate for the data being presented? Why or why not?",
+        "Check for any misleading elements or visual distortions.",
+        "Evaluate the use of color, labels, and formatting."
+    ]
+
 def get_design_scorecard():
     """Create a comprehensive design scorecard"""
     return {
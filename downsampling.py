@@ -0,0 +1,113 @@
+"""
+Chart Downsampling
+Level-of-detail reduction so large series can be plotted without sending every point
+"""
+
+import numpy as np
+import pandas as pd
+
+MAX_LINE_POINTS = 2000
+MAX_FULL_RESOLUTION_POINTS = 200000
+MAX_SCATTER_POINTS = 20000
+SCATTER_BINS = 300
+
+
+def _as_float(values):
+    """Numeric view of a column; dates (including date strings) become epoch nanoseconds"""
+    values = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, errors="coerce")
+        if values.isna().all():
+            # Not dates either: keep the original row order
+            return np.arange(len(values), dtype=float)
+    if values.dt.tz is not None:
+        values = values.dt.tz_convert(None)
+    result = values.astype("datetime64[ns]").astype("int64").to_numpy(dtype=float)
+    result[values.isna().to_numpy()] = np.nan
+    return result
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points preserving the visual shape
+
+    x must be sorted ascending. The first and last points are always kept; each
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(int), n)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        if end <= start:
+            selected[i + 1] = a
+            continue
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return np.unique(selected)
+
+
+def downsample_line(frame, x, y, max_points=MAX_LINE_POINTS):
+    """Sort by x, drop missing values and reduce to at most max_points rows with LTTB"""
+    frame = frame[[x, y]].dropna()
+    x_values = _as_float(frame[x])
+    order = np.argsort(x_values, kind="stable")
+    frame, x_values = frame.iloc[order], x_values[order]
+    if len(frame) <= max_points:
+        return frame
+    indices = lttb_indices(x_values, _as_float(frame[y]), max_points)
+    return frame.iloc[indices]
+
+
+def scatter_bin_indices(x, y, groups=None, bins=SCATTER_BINS):
+    """Indices of one representative point per occupied (x-bin, y-bin, group) cell"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    def bin_of(values):
+        low, high = np.nanmin(values), np.nanmax(values)
+        if high == low:
+            return np.zeros(len(values), dtype=np.int64)
+        return np.minimum(((values - low) / (high - low) * bins).astype(np.int64), bins - 1)
+
+    cells = bin_of(x) * bins + bin_of(y)
+    if groups is not None:
+        group_codes = pd.factorize(pd.Series(groups), use_na_sentinel=False)[0]
+        cells = cells * (group_codes.max() + 1) + group_codes
+    _, first = np.unique(cells, return_index=True)
+    return np.sort(first)
+
+
+def downsample_scatter(frame, x, y, color=None, max_points=MAX_SCATTER_POINTS, bins=SCATTER_BINS):
+    """Reduce a scatter frame to one point per occupied density cell
+
+    Keeps the outline, outliers and per-colour coverage of the cloud while
+    bounding the number of points sent to the browser.
+    """
+    columns = [x, y] + ([color] if color else [])
+    frame = frame[columns].dropna(subset=[x, y])
+    if len(frame) <= max_points:
+        return frame
+    indices = scatter_bin_indices(
+        _as_float(frame[x]), _as_float(frame[y]),
+        frame[color] if color else None, bins
+    )
+    if len(indices) > max_points:
+        indices = np.sort(np.random.default_rng(0).choice(indices, max_points, replace=False))
+    return frame.iloc[indices]
@@ -1,18 +1,18 @@
-import streamlit as st
-import cv2
-import pytesseract
-import numpy as np
-from transformers import pipeline
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from PIL import Image
-import io
-from design_rules import (
-    TABLE_RULES, GRAPH_RULES, CHART_TYPES_TO_AVOID, 
-    MISLEADING_ELEMENTS, get_table_analysis_prompts, 
-    get_graph_analysis_prompts
-)
+import time
+
+from import_budget import timed_imports, import_report
+
+# Heavy libraries (pandas, OpenCV, Plotly, Tesseract) are imported by the pages that use them
+with timed_imports("startup"):
+    import streamlit as st
+    from design_rules import TABLE_RULES, GRAPH_RULES, CHART_TYPES_TO_AVOID
+    from inference_server import make_vision_batcher
+    from assistant import build_assistant_prompt, stream_generate, format_stats
+    from model_registry import ModelRegistry, PRECISION_MODES
+    from analysis_cache import AnalysisCache
+    from job_queue import JobQueue, default_workers
+    from figure_cache import FigureCache
+    from perf_trace import Trace, METRICS_PORT, start_metrics_server
 
 # Page configuration
 st.set_page_config(
@@ -49,21 +49,141 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize models
+# Model registry: each page loads only the models it needs, on first use
 @st.cache_resource
-def load_models():
-    """Load AI models for different tasks"""
-    models = {}
+def get_model_registry():
+    """Shared registry of lazily loaded AI models"""
+    return ModelRegistry()
+
+def load_page_model(name):
+    """Load a model for the current page, reporting failures in the UI"""
     try:
-        models['image_to_text'] = pipeline("image-to-text", model="llava-hf/llava-1.5-7b-hf")
-        models['text_generation'] = pipeline("text-generation", model="gpt2")
-        return models
+        with st.spinner(f"Loading {name.replace('_', ' ')} model..."):
+            return get_model_registry().get(name)
     except Exception as e:
         st.error(f"Error loading models: {e}")
         return None
 
-# Load models
-models = load_models()
+@st.cache_resource(max_entries=8)
+def decode_upload(data):
+    """Decode uploaded image bytes once per upload; the array must not be modified"""
+    from preprocessing import decode_image
+    return decode_image(data)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def measure_upload(data, label, _trace=None):
+    """Pixel measurements, misleading-element and table formatting findings for an uploaded image
+
+    _trace (not part of the cache key) receives OCR and measurement stages on cache misses.
+    """
+    from misleading_detector import detect_misleading
+    from ocr_engine import cached_ocr_image_words
+    
+    trace = _trace or Trace("measure_upload")
+    image = decode_upload(data)
+    try:
+        with trace.stage("ocr"):
+            words = cached_ocr_image_words(image, get_ocr_cache())["words"]
+    except Exception:
+        # Without OCR the zero-baseline check is skipped; the other measurements still run
+        words = None
+    with trace.stage("measure"):
+        result = detect_misleading(image, words, label)
+        if label == "table" and words:
+            from table_ocr import check_table_rules, reconstruct_table
+            result["findings"] += check_table_rules(reconstruct_table(words))
+    return result
+
+@st.cache_resource
+def get_ocr_cache():
+    """Shared on-disk cache of OCR results keyed on image content"""
+    from ocr_engine import open_ocr_cache
+    return open_ocr_cache()
+
+@st.cache_resource
+def get_analysis_cache():
+    """Shared on-disk cache of design analysis results"""
+    return AnalysisCache()
+
+@st.cache_resource
+def get_dataset_cache():
+    """Shared on-disk Parquet cache of uploaded datasets"""
+    from dataset_cache import DatasetCache
+    return DatasetCache()
+
+@st.cache_resource(max_entries=4)
+def load_dataset(dataset_id):
+    """A stored dataset read from Parquet once per process; the frame must not be modified"""
+    data = get_dataset_cache().load(dataset_id)
+    if data is None:
+        # Raised rather than returned, so a miss is not cached
+        raise KeyError(dataset_id)
+    return data
+
+@st.cache_resource
+def get_figure_cache():
+    """Shared memo of built chart figures and group-by aggregates"""
+    return FigureCache()
+
+def upload_fingerprint(uploaded_file):
+    """Content hash of an upload, computed once per upload in this session"""
+    from dataset_cache import fingerprint as dataset_fingerprint
+    fingerprints = st.session_state.setdefault("dataset_fingerprints", {})
+    upload_id = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    if upload_id not in fingerprints:
+        fingerprints[upload_id] = dataset_fingerprint(uploaded_file)
+    return fingerprints[upload_id]
+
+@st.cache_resource
+def get_metrics_server():
+    """Prometheus endpoint on CRYSTALVIZ_METRICS_PORT, started once per process"""
+    return start_metrics_server() if METRICS_PORT else None
+
+def show_performance(trace):
+    """Finish the page trace and, when enabled in the sidebar, show its stages and the startup report"""
+    trace.finish()
+    if st.session_state.get("show_performance"):
+        with st.expander(f"⏱️ Performance ({trace.total_seconds() * 1000:.0f} ms)"):
+            st.dataframe(trace.rows(), hide_index=True)
+            st.caption("Startup report: import time of each page on first use in this server process")
+            st.dataframe(import_report(), hide_index=True)
+
+JOB_POLL_SECONDS = 1.0
+
+# Data Visualizer chart labels and the schema_inference chart type behind each
+CHART_KINDS = {
+    "📈 Line Chart": "line",
+    "📊 Bar Chart": "bar",
+    "🫧 Scatter Plot": "scatter",
+    "🥧 Pie Chart": "pie",
+    "📦 Box Plot": "box",
+}
+
+@st.cache_resource
+def get_vision_batcher():
+    """Process-wide micro-batcher that coalesces vision requests across sessions"""
+    return make_vision_batcher(get_model_registry())
+
+@st.cache_resource
+def get_job_queue():
+    """Shared background queue that runs design analyses off the script thread"""
+    cache = get_analysis_cache()
+    batcher = get_vision_batcher()
+    
+    def run_design_analysis(payload):
+        # Concurrent jobs block here together, so the batcher can merge them into one batch
+        results = batcher.submit((payload["image"], payload["prompts"])).result()
+        errors = [str(r) for r in results.values() if str(r).startswith("Error:")]
+        if errors:
+            # Failed jobs are not cached and offer a retry
+            raise RuntimeError("; ".join(errors))
+        cache.put(payload["cache_key"], results)
+        return results
+    
+    # Workers only wait on the batcher, so by default allow enough of them to fill a batch
+    job_queue = JobQueue(workers=default_workers(fallback=max(batcher.max_batch_size, 1)))
+    job_queue.register("design_analysis", run_design_analysis)
+    return job_queue
 
 # Sidebar navigation
 st.sidebar.title("🔮 CrystalViz AI Agent")
@@ -72,6 +192,39 @@ page = st.sidebar.selectbox(
     ["🏠 Home", "📊 Design Analyzer", "📝 Text Extractor", "📈 Data Visualizer", "🤖 AI Assistant"]
 )
 
+# Per-stage timing of this page run; also exported as Prometheus metrics
+get_metrics_server()
+trace = Trace(page.split(" ", 1)[1])
+st.sidebar.checkbox("⏱️ Show performance", key="show_performance",
+                    help="Time and memory of each stage (decode, OCR, model, figures) of this page run")
+
+# Loaded model status, with precision selection and manual unloading to free memory
+with st.sidebar.expander("🧠 Loaded Models"):
+    registry = get_model_registry()
+    for model_stats in registry.stats():
+        # No widget key: the selection always starts from the registry, which every session
+        # shares, so a stale value held by another session cannot switch the model back
+        precision = st.selectbox(
+            f"{model_stats['name']} precision",
+            PRECISION_MODES,
+            index=PRECISION_MODES.index(model_stats["precision"]),
+            help="Applies to every session in this server process; changing it reloads the model. "
+                 "int8 quantizes Linear layers, including GPT-2's Conv1D layers converted to Linear."
+        )
+        if precision != model_stats["precision"]:
+            registry.set_precision(model_stats["name"], precision)
+            st.rerun()
+        if model_stats["loaded"]:
+            st.markdown(
+                f"**{model_stats['name']}** — {model_stats['resident_bytes'] / 1e9:.2f} GB, "
+                f"loaded in {model_stats['load_seconds']:.1f}s"
+            )
+            if st.button("Unload", key=f"unload_{model_stats['name']}"):
+                registry.unload(model_stats["name"])
+                st.rerun()
+        else:
+            st.markdown(f"**{model_stats['name']}** — not loaded")
+
 # Home page
 if page == "🏠 Home":
     st.markdown('<h1 class="main-header">🔮 CrystalViz AI Agent</h1>', unsafe_allow_html=True)
@@ -111,6 +264,11 @@ if page == "🏠 Home":
 
 # Design Analyzer
 elif page == "📊 Design Analyzer":
+    with timed_imports("Design Analyzer"):
+        from preprocessing import prepare_model_image
+        from chart_lint import WARNING
+        from image_classifier import classify_image, prompts_for, rule_based_results, LABELS, UNKNOWN
+    
     st.title("📊 Design Quality Analyzer")
     st.write("Upload an image of your chart, graph, or table for comprehensive design analysis based on professional design standards.")
     
@@ -140,7 +298,7 @@ elif page == "📊 Design Analyzer":
     
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "png", "jpeg"])
     
-    if uploaded_file is not None and models:
+    if uploaded_file is not None:
         col1, col2 = st.columns([1, 1])
         
         with col1:
@@ -148,39 +306,107 @@ elif page == "📊 Design Analyzer":
         
         with col2:
             with st.spinner("🔍 Analyzing design using professional standards..."):
-                # Process image
-                image = cv2.imdecode(np.frombuffer(uploaded_file.read(), cv2.IMREAD_COLOR), cv2.IMREAD_COLOR)
+                # Decode, classify and key an upload once per session; job poll reruns reuse them
+                upload_id = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+                upload = st.session_state.get("design_upload")
+                if upload is None or upload["id"] != upload_id:
+                    with trace.stage("decode"):
+                        image = decode_upload(uploaded_file.getvalue())
+                    # Route to the table or graph prompt set; obvious cases skip the model entirely
+                    with trace.stage("classify"):
+                        classification = classify_image(image)
+                    upload = {"id": upload_id, "image": image, "classification": classification,
+                              "cache_keys": {}, "jobs": {}}
+                    st.session_state["design_upload"] = upload
+                image, classification = upload["image"], upload["classification"]
                 
-                # Enhanced analysis prompts using design rules
-                table_prompts = get_table_analysis_prompts()
-                graph_prompts = get_graph_analysis_prompts()
+                label_names = {label: label.capitalize() for label in LABELS + (UNKNOWN,)}
+                label = st.selectbox(
+                    "Analyze as:", list(label_names), index=list(label_names).index(classification["label"]),
+                    format_func=label_names.get,
+                    help=f"Detected {classification['label']} ({classification['confidence']:.0%} confidence) "
+                         f"in {classification['seconds'] * 1000:.0f} ms"
+                )
+                analysis_prompts = prompts_for(label)
                 
-                # Combine prompts for comprehensive analysis
-                analysis_prompts = [
-                    "Rate this visualization from 1-10 on clarity and readability. Explain your rating.",
-                    "What are the strengths and weaknesses of this design?",
-                    "Suggest 3 specific improvements for this visualization.",
-                    "Is this chart type appropriate for the data being presented? Why or why not?",
-                    "Check for any misleading elements or visual distortions.",
-                    "Evaluate the use of color, labels, and formatting."
-                ]
+                cache = get_analysis_cache()
+                job_queue = get_job_queue()
+                job_id = upload["jobs"].get(label)
+                results = None
+                if job_id is None:
+                    # Reuse earlier results for the same image, model, precision and prompt set
+                    with trace.stage("cache_lookup"):
+                        if label not in upload["cache_keys"]:
+                            upload["cache_keys"][label] = get_vision_batcher().cache_key(image, analysis_prompts)
+                        cache_key = upload["cache_keys"][label]
+                        results = cache.get(cache_key)
+                    
+                    quick_results = rule_based_results(classification) if label == classification["label"] else None
+                    if results is None and quick_results is not None:
+                        if st.button("🧠 Run full AI analysis anyway"):
+                            st.session_state[f"force_model_{cache_key}"] = True
+                        if not st.session_state.get(f"force_model_{cache_key}"):
+                            results = quick_results
+                            st.caption("Answered from the design rules without running the vision model.")
+                    
+                    if results is None:
+                        # Analysis runs on a background worker; later reruns only poll its status.
+                        # Identical uploads share one job; the rules version retires jobs from older rules.
+                        job_id = f"{cache.rules_version[:16]}-{cache_key}"
+                        with trace.stage("preprocess"):
+                            model_image = prepare_model_image(image)
+                        job_queue.submit("design_analysis", {
+                            "image": model_image,
+                            "prompts": analysis_prompts,
+                            "cache_key": cache_key
+                        }, job_id=job_id)
+                        upload["jobs"][label] = job_id
                 
-                results = {}
-                for i, prompt in enumerate(analysis_prompts):
-                    try:
-                        result = models['image_to_text'](image, prompt=prompt)[0]["generated_text"]
-                        results[f"Analysis {i+1}"] = result
-                    except Exception as e:
-                        results[f"Analysis {i+1}"] = f"Error: {e}"
+                if results is None:
+                    job = job_queue.status(job_id)
+                    if job is None:
+                        # Pruned after its TTL; the next rerun finds the result in the analysis cache
+                        upload["jobs"].pop(label)
+                        st.rerun()
+                    if job["status"] == "failed":
+                        st.error(f"Error analyzing design: {job['error']}")
+                        if st.button("🔁 Retry analysis"):
+                            # Dropping the job makes the next rerun preprocess and submit it again
+                            upload["jobs"].pop(label)
+                            st.rerun()
+                        st.stop()
+                    if job["status"] != "done":
+                        st.info(f"⏳ Analysis {job['status']} "
+                                f"({job_queue.pending_count()} job(s) in the queue)...")
+                        time.sleep(JOB_POLL_SECONDS)
+                        st.rerun()
+                    results = job["result"]
+                    # The job ran across earlier reruns; its queue wait and run time come from the job record
+                    if job["started"] is not None and job["finished"] is not None:
+                        trace.add("model.queue_wait", job["started"] - job["created"])
+                        trace.add("model", job["finished"] - job["started"])
                 
                 # Display results
                 st.success("✅ Analysis Complete!")
+                cache_stats = cache.stats()
+                st.caption(f"Analysis cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
                 
                 # Display comprehensive analysis
                 for title, content in results.items():
                     with st.expander(title):
                         st.write(content)
                 
+                # Measured misleading elements (aspect ratio, zero baseline, 3D shading) and table formatting
+                st.subheader("🚩 Measured Design Issues")
+                misleading = measure_upload(uploaded_file.getvalue(), label, _trace=trace)
+                if not misleading["findings"]:
+                    st.success("No measurable design issues found.")
+                for finding in misleading["findings"]:
+                    show = st.warning if finding["severity"] == WARNING else st.info
+                    show(f"{finding['message']}\n\n*Rule: {finding['guideline']}*")
+                with st.expander(f"📐 Measurements ({misleading['seconds'] * 1000:.0f} ms)"):
+                    st.json(misleading["measurements"])
+                
                 # Add design standards checklist
                 st.subheader("📋 Design Standards Checklist")
                 
@@ -198,9 +424,16 @@ elif page == "📊 Design Analyzer":
                 
                 # Chart types to avoid warning
                 st.warning("⚠️ **Chart Types to Avoid:** " + ", ".join(CHART_TYPES_TO_AVOID))
+                show_performance(trace)
 
 # Text Extractor
 elif page == "📝 Text Extractor":
+    with timed_imports("Text Extractor"):
+        import pandas as pd
+        from chart_lint import WARNING
+        from ocr_engine import cached_ocr_image_words
+        from table_ocr import reconstruct_table, check_table_rules
+    
     st.title("📝 Text Extraction & Analysis")
     st.write("Extract text from images and analyze its content.")
     
@@ -215,11 +448,14 @@ elif page == "📝 Text Extractor":
         with col2:
             with st.spinner("📝 Extracting text..."):
                 # Process image
-                image = cv2.imdecode(np.frombuffer(uploaded_file.read(), cv2.IMREAD_COLOR), cv2.IMREAD_COLOR)
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                with trace.stage("decode"):
+                    image = decode_upload(uploaded_file.getvalue())
                 
-                # Extract text
-                extracted_text = pytesseract.image_to_string(gray)
+                # One Tesseract pass (cached by image content) yields the text, word boxes and any table grid
+                with trace.stage("ocr"):
+                    ocr_result = cached_ocr_image_words(image, get_ocr_cache())
+                extracted_text = ocr_result["text"]
+                words = ocr_result["words"]
                 
                 st.success("✅ Text Extraction Complete!")
                 
@@ -227,6 +463,22 @@ elif page == "📝 Text Extractor":
                 st.subheader("Extracted Text:")
                 st.text_area("Text Content", extracted_text, height=200)
                 
+                if words:
+                    with st.expander(f"🔤 Word boxes ({len(words)} words)"):
+                        st.dataframe(pd.DataFrame(words).drop(columns=["line"]))
+                
+                with trace.stage("table_reconstruction"):
+                    table = reconstruct_table(words)
+                if table is not None:
+                    st.subheader("📋 Reconstructed Table")
+                    st.dataframe(table["frame"])
+                    for finding in check_table_rules(table):
+                        show = st.warning if finding["severity"] == WARNING else st.info
+                        show(f"{finding['message']}\n\n*Rule: {finding['guideline']}*")
+                    if st.button("📈 Send table to Data Visualizer"):
+                        st.session_state.ocr_table = table["frame"]
+                        st.success("Table sent. Open 📈 Data Visualizer and choose \"📋 OCR Table\".")
+                
                 # Text analysis
                 if extracted_text.strip():
                     word_count = len(extracted_text.split())
@@ -239,14 +491,33 @@ elif page == "📝 Text Extractor":
                         st.metric("Characters", char_count)
                     with col3:
                         st.metric("Lines", len(extracted_text.split('\n')))
+                show_performance(trace)
 
 # Data Visualizer
 elif page == "📈 Data Visualizer":
+    with timed_imports("Data Visualizer"):
+        import numpy as np
+        import pandas as pd
+        import plotly.express as px
+        from chart_lint import lint_figure, WARNING
+        from data_ingest import StreamingAggregator, aggregate_frames, read_csv_streaming
+        from dataset_cache import fingerprint as dataset_fingerprint
+        from downsampling import (
+            downsample_line, downsample_scatter, MAX_LINE_POINTS, MAX_FULL_RESOLUTION_POINTS
+        )
+        from schema_inference import (
+            profile_frame, propose_mappings, columns_for_role, apply_schema, DATETIME,
+            category_totals as schema_category_totals
+        )
+    
     st.title("📈 Interactive Data Visualizer")
     st.write("Create beautiful visualizations from your data.")
     
     # Sample data or file upload
-    data_option = st.radio("Choose data source:", ["📊 Sample Data", "📁 Upload CSV"])
+    data_sources = ["📊 Sample Data", "📁 Upload CSV"]
+    if "ocr_table" in st.session_state:
+        data_sources.append("📋 OCR Table")
+    data_option = st.radio("Choose data source:", data_sources)
     
     if data_option == "📊 Sample Data":
         # Generate sample data
@@ -259,13 +530,80 @@ elif page == "📈 Data Visualizer":
             'Category': np.random.choice(['A', 'B', 'C'], 100)
         })
         
+        dataset_id = "sample-data-42"
+        
         st.subheader("Sample Sales Data")
         st.dataframe(data.head())
         
+    elif data_option == "📋 OCR Table":
+        # Table reconstructed by the Text Extractor
+        data = st.session_state.ocr_table
+        dataset_id = "ocr-" + dataset_fingerprint(data.to_csv(index=False).encode())
+        
+        st.subheader("OCR Table")
+        st.dataframe(data.head())
+        
     else:
         uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
+        large_file_mode = st.checkbox(
+            "⚡ Large file mode",
+            help="Stream the CSV in chunks with compact dtypes. Bar and Pie charts use exact totals; "
+                 "Line, Scatter and Box charts use a uniform sample of rows."
+        )
         if uploaded_file is not None:
-            data = pd.read_csv(uploaded_file)
+            # Uploads are converted to Parquet once per distinct file and reloaded memory-mapped
+            dataset_cache = get_dataset_cache()
+            dataset_key = upload_fingerprint(uploaded_file)
+            uploaded_file.seek(0)
+        
+        if uploaded_file is not None and large_file_mode:
+            dataset_id = f"{dataset_key}:large"
+            progress = st.empty()
+            
+            def large_ingest(value=None, category=None):
+                """One pass over the upload: a row sample plus exact totals of value by category"""
+                def ingest():
+                    aggregator = StreamingAggregator(value=value, category=category)
+                    show_progress = lambda rows: progress.caption(f"Read {rows:,} rows...")
+                    if dataset_cache.contains(dataset_key):
+                        stats = aggregate_frames(
+                            dataset_cache.iter_frames(dataset_key), aggregator, progress_callback=show_progress
+                        )
+                    else:
+                        with dataset_cache.writer(dataset_key) as part_writer:
+                            stats = read_csv_streaming(
+                                uploaded_file, aggregator,
+                                progress_callback=show_progress, on_chunk=part_writer.write
+                            )
+                    return aggregator.sample(), aggregator.category_totals(), stats
+                
+                # Each pass is reused until the upload changes
+                result = get_figure_cache().aggregate((dataset_id, "ingest", value, category), ingest)
+                progress.empty()
+                return result
+            
+            with trace.stage("csv_ingest"):
+                data, _, ingest_stats = large_ingest()
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Rows", f"{ingest_stats['rows']:,}")
+            with col2:
+                st.metric("Rows/sec", f"{ingest_stats['rows_per_second']:,.0f}")
+            with col3:
+                peak_rss = ingest_stats['peak_rss_bytes']
+                st.metric("Peak Memory", f"{peak_rss / 1e6:,.0f} MB" if peak_rss else "n/a")
+            
+            st.subheader("Uploaded Data (sample)")
+            st.dataframe(data.head())
+        elif uploaded_file is not None:
+            dataset_id = dataset_key
+            with trace.stage("csv_parse"):
+                try:
+                    data = load_dataset(dataset_key)
+                except KeyError:
+                    data = pd.read_csv(uploaded_file)
+                    dataset_cache.store(dataset_key, data)
             st.subheader("Uploaded Data")
             st.dataframe(data.head())
         else:
@@ -278,30 +616,144 @@ elif page == "📈 Data Visualizer":
             "Choose chart type:",
             ["📈 Line Chart", "📊 Bar Chart", "🫧 Scatter Plot", "🥧 Pie Chart", "📦 Box Plot"]
         )
+        chart_kind = CHART_KINDS[chart_type]
+        
+        # Figures, shared aggregates and the column profile are memoized per dataset
+        figure_cache = get_figure_cache()
+        with trace.stage("profile"):
+            profile = figure_cache.aggregate((dataset_id, "profile"), lambda: profile_frame(data))
+        proposal = propose_mappings(profile)[chart_kind]
+        
+        # Column mapping, prefilled from the inferred schema
+        def column_selector(label, role, optional=False):
+            options = columns_for_role(profile, chart_kind, role)
+            if optional:
+                options = [None] + options
+            suggested = proposal[role]
+            index = options.index(suggested) if suggested in options else 0
+            return st.selectbox(label, options, index=index, key=f"{chart_kind}_{role}",
+                                format_func=lambda column: "None" if column is None else column)
+        
+        x_labels = {"line": "X axis", "scatter": "X axis"}
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            x = column_selector(x_labels.get(chart_kind, "Group by"), "x")
+        with col2:
+            y = column_selector("Y axis" if chart_kind in x_labels else "Value", "y")
+        with col3:
+            color = column_selector("Color", "color", optional=True) if chart_kind == "scatter" else None
+        
+        if x is None or y is None or x == y:
+            st.warning("This dataset has no suitable columns for this chart type. Try another chart type.")
+            st.stop()
+        
+        def category_totals():
+            """Exact totals of y by x; large files get a dedicated pass over the cached dataset"""
+            if dataset_id.endswith(":large"):
+                return large_ingest(y, x)[1]
+            return figure_cache.aggregate(
+                (dataset_id, "sum", x, y),
+                lambda: schema_category_totals(data, profile, x, y)
+            )
+        
+        caption = None
         
         if chart_type == "📈 Line Chart":
-            fig = px.line(data, x='Date', y='Sales', title='Sales Over Time')
-            st.plotly_chart(fig, use_container_width=True)
+            x_is_date = profile["columns"][x]["kind"] == DATETIME
+            line_frame = apply_schema(data, profile, [x, y])
+            # Large series are reduced with LTTB; full resolution is available for a zoomed range
+            full_resolution = st.checkbox("🔍 Full resolution for a date range") if x_is_date else False
+            date_range = None
+            if full_resolution:
+                dates = line_frame[x]
+                date_range = st.slider(
+                    "Date range",
+                    min_value=dates.min().to_pydatetime(),
+                    max_value=dates.max().to_pydatetime(),
+                    value=(dates.min().to_pydatetime(), dates.max().to_pydatetime())
+                )
+            
+            def build_line_chart():
+                line_data = line_frame
+                if date_range is not None:
+                    dates = line_frame[x]
+                    line_data = line_frame[(dates >= date_range[0]) & (dates <= date_range[1])]
+                max_points = MAX_FULL_RESOLUTION_POINTS if full_resolution else MAX_LINE_POINTS
+                plot_data = downsample_line(line_data, x, y, max_points=max_points)
+                title = f'{y} Over Time' if x_is_date else f'{y} by {x}'
+                fig = px.line(plot_data, x=x, y=y, title=title,
+                              render_mode='webgl' if len(plot_data) > MAX_LINE_POINTS else 'auto')
+                caption = None
+                if len(plot_data) < len(line_data):
+                    caption = f"Showing {len(plot_data):,} of {len(line_data):,} points (shape-preserving LTTB downsampling)"
+                return fig, caption
+            
+            with trace.stage("figure"):
+                fig, caption = figure_cache.figure(
+                    (dataset_id, chart_type, x, y, date_range), build_line_chart
+                )
             
         elif chart_type == "📊 Bar Chart":
-            fig = px.bar(data.groupby('Category')['Sales'].sum().reset_index(), 
-                        x='Category', y='Sales', title='Sales by Category')
-            st.plotly_chart(fig, use_container_width=True)
+            with trace.stage("figure"):
+                fig = figure_cache.figure(
+                    (dataset_id, chart_type, x, y),
+                    lambda: px.bar(category_totals().reset_index(), 
+                                   x=x, y=y, title=f'{y} by {x}')
+                )
             
         elif chart_type == "🫧 Scatter Plot":
-            fig = px.scatter(data, x='Sales', y='Profit', color='Category', 
-                           title='Sales vs Profit')
-            st.plotly_chart(fig, use_container_width=True)
+            def build_scatter_plot():
+                scatter_frame = apply_schema(data, profile, [x, y] + ([color] if color else []))
+                plot_data = downsample_scatter(scatter_frame, x, y, color=color)
+                fig = px.scatter(plot_data, x=x, y=y, color=color, 
+                               title=f'{x} vs {y}', render_mode='webgl')
+                caption = None
+                if len(plot_data) < len(data):
+                    caption = f"Showing {len(plot_data):,} of {len(data):,} points (one point per occupied density cell)"
+                return fig, caption
+            
+            with trace.stage("figure"):
+                fig, caption = figure_cache.figure(
+                    (dataset_id, chart_type, x, y, color), build_scatter_plot
+                )
             
         elif chart_type == "🥧 Pie Chart":
-            category_sales = data.groupby('Category')['Sales'].sum()
-            fig = px.pie(values=category_sales.values, names=category_sales.index, 
-                        title='Sales Distribution by Category')
-            st.plotly_chart(fig, use_container_width=True)
+            def build_pie_chart():
+                totals = category_totals()
+                return px.pie(values=totals.values, names=totals.index, 
+                              title=f'{y} Distribution by {x}')
+            
+            with trace.stage("figure"):
+                fig = figure_cache.figure((dataset_id, chart_type, x, y), build_pie_chart)
             
         elif chart_type == "📦 Box Plot":
-            fig = px.box(data, x='Category', y='Sales', title='Sales Distribution by Category')
+            with trace.stage("figure"):
+                fig = figure_cache.figure(
+                    (dataset_id, chart_type, x, y),
+                    lambda: px.box(apply_schema(data, profile, [x, y]), x=x, y=y,
+                                   title=f'{y} Distribution by {x}')
+                )
+        
+        # Serializing the figure for the browser happens here
+        with trace.stage("render"):
             st.plotly_chart(fig, use_container_width=True)
+        if caption:
+            st.caption(caption)
+        
+        # Rule-based design feedback, no model needed
+        with trace.stage("lint"):
+            lint = lint_figure(fig)
+        with st.expander(f"🧹 Design Lint ({len(lint['findings'])} findings, {lint['seconds'] * 1000:.1f} ms)"):
+            if not lint["findings"]:
+                st.success("No design rule violations found.")
+            for finding in lint["findings"]:
+                show = st.warning if finding["severity"] == WARNING else st.info
+                show(f"**{finding['rule'].replace('_', ' ').capitalize()}:** {finding['message']}\n\n"
+                     f"*Rule: {finding['guideline']}*")
+            st.caption("Rule timings: " + ", ".join(
+                f"{name} {seconds * 1000:.2f} ms" for name, seconds in lint["timings"].items()
+            ))
+        show_performance(trace)
 
 # AI Assistant
 elif page == "🤖 AI Assistant":
@@ -387,6 +839,8 @@ elif page == "🤖 AI Assistant":
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            if message.get("stats"):
+                st.caption(format_stats(message["stats"]))
     
     # Chat input
     if prompt := st.chat_input("Ask me anything about data visualization..."):
@@ -397,33 +851,35 @@ elif page == "🤖 AI Assistant":
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Generate AI response with design rules context
+        # Generate AI response with design rules context, streamed as it is produced
         with st.chat_message("assistant"):
-            with st.spinner("🤖 Thinking..."):
-                # Enhanced prompt with design rules context
-                enhanced_prompt = f"""
-                You are an expert data visualization consultant. Answer this question: {prompt}
-                
-                Use these professional design standards in your response:
-                - Table rules: {TABLE_RULES['formatting'][:3]}
-                - Graph rules: {GRAPH_RULES['de_cluttering'][:3]}
-                - Avoid these chart types: {CHART_TYPES_TO_AVOID}
-                - Watch for misleading elements: {MISLEADING_ELEMENTS['visual_distortions'][:2]}
-                
-                Provide practical, actionable advice based on these standards.
-                """
-                
-                if models and 'text_generation' in models:
-                    try:
-                        response = models['text_generation'](enhanced_prompt, max_length=300)[0]['generated_text']
-                        st.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
-                    except Exception as e:
-                        st.error(f"Error generating response: {e}")
-                else:
-                    response = "I'm here to help with data visualization based on professional design standards! What would you like to know about table design, graph creation, or avoiding common mistakes?"
-                    st.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+            with trace.stage("rule_retrieval"):
+                enhanced_prompt = build_assistant_prompt(prompt)
+            with trace.stage("model_load"):
+                text_model = load_page_model('text_generation')
+            
+            if text_model is not None:
+                try:
+                    placeholder = st.empty()
+                    response = ""
+                    generation_stats = {}
+                    with trace.stage("generate"):
+                        for chunk in stream_generate(text_model, enhanced_prompt, max_length=300,
+                                                     stats=generation_stats):
+                            response += chunk
+                            placeholder.markdown(response + "▌")
+                    placeholder.markdown(response)
+                    st.caption(format_stats(generation_stats))
+                    st.session_state.messages.append(
+                        {"role": "assistant", "content": response, "stats": generation_stats}
+                    )
+                except Exception as e:
+                    st.error(f"Error generating response: {e}")
+            else:
+                response = "I'm here to help with data visualization based on professional design standards! What would you like to know about table design, graph creation, or avoiding common mistakes?"
+                st.markdown(response)
+                st.session_state.messages.append({"role": "assistant", "content": response})
+    show_performance(trace)
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,72 @@
+"""
+Figure Cache
+Memoizes built chart figures and the group-by aggregates they share
+"""
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_FIGURES = 32
+DEFAULT_MAX_AGGREGATES = 64
+
+
+class _LRU:
+    """Thread-safe least-recently-used map with a fixed number of entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Build outside the lock so one slow figure does not block other sessions
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FigureCache:
+    """Bounded caches of figures and aggregates keyed on dataset fingerprint and chart parameters
+
+    Keys are tuples starting with the dataset fingerprint, e.g.
+    (fingerprint, "📊 Bar Chart", "Category", "Sales"). Cached values must be
+    treated as read-only because every session shares them.
+    """
+
+    def __init__(self, max_figures=DEFAULT_MAX_FIGURES, max_aggregates=DEFAULT_MAX_AGGREGATES):
+        self._figures = _LRU(max_figures)
+        self._aggregates = _LRU(max_aggregates)
+
+    def figure(self, key, build):
+        """Return the cached figure for key, calling build() on a miss"""
+        return self._figures.get_or_build(key, build)
+
+    def aggregate(self, key, compute):
+        """Return a cached aggregate (e.g. group-by totals) shared across chart types"""
+        return self._aggregates.get_or_build(key, compute)
+
+    def stats(self):
+        """Hit/miss counters and sizes of both caches"""
+        return {
+            "figure_hits": self._figures.hits,
+            "figure_misses": self._figures.misses,
+            "figures": len(self._figures),
+            "aggregate_hits": self._aggregates.hits,
+            "aggregate_misses": self._aggregates.misses,
+            "aggregates": len(self._aggregates),
+        }
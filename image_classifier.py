@@ -0,0 +1,236 @@
+"""
+Image Classifier
+Fast OpenCV heuristics that label an upload as a table or a chart type before any model runs
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from design_rules import (
+    CHART_TYPES_TO_AVOID, get_general_analysis_prompts,
+    get_graph_analysis_prompts, get_table_analysis_prompts
+)
+
+LABELS = ("table", "bar", "line", "pie", "scatter")
+UNKNOWN = "unknown"
+# Long side of the working copy; every feature is scale-free, so this only bounds cost
+CLASSIFY_SIDE = 512
+MIN_CONFIDENCE = 0.5
+# Pie charts are on the avoid list whatever else is wrong with them
+SKIP_MODEL_LABELS = ("pie",)
+SKIP_MODEL_CONFIDENCE = 0.8
+
+
+def _ink_mask(gray):
+    """Foreground (ink) pixels of a document-like image, whatever its background colour"""
+    if gray.mean() < 128:
+        gray = 255 - gray
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return mask
+
+
+def _line_components(mask, horizontal):
+    """Bounding boxes of long horizontal (or vertical) strokes"""
+    height, width = mask.shape
+    size = (max(width // 8, 10), 1) if horizontal else (1, max(height // 8, 10))
+    lines = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, size))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(lines)
+    return lines, stats[1:count]
+
+
+def _shapes(mask, min_area):
+    """Filled shape statistics (area, extent, circularity, box) of a binary mask"""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    shapes = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < min_area:
+            continue
+        x, y, w, h = cv2.boundingRect(contour)
+        perimeter = cv2.arcLength(contour, True)
+        shapes.append({
+            "area": area,
+            "extent": area / float(w * h),
+            "circularity": 4 * np.pi * area / (perimeter * perimeter) if perimeter else 0.0,
+            "box": (x, y, w, h),
+        })
+    return shapes
+
+
+def _text_grid(text, width, height):
+    """(rows, aligned_columns) of words laid out in a grid, as in tables without rules"""
+    words_mask = cv2.dilate(text, cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 60, 3), 1)))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(words_mask)
+    words = stats[1:count]
+    words = words[(words[:, cv2.CC_STAT_HEIGHT] < height * 0.06) & (words[:, cv2.CC_STAT_WIDTH] > 3)]
+    if len(words) < 8:
+        return 0, 0
+    # Rows: words whose vertical centres fall in the same band of text height
+    centers = words[:, cv2.CC_STAT_TOP] + words[:, cv2.CC_STAT_HEIGHT] // 2
+    band = max(int(np.median(words[:, cv2.CC_STAT_HEIGHT])), 1)
+    row_ids, row_sizes = np.unique(centers // band, return_counts=True)
+    rows = row_ids[row_sizes >= 2]
+    if len(rows) < 3:
+        return len(rows), 0
+    # Columns: left edges (or right edges, for right-aligned numbers) repeated on most rows
+    in_rows = np.isin(centers // band, rows)
+    columns = 0
+    for edges in (words[:, cv2.CC_STAT_LEFT], words[:, cv2.CC_STAT_LEFT] + words[:, cv2.CC_STAT_WIDTH]):
+        bins = edges[in_rows] // max(width // 100, 1)
+        rows_per_bin = {}
+        for bin_id, row in zip(bins, (centers // band)[in_rows]):
+            rows_per_bin.setdefault(bin_id, set()).add(row)
+        columns = max(columns, sum(1 for found in rows_per_bin.values() if len(found) >= 0.5 * len(rows)))
+    return len(rows), columns
+
+
+def extract_features(image):
+    """Scale-free layout features: ruling lines, text density, colour and mark shapes"""
+    height, width = image.shape[:2]
+    scale = min(1.0, CLASSIFY_SIDE / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    height, width = image.shape[:2]
+    pixels = float(height * width)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    ink = _ink_mask(gray)
+    h_lines, h_stats = _line_components(ink, horizontal=True)
+    v_lines, v_stats = _line_components(ink, horizontal=False)
+
+    # Text: small ink components left over once ruling lines are removed
+    text = cv2.subtract(ink, cv2.bitwise_or(h_lines, v_lines))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(text)
+    glyphs = stats[1:count]
+    glyphs = glyphs[(glyphs[:, cv2.CC_STAT_HEIGHT] < height * 0.06) & (glyphs[:, cv2.CC_STAT_AREA] >= 2)]
+
+    text_rows, text_columns = _text_grid(text, width, height)
+
+    # Data marks are usually drawn in colour; axes, gridlines and text rarely are
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    colored = ((hsv[..., 1] > 60) & (hsv[..., 2] > 40)).astype(np.uint8) * 255
+    hues = hsv[..., 0][colored > 0]
+    hue_histogram = np.bincount(hues // 15, minlength=12) if len(hues) else np.zeros(12, int)
+    dominant_hues = int((hue_histogram > 0.05 * max(len(hues), 1)).sum())
+
+    shapes = _shapes(colored, min_area=pixels * 0.0005)
+    small_marks = [s for s in _shapes(colored, min_area=4) if s["area"] < pixels * 0.002]
+    closed = cv2.morphologyEx(colored, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7)))
+    blobs = _shapes(closed, min_area=pixels * 0.05)
+
+    return {
+        "width": width,
+        "height": height,
+        "ink_ratio": float((ink > 0).mean()),
+        "colored_ratio": float((colored > 0).mean()),
+        "dominant_hues": dominant_hues,
+        "h_lines": len(h_stats),
+        "h_spanning": int((h_stats[:, cv2.CC_STAT_WIDTH] > width * 0.6).sum()) if len(h_stats) else 0,
+        "v_lines": len(v_stats),
+        "glyphs": len(glyphs),
+        "glyph_ratio": float(glyphs[:, cv2.CC_STAT_AREA].sum() / pixels) if len(glyphs) else 0.0,
+        "text_rows": text_rows,
+        "text_columns": text_columns,
+        "rectangles": [s["box"] for s in shapes if s["extent"] > 0.85],
+        "thin_curves": sum(1 for s in shapes if s["extent"] < 0.3 and s["box"][2] > width * 0.3),
+        "small_marks": len(small_marks),
+        # A filled disc has circularity near 1 and fills pi/4 of its square bounding box
+        "round_blob": max((s["circularity"] for s in blobs
+                           if 0.7 < s["extent"] < 0.85 and 0.8 < s["box"][2] / s["box"][3] < 1.25), default=0.0),
+    }
+
+
+def _aligned(values, tolerance):
+    """Whether most values sit at the same coordinate (e.g. bars sharing a baseline)"""
+    values = np.asarray(values)
+    return len(values) >= 2 and (np.abs(values - np.median(values)) <= tolerance).mean() >= 0.7
+
+
+def score_features(features):
+    """Score in [0, 1] for each label"""
+    width, height = features["width"], features["height"]
+    boxes = np.array(features["rectangles"]).reshape(-1, 4)
+    bars = 0.0
+    if len(boxes) >= 2:
+        bottoms = boxes[:, 1] + boxes[:, 3]
+        lefts = boxes[:, 0]
+        if _aligned(bottoms, height * 0.02) or _aligned(lefts, width * 0.02):
+            bars = min(1.0, 0.5 + 0.1 * len(boxes))
+
+    ruled = min(features["h_spanning"], 6) / 6.0
+    texty = min(features["glyphs"] / 150.0, 1.0)
+    uncolored = 1.0 - min(features["colored_ratio"] / 0.05, 1.0)
+    ruled_table = 0.45 * ruled + 0.35 * texty + 0.2 * min(features["v_lines"], 3) / 3.0
+    # Borderless tables: words on several rows sharing several column edges
+    grid_table = 0.0
+    if features["text_rows"] >= 4 and features["text_columns"] >= 2:
+        grid_table = min(1.0, 0.4 + 0.05 * features["text_rows"] + 0.1 * features["text_columns"])
+    table = max(ruled_table, grid_table) * (0.4 + 0.6 * uncolored)
+    if features["glyphs"] < 20:
+        table *= 0.3
+
+    line = min(1.0, 0.6 * features["thin_curves"]) if features["thin_curves"] else 0.0
+    pie = max(0.0, (features["round_blob"] - 0.6) / 0.3) if features["dominant_hues"] >= 2 else \
+        max(0.0, (features["round_blob"] - 0.75) / 0.3)
+    scatter = min(1.0, max(0, features["small_marks"] - 10) / 40.0)
+    return {
+        "table": round(float(min(table, 1.0)), 3),
+        "bar": round(float(bars), 3),
+        "line": round(float(line), 3),
+        "pie": round(float(min(pie, 1.0)), 3),
+        "scatter": round(float(scatter), 3),
+    }
+
+
+def classify_image(image):
+    """Label an OpenCV image as table, bar, line, pie, scatter or unknown
+
+    Returns {"label", "confidence", "scores", "features", "seconds"}; the label is
+    "unknown" when no score reaches MIN_CONFIDENCE.
+    """
+    start = time.perf_counter()
+    features = extract_features(image)
+    scores = score_features(features)
+    label = max(scores, key=scores.get)
+    confidence = scores[label]
+    if confidence < MIN_CONFIDENCE:
+        label = UNKNOWN
+    return {
+        "label": label,
+        "confidence": confidence,
+        "scores": scores,
+        "features": {key: value for key, value in features.items() if key != "rectangles"},
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def prompts_for(label):
+    """Analysis prompt set matching a classifier label"""
+    if label == "table":
+        return get_table_analysis_prompts()
+    if label in LABELS:
+        return get_graph_analysis_prompts()
+    return get_general_analysis_prompts()
+
+
+def rule_based_results(classification):
+    """Design feedback for obvious cases that need no model call, otherwise None
+
+    A confidently detected pie chart is already on the chart-types-to-avoid list,
+    so the result says so directly instead of spending a vision-model call.
+    """
+    label = classification["label"]
+    if label not in SKIP_MODEL_LABELS or classification["confidence"] < SKIP_MODEL_CONFIDENCE:
+        return None
+    avoided = next(name for name in CHART_TYPES_TO_AVOID if name.startswith(label))
+    return {
+        "Chart Type": (
+            f"This looks like a {label} chart ({classification['confidence']:.0%} confidence). "
+            f"{avoided.capitalize()} are on the list of chart types to avoid: readers compare angles "
+            f"and areas poorly. Show the same values as a sorted bar chart, labelled directly."
+        )
+    }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+CrystalViz Import Budget
+Time the imports each Streamlit page needs and check them against a budget
+
+The apps import heavy libraries (pandas, OpenCV, Plotly, Tesseract bindings)
+inside ``with timed_imports("<page>"):`` blocks, so a process only pays for the
+pages it renders. At runtime each block records how long its first execution
+took; the command line measures every block cold, each page in a fresh
+interpreter after the app's "startup" block. Examples:
+
+    python import_budget.py
+    python import_budget.py app.py --json startup.json
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+STARTUP = "startup"
+# Targets in seconds: about twice the cold import time measured on a small container,
+# leaving room for the pytesseract fallback, which imports pandas
+DEFAULT_BUDGETS = {
+    STARTUP: 1.0,
+    "Design Analyzer": 1.0,
+    "Text Extractor": 1.0,
+    "Data Visualizer": 1.5,
+    "Design Rater": 1.0,
+}
+DEFAULT_BUDGET = float(os.environ.get("CRYSTALVIZ_IMPORT_BUDGET", "1.0"))
+
+_records = {}
+_lock = threading.Lock()
+
+
+def budget_for(page, budgets=None):
+    """Import budget in seconds for a page"""
+    return (budgets or DEFAULT_BUDGETS).get(page, DEFAULT_BUDGET)
+
+
+@contextmanager
+def timed_imports(page):
+    """Time the imports in the enclosed block; only runs that load new modules are recorded"""
+    before = set(sys.modules)
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    loaded = sorted(set(sys.modules) - before)
+    if loaded:
+        with _lock:
+            _records.setdefault(page, {"page": page, "seconds": seconds, "modules": len(loaded),
+                                       "budget": budget_for(page), "over_budget": seconds > budget_for(page)})
+
+
+def import_report():
+    """First-use import time of each page in this process, in the order pages were opened"""
+    with _lock:
+        return [dict(record) for record in _records.values()]
+
+
+def import_blocks(path):
+    """{page: import source} for every ``with timed_imports("page"):`` block in an app file"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    blocks = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.With):
+            continue
+        for item in node.items:
+            call = item.context_expr
+            if (isinstance(call, ast.Call) and getattr(call.func, "id", None) == "timed_imports"
+                    and call.args and isinstance(call.args[0], ast.Constant)):
+                statements = [ast.unparse(statement) for statement in node.body
+                              if isinstance(statement, (ast.Import, ast.ImportFrom))]
+                blocks.setdefault(call.args[0].value, []).extend(statements)
+    return {page: "\n".join(statements) for page, statements in blocks.items()}
+
+
+_MEASURE = """
+import json, sys, time
+start = time.perf_counter(); modules = len(sys.modules)
+exec(compile(sys.argv[1], "<startup>", "exec"))
+startup = time.perf_counter() - start; startup_modules = len(sys.modules) - modules
+start = time.perf_counter(); modules = len(sys.modules)
+exec(compile(sys.argv[2], "<page>", "exec"))
+print(json.dumps([startup, startup_modules, time.perf_counter() - start, len(sys.modules) - modules]))
+"""
+
+
+def measure_cold(startup_source, page_source, cwd):
+    """(startup_seconds, startup_modules, page_seconds, page_modules) in a fresh interpreter"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    output = subprocess.run(
+        [sys.executable, "-c", _MEASURE, startup_source, page_source],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return tuple(json.loads(output.strip().splitlines()[-1]))
+
+
+def build_report(path, budgets=None):
+    """Cold import time of the startup block and of every page block in path"""
+    blocks = import_blocks(path)
+    startup_source = blocks.pop(STARTUP, "")
+    cwd = os.path.dirname(os.path.abspath(path))
+    rows = []
+    startup_times = []
+    for page, source in blocks.items():
+        startup_seconds, startup_modules, seconds, modules = measure_cold(startup_source, source, cwd)
+        startup_times.append((startup_seconds, startup_modules))
+        rows.append({"page": page, "seconds": round(seconds, 3), "modules": modules,
+                     "budget": budget_for(page, budgets), "over_budget": seconds > budget_for(page, budgets)})
+    if not startup_times:
+        startup_times.append(measure_cold(startup_source, "", cwd)[:2])
+    # Every page run re-measures startup; the median is the least noisy estimate
+    startup_seconds, startup_modules = sorted(startup_times)[len(startup_times) // 2]
+    rows.insert(0, {"page": STARTUP, "seconds": round(startup_seconds, 3), "modules": startup_modules,
+                    "budget": budget_for(STARTUP, budgets),
+                    "over_budget": startup_seconds > budget_for(STARTUP, budgets)})
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-page import time of a CrystalViz app")
+    parser.add_argument("app", nargs="?", default="enhanced_ai_agent.py", help="Streamlit app file")
+    parser.add_argument("--json", help="Also write the report rows to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from precision_report import format_table
+
+    args = parse_args(argv)
+    rows = build_report(args.app)
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    over = [row["page"] for row in rows if row["over_budget"]]
+    if over:
+        print(f"Over the import budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
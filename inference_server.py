@@ -0,0 +1,130 @@
+"""
+Inference Server
+Coalesces vision-model requests from concurrent sessions into micro-batches
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("CRYSTALVIZ_MAX_BATCH_SIZE", "4"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("CRYSTALVIZ_MAX_WAIT_MS", "50"))
+
+
+class MicroBatcher:
+    """Collects requests for up to max_wait_ms and runs them as one batch
+
+    run_batch(requests) must return one result per request, in order. Each
+    submit() returns a Future resolved with that request's result.
+    """
+
+    def __init__(self, run_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="crystalviz-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, request):
+        """Queue one request and return a Future for its result"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or the window closes"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Close requested: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [(request, future) for request, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.run_batch([request for request, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.requests += len(batch)
+
+    def close(self):
+        """Stop accepting requests and let the worker drain the queue"""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """Number of batches run and the mean requests per batch"""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+
+class VisionBatcher(MicroBatcher):
+    """MicroBatcher over (image, prompts) requests that knows what its answers depend on"""
+
+    def __init__(self, registry, run_batch, max_batch_size, max_wait_ms, max_new_tokens):
+        super().__init__(run_batch, max_batch_size, max_wait_ms)
+        self.registry = registry
+        self.max_new_tokens = max_new_tokens
+
+    def cache_key(self, image, prompts):
+        """Analysis cache key for a request, covering the model's current precision and answer length"""
+        from analysis_cache import analysis_key
+        from model_registry import LLAVA_MODEL_ID
+
+        return analysis_key(image, LLAVA_MODEL_ID, prompts, self.registry.precision("image_to_text"),
+                            self.max_new_tokens)
+
+
+def make_vision_batcher(registry, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                        max_new_tokens=None, max_batch_rows=None):
+    """VisionBatcher backed by the registry's LLaVA pipeline
+
+    Coalesced requests are split into generate calls of at most max_batch_rows
+    (image, prompt) rows (default: analysis_engine.MODEL_BATCH_ROWS, else one
+    prompt set), so memory stays bounded however many sessions are batched together.
+    """
+    from analysis_engine import DEFAULT_MAX_NEW_TOKENS, analyze_requests
+
+    max_new_tokens = max_new_tokens or DEFAULT_MAX_NEW_TOKENS
+
+    def run_batch(requests):
+        pipe = registry.get("image_to_text")
+        return analyze_requests(pipe, requests, batch_size=max_batch_rows, max_new_tokens=max_new_tokens)
+
+    return VisionBatcher(registry, run_batch, max_batch_size, max_wait_ms, max_new_tokens)
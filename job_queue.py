@@ -0,0 +1,186 @@
+"""
+Background Job Queue
+Runs analysis jobs on worker threads and persists their status and results in SQLite
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_cache import DEFAULT_CACHE_DIR
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Finished jobs are kept this long for sessions still polling them; results outlive them in AnalysisCache
+DEFAULT_TTL_SECONDS = float(os.environ.get("CRYSTALVIZ_JOB_TTL_SECONDS", "3600"))
+
+
+def default_workers(fallback=1):
+    """Worker count from CRYSTALVIZ_JOB_WORKERS, or fallback when it is not set"""
+    return int(os.environ.get("CRYSTALVIZ_JOB_WORKERS") or fallback)
+
+
+def _process_alive(pid):
+    """True if a process with this id is running on this machine"""
+    if pid is None:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows, so just try to open it
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Local job queue: submit returns a job id, callers poll status() for the result
+
+    Several server processes may share one jobs.sqlite. Each job records the pid
+    of the process running it, and only jobs whose process has exited are
+    failed as interrupted.
+    """
+
+    def __init__(self, path=None, workers=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite")
+        self.workers = workers or default_workers()
+        self.ttl_seconds = ttl_seconds
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crystalviz-job")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created REAL NOT NULL, started REAL, finished REAL, owner INTEGER)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+        self._conn.commit()
+        self.recover()
+        self.prune()
+
+    def recover(self):
+        """Fail queued and running jobs whose owning process has exited; returns the count
+
+        Payloads live in memory only, so such jobs can never finish. Jobs owned by
+        live processes sharing this database are left alone.
+        """
+        with self._lock:
+            owners = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            )]
+            dead = [owner for owner in owners if not _process_alive(owner)]
+            failed = 0
+            for owner in dead:
+                failed += self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = 'Interrupted by restart', finished = ? "
+                    "WHERE status IN (?, ?) AND owner IS ?",
+                    (FAILED, time.time(), QUEUED, RUNNING, owner)
+                ).rowcount
+            self._conn.commit()
+        return failed
+
+    def register(self, kind, handler):
+        """Register handler(payload) -> JSON-serialisable result for a job kind"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, job_id=None):
+        """Queue a job and return its id
+
+        Passing a deterministic job_id (e.g. a content hash) deduplicates work: if a
+        job with that id is already queued, running or done (and not yet pruned),
+        it is not run again, unless the process that queued it has exited.
+        """
+        if kind not in self._handlers:
+            raise KeyError(f"No handler registered for job kind: {kind}")
+        job_id = job_id or uuid.uuid4().hex
+        self.prune()
+        with self._lock:
+            row = self._conn.execute("SELECT status, owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and (row[0] == DONE or row[0] in (QUEUED, RUNNING) and _process_alive(row[1])):
+                return job_id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, status, created, owner) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, time.time(), os.getpid())
+            )
+            self._conn.commit()
+        self._executor.submit(self._run, job_id, kind, payload)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _run(self, job_id, kind, payload):
+        self._update(job_id, status=RUNNING, started=time.time())
+        try:
+            result = self._handlers[kind](payload)
+            self._update(job_id, status=DONE, result=json.dumps(result), finished=time.time())
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=str(e), finished=time.time())
+
+    def prune(self, now=None):
+        """Delete done and failed jobs that finished more than ttl_seconds ago; returns the count"""
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (DONE, FAILED, cutoff)
+            ).rowcount
+            self._conn.commit()
+        return deleted
+
+    def status(self, job_id):
+        """Current state of a job as a dict, or None if the id is unknown"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, result, error, created, started, finished FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "kind", "status", "result", "error", "created", "started", "finished"), row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def pending_count(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+
+    def wait(self, job_id, timeout=None, interval=0.05):
+        """Block until a job finishes (or timeout elapses) and return its status"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(interval)
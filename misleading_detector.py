@@ -0,0 +1,260 @@
+"""
+Misleading Element Detector
+Pixel measurements behind MISLEADING_ELEMENTS: aspect ratio, axis positions,
+zero baseline (from OCR'd tick labels) and 3D shading signatures
+"""
+
+import re
+import time
+
+import cv2
+import numpy as np
+
+from chart_lint import INFO, WARNING
+from design_rules import MISLEADING_ELEMENTS
+
+# Measurements run on a copy whose long side is at most this; OCR word boxes are scaled to match
+MEASURE_SIDE = 1024
+# Plot-area width / height outside this band distorts the apparent slope of trends
+MIN_ASPECT_RATIO = 0.75
+MAX_ASPECT_RATIO = 3.0
+# An axis line must span at least this fraction of the image
+MIN_AXIS_FRACTION = 0.4
+# Baseline values within this fraction of the labelled range count as zero
+ZERO_TOLERANCE = 0.05
+THREE_D_MIN_SCORE = 0.5
+
+_NUMBER = re.compile(r"^[-+(]?[$€£]?(?P<digits>\d{1,3}(?:,\d{3})+|\d+)(?P<fraction>\.\d+)?\)?(?P<suffix>[%kKmMbB]?)$")
+_SUFFIX = {"": 1, "%": 1, "k": 1e3, "m": 1e6, "b": 1e9}
+
+
+def _finding(rule, severity, message, guideline):
+    return {"rule": rule, "severity": severity, "message": message, "guideline": guideline}
+
+
+def parse_number(text):
+    """Numeric value of a tick label such as "1,200", "$3.5k", "40%" or "(12)"; None otherwise"""
+    text = text.strip().rstrip(".:;")
+    match = _NUMBER.match(text)
+    if not match:
+        return None
+    value = float(match.group("digits").replace(",", "") + (match.group("fraction") or ""))
+    value *= _SUFFIX[match.group("suffix").lower()]
+    if text.startswith("-") or text.startswith("("):
+        value = -value
+    return value
+
+
+def find_axes(gray):
+    """Positions of the y axis (leftmost long vertical line) and x axis (lowest long horizontal line)
+
+    Returns {"y_axis_x", "x_axis_y", "y_axis_span", "x_axis_span"} with None for
+    axes that were not found; spans are (start, end) along the line.
+    """
+    height, width = gray.shape
+    _, ink = cv2.threshold(gray if gray.mean() >= 128 else 255 - gray, 0, 255,
+                           cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN,
+                                cv2.getStructuringElement(cv2.MORPH_RECT, (1, int(height * MIN_AXIS_FRACTION))))
+    horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN,
+                                  cv2.getStructuringElement(cv2.MORPH_RECT, (int(width * MIN_AXIS_FRACTION), 1)))
+
+    axes = {"y_axis_x": None, "x_axis_y": None, "y_axis_span": None, "x_axis_span": None}
+    columns = np.flatnonzero(vertical.any(axis=0))
+    if len(columns):
+        x = int(columns[0])
+        rows = np.flatnonzero(vertical[:, x])
+        axes["y_axis_x"], axes["y_axis_span"] = x, (int(rows[0]), int(rows[-1]))
+    rows = np.flatnonzero(horizontal.any(axis=1))
+    if len(rows):
+        y = int(rows[-1])
+        cols = np.flatnonzero(horizontal[y])
+        axes["x_axis_y"], axes["x_axis_span"] = y, (int(cols[0]), int(cols[-1]))
+    return axes
+
+
+def plot_area(axes, width, height):
+    """(left, top, right, bottom) of the plotting area, falling back to the whole image"""
+    left = axes["y_axis_x"] if axes["y_axis_x"] is not None else 0
+    bottom = axes["x_axis_y"] if axes["x_axis_y"] is not None else height - 1
+    top = axes["y_axis_span"][0] if axes["y_axis_span"] else 0
+    right = axes["x_axis_span"][1] if axes["x_axis_span"] else width - 1
+    return left, top, right, bottom
+
+
+def y_tick_values(words, y_axis_x, max_gap):
+    """(value, centre_y) for numeric labels just left of the y axis"""
+    ticks = []
+    for word in words:
+        value = parse_number(word["text"])
+        right = word["left"] + word["width"]
+        if value is None or right > y_axis_x + 2 or right < y_axis_x - max_gap:
+            continue
+        ticks.append((value, word["top"] + word["height"] / 2.0))
+    return ticks
+
+
+def estimate_baseline(ticks, x_axis_y):
+    """Value at the x axis from a least-squares fit of tick value against pixel row
+
+    Returns (baseline, (low, high)) or None with fewer than two distinct ticks.
+    """
+    if len({value for value, _ in ticks}) < 2:
+        return None
+    values = np.array([value for value, _ in ticks])
+    rows = np.array([row for _, row in ticks])
+    slope, intercept = np.polyfit(rows, values, 1)
+    # Values must grow upwards (smaller rows); anything else is not a y axis
+    if slope >= 0:
+        return None
+    return float(slope * x_axis_y + intercept), (float(values.min()), float(values.max()))
+
+
+def three_d_signature(image):
+    """Shading measurements of coloured marks: 3D renderings shade faces and draw oblique edges
+
+    Returns {"gradient_ratio", "shade_levels", "oblique_ratio", "score"}; flat 2D
+    fills have no interior gradient, one shade per hue and axis-aligned edges.
+    """
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    colored = ((hsv[..., 1] > 60) & (hsv[..., 2] > 40)).astype(np.uint8)
+    interior = cv2.erode(colored, np.ones((5, 5), np.uint8)).astype(bool)
+    if interior.sum() < 0.002 * colored.size:
+        return {"gradient_ratio": 0.0, "shade_levels": 0.0, "oblique_ratio": 0.0, "score": 0.0}
+
+    value = hsv[..., 2].astype(np.float32)
+    magnitude = np.abs(cv2.Sobel(value, cv2.CV_32F, 1, 0)) + np.abs(cv2.Sobel(value, cv2.CV_32F, 0, 1))
+    # Gentle gradients (not edges) inside filled marks are the smooth shading of lit surfaces
+    shaded = (magnitude > 4) & (magnitude < 120)
+    gradient_ratio = float(shaded[interior].mean())
+
+    # Side faces: the same hue at clearly different brightness levels
+    hues = hsv[..., 0][interior] // 10
+    values = hsv[..., 2][interior] // 32
+    levels = []
+    for hue in np.unique(hues):
+        counts = np.bincount(values[hues == hue], minlength=8)
+        significant = counts > 0.1 * counts.sum()
+        if counts.sum() > 0.01 * interior.sum():
+            levels.append(int(significant.sum()))
+    shade_levels = float(np.mean(levels)) if levels else 0.0
+
+    edges = cv2.Canny(colored * 255, 50, 150)
+    segments = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=20,
+                               minLineLength=max(min(image.shape[:2]) // 30, 8), maxLineGap=3)
+    oblique_ratio = 0.0
+    if segments is not None:
+        x1, y1, x2, y2 = segments.reshape(-1, 4).T.astype(float)
+        angles = np.abs(np.degrees(np.arctan2(y2 - y1, x2 - x1))) % 90
+        oblique_ratio = float(((angles > 15) & (angles < 75)).mean())
+
+    score = (min(gradient_ratio / 0.3, 1.0) * 0.4 + min(max(shade_levels - 1, 0), 1.0) * 0.3
+             + min(oblique_ratio / 0.3, 1.0) * 0.3)
+    return {"gradient_ratio": round(gradient_ratio, 3), "shade_levels": round(shade_levels, 2),
+            "oblique_ratio": round(oblique_ratio, 3), "score": round(float(score), 3)}
+
+
+def detect_misleading(image, words=None, label=None):
+    """Measure an OpenCV chart image and report misleading design elements
+
+    words are OCR word boxes in image pixels (see ocr_engine.ocr_image_words);
+    without them the zero-baseline check is skipped. label is the image
+    classifier's label: a truncated baseline is a warning for bar charts and
+    informational otherwise. Returns {"measurements", "findings", "seconds"}.
+    """
+    start = time.perf_counter()
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    full_height = image.shape[0]
+    scale = min(1.0, MEASURE_SIDE / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height, width = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    axes = find_axes(gray)
+    left, top, right, bottom = plot_area(axes, width, height)
+    aspect_ratio = (right - left + 1) / float(max(bottom - top + 1, 1))
+    measurements = {
+        "image_size": (image.shape[1], image.shape[0]),
+        "axes": axes,
+        "plot_area": (left, top, right, bottom),
+        "aspect_ratio": round(aspect_ratio, 3),
+        "baseline": None,
+        "tick_range": None,
+        "ticks": 0,
+        "three_d": three_d_signature(image),
+    }
+    findings = []
+
+    distortions = MISLEADING_ELEMENTS["visual_distortions"]
+    if label != "table" and aspect_ratio < MIN_ASPECT_RATIO:
+        findings.append(_finding(
+            "tall_narrow", WARNING,
+            f"The plot area is {aspect_ratio:.2f}:1 (width:height); tall, narrow plots exaggerate trends",
+            distortions[1]))
+    elif label != "table" and aspect_ratio > MAX_ASPECT_RATIO:
+        findings.append(_finding(
+            "wide_flat", INFO,
+            f"The plot area is {aspect_ratio:.2f}:1 (width:height); wide, flat plots minimize trends",
+            distortions[2]))
+
+    if words and axes["y_axis_x"] is not None and axes["x_axis_y"] is not None:
+        factor = height / float(full_height)
+        scaled = [dict(word, left=word["left"] * factor, top=word["top"] * factor,
+                       width=word["width"] * factor, height=word["height"] * factor) for word in words]
+        ticks = y_tick_values(scaled, axes["y_axis_x"], max_gap=width * 0.25)
+        measurements["ticks"] = len(ticks)
+        estimate = estimate_baseline(ticks, axes["x_axis_y"])
+        if estimate is not None:
+            baseline, (low, high) = estimate
+            measurements["baseline"] = round(baseline, 4)
+            measurements["tick_range"] = (low, high)
+            if baseline > ZERO_TOLERANCE * max(high - low, abs(high)):
+                findings.append(_finding(
+                    "truncated_axis", WARNING if label == "bar" else INFO,
+                    f"The y axis starts at about {baseline:,.4g} rather than zero "
+                    f"(tick labels {low:,.4g} to {high:,.4g})",
+                    MISLEADING_ELEMENTS["axis_and_scale"][1]))
+
+    if measurements["three_d"]["score"] >= THREE_D_MIN_SCORE:
+        findings.append(_finding(
+            "three_d", WARNING,
+            "Shaded faces and oblique edges suggest a 3D rendering, which distorts proportions",
+            distortions[0]))
+
+    return {"measurements": measurements, "findings": findings, "seconds": time.perf_counter() - start}
+
+
+def audit_file(path, ocr=True):
+    """Read an image from disk, classify it and detect misleading elements
+
+    Returns (path, {"classification", "misleading", "text", "ocr_error"}); without
+    OCR (disabled or failing) "text" is None and the zero-baseline check is
+    skipped. Defined at module level so it can be used with a process pool.
+    """
+    from image_classifier import classify_image
+    from ocr_engine import ocr_image_words
+    from preprocessing import decode_image
+
+    with open(path, "rb") as f:
+        image = decode_image(f.read())
+    classification = classify_image(image)
+    ocr_result = ocr_error = None
+    if ocr:
+        try:
+            ocr_result = ocr_image_words(image, workers=1)
+        except Exception as e:
+            ocr_error = str(e)
+    words = ocr_result["words"] if ocr_result else None
+    misleading = detect_misleading(image, words, classification["label"])
+    if classification["label"] == "table" and words:
+        # The same OCR pass feeds the table formatting checks
+        from table_ocr import check_table_rules, reconstruct_table
+        misleading["findings"] += check_table_rules(reconstruct_table(words))
+    return path, {
+        "classification": {key: classification[key] for key in ("label", "confidence", "scores")},
+        "misleading": {"findings": misleading["findings"], "measurements": misleading["measurements"]},
+        "text": ocr_result["text"] if ocr_result else None,
+        "ocr_error": ocr_error,
+    }
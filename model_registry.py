@@ -0,0 +1,246 @@
+"""
+Model Registry
+Loads Hugging Face pipelines on first use and tracks their load time and memory
+"""
+
+import gc
+import os
+import threading
+import time
+
+LLAVA_MODEL_ID = "llava-hf/llava-1.5-7b-hf"
+TEXT_MODEL_ID = "gpt2"
+
+# fp32: full precision; bf16: bfloat16 weights; int8: dynamic int8 quantization of Linear
+# layers (GPT-2's Conv1D layers are converted to Linear first)
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+MODEL_SPECS = {
+    "image_to_text": {"task": "image-to-text", "model": LLAVA_MODEL_ID},
+    "text_generation": {"task": "text-generation", "model": TEXT_MODEL_ID},
+}
+
+
+def default_precision(name):
+    """Precision for a model from CRYSTALVIZ_PRECISION_<NAME> or CRYSTALVIZ_PRECISION"""
+    precision = os.environ.get(
+        f"CRYSTALVIZ_PRECISION_{name.upper()}",
+        os.environ.get("CRYSTALVIZ_PRECISION", "fp32")
+    ).lower()
+    if precision not in PRECISION_MODES:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISION_MODES}")
+    return precision
+
+
+def default_max_resident_bytes():
+    """Memory budget for loaded pipelines from CRYSTALVIZ_MAX_MODEL_BYTES, or None for no limit"""
+    value = os.environ.get("CRYSTALVIZ_MAX_MODEL_BYTES")
+    return int(value) if value else None
+
+
+def load_pipeline(spec):
+    """Build a transformers pipeline from a model spec, applying its precision"""
+    import torch
+    from transformers import pipeline
+
+    precision = spec.get("precision", "fp32")
+    kwargs = {}
+    if precision == "bf16":
+        kwargs["torch_dtype"] = torch.bfloat16
+    pipe = pipeline(spec["task"], model=spec["model"], **kwargs)
+
+    if precision == "int8":
+        quantize_int8(pipe.model)
+    return pipe
+
+
+def conv1d_to_linear(model):
+    """Replace transformers Conv1D layers (GPT-2 attention and MLP) with equivalent nn.Linear layers
+
+    Conv1D stores its weight transposed, as (in_features, out_features). Returns
+    the number of layers replaced.
+    """
+    import torch
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        return 0
+
+    replaced = 0
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features, bias=child.bias is not None,
+                                         device=child.weight.device, dtype=child.weight.dtype)
+                with torch.no_grad():
+                    linear.weight.copy_(child.weight.t())
+                    if child.bias is not None:
+                        linear.bias.copy_(child.bias)
+                setattr(parent, child_name, linear)
+                replaced += 1
+    return replaced
+
+
+def quantize_int8(model):
+    """Dynamically quantize a model's Linear layers to int8 in place; returns the number quantized
+
+    Conv1D layers are converted to Linear first. Output layers tied to the input
+    embeddings are skipped: quantizing them would add an int8 copy while the fp32
+    embedding stays resident. Raises ValueError when nothing can be quantized.
+    """
+    import torch
+
+    conv1d_to_linear(model)
+    embeddings = model.get_input_embeddings() if hasattr(model, "get_input_embeddings") else None
+    tied = {embeddings.weight.data_ptr()} if embeddings is not None else set()
+    names = {name for name, module in model.named_modules()
+             if isinstance(module, torch.nn.Linear) and module.weight.data_ptr() not in tied}
+    if not names:
+        raise ValueError("int8 needs Linear layers to quantize; use fp32 or bf16 for this model")
+    torch.ao.quantization.quantize_dynamic(model, names, dtype=torch.qint8, inplace=True)
+    return len(names)
+
+
+def estimate_resident_bytes(pipe):
+    """Approximate memory held by a pipeline's weights, including quantized packed weights"""
+    model = getattr(pipe, "model", None)
+    if model is None or not hasattr(model, "state_dict"):
+        return 0
+    seen = set()
+    total = 0
+    pending = list(model.state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            pending.extend(value)
+        elif hasattr(value, "numel") and hasattr(value, "element_size"):
+            # Tied weights share storage; count each buffer once
+            if value.data_ptr() in seen:
+                continue
+            seen.add(value.data_ptr())
+            total += value.numel() * value.element_size()
+    return total
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """Lazily loaded, explicitly unloadable set of named model pipelines
+
+    When loading a pipeline takes the estimated total over max_resident_bytes
+    (default: CRYSTALVIZ_MAX_MODEL_BYTES), the least recently used others are unloaded.
+    """
+
+    def __init__(self, specs=None, loader=load_pipeline, max_resident_bytes=None, precisions=None):
+        self.specs = {name: dict(spec) for name, spec in (specs or MODEL_SPECS).items()}
+        self.loader = loader
+        self.max_resident_bytes = (
+            max_resident_bytes if max_resident_bytes is not None else default_max_resident_bytes()
+        )
+        self._models = {}
+        self._info = {}
+        self._lock = threading.RLock()
+        for name, spec in self.specs.items():
+            spec.setdefault("precision", default_precision(name))
+        for name, precision in (precisions or {}).items():
+            self.set_precision(name, precision)
+
+    def get(self, name):
+        """Return the named pipeline, loading it on first use"""
+        with self._lock:
+            if name not in self._models:
+                if name not in self.specs:
+                    raise KeyError(f"Unknown model: {name}")
+                rss_before = current_rss_bytes()
+                start = time.perf_counter()
+                pipe = self.loader(self.specs[name])
+                self._models[name] = pipe
+                rss_after = current_rss_bytes()
+                self._info[name] = {
+                    "load_seconds": time.perf_counter() - start,
+                    "resident_bytes": estimate_resident_bytes(pipe),
+                    "rss_delta_bytes": (
+                        rss_after - rss_before if None not in (rss_before, rss_after) else None
+                    ),
+                }
+                self._enforce_memory_limit(keep=name)
+            self._info[name]["last_used"] = time.time()
+            return self._models[name]
+
+    def precision(self, name):
+        """Precision the named model loads (or is loaded) at"""
+        return self.specs[name]["precision"]
+
+    def set_precision(self, name, precision):
+        """Change a model's precision; a loaded model is unloaded and reloads on next use"""
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISION_MODES}")
+        if self.specs[name].get("precision") == precision:
+            return
+        self.specs[name]["precision"] = precision
+        self.unload(name)
+
+    def is_loaded(self, name):
+        """Whether the named pipeline is currently resident"""
+        return name in self._models
+
+    def unload(self, name):
+        """Drop a loaded pipeline so its memory can be reclaimed"""
+        with self._lock:
+            if self._models.pop(name, None) is None:
+                return False
+            self._info.pop(name, None)
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        return True
+
+    def unload_all(self):
+        """Unload every resident pipeline"""
+        for name in list(self._models):
+            self.unload(name)
+
+    def resident_bytes(self):
+        """Total estimated memory held by loaded pipelines"""
+        return sum(info["resident_bytes"] for info in self._info.values())
+
+    def _enforce_memory_limit(self, keep):
+        """Unload least recently used pipelines while over max_resident_bytes"""
+        if self.max_resident_bytes is None:
+            return
+        candidates = sorted(
+            (name for name in self._models if name != keep),
+            key=lambda name: self._info[name].get("last_used", 0)
+        )
+        for name in candidates:
+            if self.resident_bytes() <= self.max_resident_bytes:
+                break
+            self.unload(name)
+
+    def stats(self):
+        """Per-model status, load time and resident memory"""
+        rows = []
+        for name, spec in self.specs.items():
+            info = self._info.get(name, {})
+            rows.append({
+                "name": name,
+                "model": spec["model"],
+                "precision": spec["precision"],
+                "loaded": name in self._models,
+                "load_seconds": info.get("load_seconds"),
+                "resident_bytes": info.get("resident_bytes", 0),
+                "rss_delta_bytes": info.get("rss_delta_bytes"),
+            })
+        return rows
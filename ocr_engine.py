@@ -0,0 +1,405 @@
+"""
+OCR Engine
+Tesseract text extraction shared by the Streamlit pages and the batch CLI
+
+Large images are split into horizontal tiles at gaps between detected text
+regions, the tiles are OCR'd concurrently in a process pool, and the words are
+stitched back together in reading order with their bounding boxes.
+
+When tesserocr is installed, Tesseract runs in-process through one API handle
+per thread, so language data is loaded once instead of on every call;
+otherwise each call goes through pytesseract's tesseract subprocess. tesserocr
+can only be imported on a main thread, so calls from other threads (a Streamlit
+script thread) are sent to the OCR process pool, whose spawned workers load it
+once at startup.
+"""
+
+import atexit
+import functools
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from analysis_cache import DEFAULT_CACHE_DIR, AnalysisCache, image_digest
+from preprocessing import decode_image, prepare_ocr_image
+
+# Images with at least this many pixels are tiled (roughly a 1080p screenshot)
+TILING_MIN_PIXELS = 1920 * 1080
+MIN_TILE_HEIGHT = 64
+OCR_LANG = os.environ.get("CRYSTALVIZ_OCR_LANG", "eng")
+# "auto" uses tesserocr when it is installed and can load its language data
+OCR_BACKEND = os.environ.get("CRYSTALVIZ_OCR_BACKEND", "auto")
+# Bump when preprocessing or word parsing changes so cached OCR results expire
+OCR_CACHE_VERSION = "1"
+
+_pool = None
+_pool_workers = None
+_local = threading.local()
+_tesserocr_failed = False
+# Set in OCR pool workers, which must run OCR themselves rather than submit it to a pool
+_in_pool_worker = False
+_pool_backend = None
+
+
+def to_gray(image):
+    """Convert an OpenCV BGR image to grayscale (grayscale input is returned as-is)"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _pytesseract():
+    """pytesseract, imported on first use: it pulls in pandas, which the tesserocr path never needs"""
+    import pytesseract
+    return pytesseract
+
+
+@functools.lru_cache(maxsize=None)
+def _tesserocr_installed():
+    """Whether the tesserocr backend is installed and not disabled by CRYSTALVIZ_OCR_BACKEND"""
+    return OCR_BACKEND != "pytesseract" and importlib.util.find_spec("tesserocr") is not None
+
+
+def _import_tesserocr():
+    """The tesserocr module, or None if it is not installed or cannot be imported on this thread
+
+    Importing it installs signal handlers, which raises ValueError outside the main thread.
+    """
+    global _tesserocr_failed
+    if not _tesserocr_installed() or _tesserocr_failed:
+        return None
+    if sys.modules.get("tesserocr") is not None:
+        return sys.modules["tesserocr"]
+    if threading.current_thread() is not threading.main_thread():
+        return None
+    try:
+        import tesserocr
+    except (ImportError, ValueError):
+        # Installed but broken (e.g. built against another libtesseract): use pytesseract
+        _tesserocr_failed = True
+        return None
+    return tesserocr
+
+
+def _tess_api():
+    """This thread's in-process Tesseract handle, or None to use the subprocess backend"""
+    global _tesserocr_failed
+    tesserocr = _import_tesserocr()
+    if tesserocr is None:
+        return None
+    api = getattr(_local, "api", None)
+    if api is None:
+        try:
+            api = tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+        except RuntimeError:
+            # Usually missing language data; the tesseract binary may still work
+            _tesserocr_failed = True
+            return None
+        _local.api = api
+    return api
+
+
+def _uses_pool():
+    """Whether whole-image OCR from this thread goes to the pool to reach tesserocr
+
+    Only when tesserocr works in this process but not on this thread, and the pool's
+    workers report that it loaded there. Pool workers never route to a pool themselves.
+    """
+    if _in_pool_worker or _tesserocr_failed or not _tesserocr_installed():
+        return False
+    return _tess_api() is None and not _tesserocr_failed and _pool_backend_info()[0] == "tesserocr"
+
+
+def _local_backend():
+    """("tesserocr" or "pytesseract", Tesseract version) for OCR run in this thread"""
+    name = "tesserocr" if _tess_api() is not None else "pytesseract"
+    try:
+        if name == "tesserocr":
+            return name, sys.modules["tesserocr"].tesseract_version().split()[1]
+        return name, str(_pytesseract().get_tesseract_version())
+    except Exception:
+        return name, "unknown"
+
+
+def _pool_backend_info():
+    """(name, version) of the backend in the pool's workers, asked once"""
+    global _pool_backend
+    if _pool_backend is None:
+        _pool_backend = _shared_pool().submit(_local_backend).result()
+    return _pool_backend
+
+
+def _backend():
+    """(name, version) of the backend that OCR calls from this thread end up using"""
+    return _pool_backend_info() if _uses_pool() else _local_backend()
+
+
+def ocr_backend():
+    """Name of the backend OCR calls will use: "tesserocr" or "pytesseract" """
+    return _backend()[0]
+
+
+def tesseract_version():
+    """Version string of the active Tesseract backend, or "unknown" if it is unavailable"""
+    return _backend()[1]
+
+
+def _warm_worker():
+    """Process-pool initializer: load the language data before the first tile arrives"""
+    global _in_pool_worker
+    _in_pool_worker = True
+    _tess_api()
+
+
+def get_pool(workers=None):
+    """Shared OCR process pool, created on first use and kept for the life of the process"""
+    global _pool, _pool_workers
+    workers = workers or os.cpu_count() or 1
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # Spawned workers start on a fresh main thread, where tesserocr can be imported;
+        # forked workers would inherit a script thread's failed import
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                    initializer=_warm_worker)
+        _pool_workers = workers
+    return _pool
+
+
+def _shared_pool():
+    """The OCR pool at whatever size it already has, for single whole-image jobs"""
+    return _pool if _pool is not None else get_pool()
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+
+
+def find_text_regions(gray):
+    """Bounding boxes (x, y, w, h) of text-like blobs found by morphological closing"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Dark text on light backgrounds is the common case; flip if most pixels are "ink"
+    if np.count_nonzero(binary) > binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+    kernel_width = max(9, gray.shape[1] // 150)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 3))
+    dilated = cv2.dilate(binary, kernel, iterations=1)
+    contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(c) for c in contours]
+    return [box for box in boxes if box[2] >= 4 and box[3] >= 4]
+
+
+def plan_tiles(height, regions, n_tiles):
+    """Split [0, height) into horizontal bands cut only at rows free of text
+
+    Bands without any text region are dropped. Returns a list of (top, bottom).
+    """
+    covered = np.zeros(height, dtype=bool)
+    for _, y, _, h in regions:
+        covered[y:y + h] = True
+    free_rows = np.flatnonzero(~covered)
+
+    cuts = [0]
+    for k in range(1, n_tiles):
+        ideal = k * height // n_tiles
+        idx = np.searchsorted(free_rows, ideal)
+        candidates = free_rows[max(idx - 1, 0):idx + 1]
+        if len(candidates) == 0:
+            continue
+        cut = int(candidates[np.argmin(np.abs(candidates - ideal))])
+        if cut - cuts[-1] >= MIN_TILE_HEIGHT and height - cut >= MIN_TILE_HEIGHT:
+            cuts.append(cut)
+    cuts.append(height)
+
+    tiles = []
+    for top, bottom in zip(cuts[:-1], cuts[1:]):
+        if covered[top:bottom].any():
+            tiles.append((top, bottom))
+    return tiles
+
+
+def _image_to_data(gray):
+    """Tesseract's word table as parallel lists, like pytesseract.image_to_data(output_type=DICT)"""
+    api = _tess_api()
+    if api is None:
+        pytesseract = _pytesseract()
+        return pytesseract.image_to_data(gray, lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+    api.SetImage(Image.fromarray(gray))
+    names = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+             "left", "top", "width", "height", "conf", "text")
+    data = {name: [] for name in names}
+    for row in api.GetTSVText(0).splitlines():
+        fields = row.split("\t")
+        if len(fields) < len(names):
+            fields += [""] * (len(names) - len(fields))
+        for name, field in zip(names, fields):
+            data[name].append(field if name == "text" else float(field) if name == "conf" else int(field))
+    return data
+
+
+def _image_to_string(gray):
+    if _uses_pool():
+        return _shared_pool().submit(_image_to_string, gray).result()
+    api = _tess_api()
+    if api is None:
+        return _pytesseract().image_to_string(gray, lang=OCR_LANG)
+    api.SetImage(Image.fromarray(gray))
+    return api.GetUTF8Text()
+
+
+def ocr_words(gray, offset=(0, 0)):
+    """Run Tesseract once and return recognised words with page-level boxes"""
+    if _uses_pool():
+        return _shared_pool().submit(ocr_words, gray, offset).result()
+    data = _image_to_data(gray)
+    dx, dy = offset
+    words = []
+    for i, text in enumerate(data["text"]):
+        if not text.strip():
+            continue
+        words.append({
+            "text": text,
+            "left": data["left"][i] + dx,
+            "top": data["top"][i] + dy,
+            "width": data["width"][i],
+            "height": data["height"][i],
+            "conf": float(data["conf"][i]),
+            "line": (data["block_num"][i], data["par_num"][i], data["line_num"][i]),
+        })
+    return words
+
+
+def _ocr_tile(args):
+    """Process-pool worker: OCR one tile and tag its words with the tile index"""
+    index, tile, top = args
+    words = ocr_words(tile, offset=(0, top))
+    for word in words:
+        word["line"] = (index,) + tuple(word["line"])
+    return words
+
+
+def stitch_text(words):
+    """Join words into lines (and blocks into paragraphs) in reading order"""
+    lines = []
+    current_key = None
+    previous_block = None
+    for word in words:
+        key = word["line"]
+        if key != current_key:
+            block = key[:-1]
+            if previous_block is not None and block != previous_block:
+                lines.append("")
+            lines.append(word["text"])
+            current_key = key
+            previous_block = block
+        else:
+            lines[-1] += " " + word["text"]
+    return "\n".join(lines)
+
+
+def ocr_tiled(image, workers=None):
+    """OCR an image tile by tile in parallel
+
+    Returns {"text": str, "words": [...], "tiles": [(top, bottom), ...]} where each
+    word carries its bounding box in full-image coordinates.
+    """
+    gray = to_gray(image)
+    workers = workers or os.cpu_count() or 1
+    tiles = plan_tiles(gray.shape[0], find_text_regions(gray), n_tiles=workers * 2)
+    jobs = [(i, gray[top:bottom], top) for i, (top, bottom) in enumerate(tiles)]
+
+    if workers == 1 or len(jobs) <= 1:
+        tile_words = [_ocr_tile(job) for job in jobs]
+    else:
+        tile_words = list(get_pool(workers).map(_ocr_tile, jobs))
+
+    words = [word for chunk in tile_words for word in chunk]
+    return {"text": stitch_text(words), "words": words, "tiles": tiles}
+
+
+def extract_text(image, tiled=None, workers=None):
+    """Extract text from an OpenCV image
+
+    tiled=None tiles automatically for images of at least TILING_MIN_PIXELS.
+    """
+    gray = to_gray(image)
+    if tiled is None:
+        tiled = gray.shape[0] * gray.shape[1] >= TILING_MIN_PIXELS
+    if not tiled:
+        return _image_to_string(gray)
+    return ocr_tiled(gray, workers)["text"]
+
+
+def extract_words(image, tiled=None, workers=None):
+    """Extract text and word boxes from an OpenCV image
+
+    Returns {"text": str, "words": [...]}, tiling like extract_text().
+    """
+    gray = to_gray(image)
+    if tiled is None:
+        tiled = gray.shape[0] * gray.shape[1] >= TILING_MIN_PIXELS
+    if tiled:
+        result = ocr_tiled(gray, workers)
+        return {"text": result["text"], "words": result["words"]}
+    words = ocr_words(gray)
+    return {"text": stitch_text(words), "words": words}
+
+
+def scale_words(words, factor):
+    """Copy of words with boxes multiplied by factor (e.g. back to original image pixels)"""
+    if factor == 1:
+        return words
+    keys = ("left", "top", "width", "height")
+    return [dict(word, **{key: int(round(word[key] * factor)) for key in keys}) for word in words]
+
+
+def ocr_image_words(image, workers=None):
+    """OCR an image through the Text Extractor preprocessing; word boxes are in image pixels"""
+    prepared = prepare_ocr_image(image)
+    result = extract_words(prepared, workers=workers)
+    result["words"] = scale_words(result["words"], image.shape[0] / prepared.shape[0])
+    return result
+
+
+def ocr_key(image):
+    """Cache key for ocr_image_words() on a decoded image"""
+    payload = json.dumps([image_digest(image), "ocr_image_words", OCR_LANG])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def open_ocr_cache(path=None, max_bytes=64 * 1024 * 1024):
+    """Persistent OCR result cache; entries expire when the Tesseract backend or version changes"""
+    version = f"{ocr_backend()}:{tesseract_version()}:{OCR_CACHE_VERSION}"
+    return AnalysisCache(path or os.path.join(DEFAULT_CACHE_DIR, "ocr.sqlite"), max_bytes, rules_version=version)
+
+
+def cached_ocr_image_words(image, cache, workers=None):
+    """ocr_image_words() through a content-hash cache; word "line" keys come back as lists"""
+    key = ocr_key(image)
+    result = cache.get(key)
+    if result is None:
+        result = ocr_image_words(image, workers)
+        cache.put(key, result)
+    return result
+
+
+def ocr_file(path):
+    """Read an image from disk and OCR it; returns (path, text)
+
+    Defined at module level so it can be used with a process pool. Tiles are
+    OCR'd sequentially here since the caller already parallelises across files.
+    """
+    with open(path, "rb") as f:
+        image = decode_image(f.read())
+    return path, extract_text(prepare_ocr_image(image), workers=1)
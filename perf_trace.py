@@ -0,0 +1,225 @@
+"""
+Performance Tracing
+Per-stage wall time and memory of page runs, exported as Prometheus text metrics
+
+A Trace collects the stages of one page run (decode, OCR, model calls, figure
+builds...). Every stage is also folded into a process-wide StageMetrics, which
+can be written to a file for the node_exporter textfile collector
+(CRYSTALVIZ_METRICS_FILE) or served over HTTP (CRYSTALVIZ_METRICS_PORT).
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from model_registry import current_rss_bytes
+
+# Histogram bucket upper bounds in seconds, from cached lookups up to cold model loads
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRICS_FILE = os.environ.get("CRYSTALVIZ_METRICS_FILE")
+METRICS_PORT = os.environ.get("CRYSTALVIZ_METRICS_PORT")
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_bytes():
+    """Highest resident set size this process has reached, or None where getrusage is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class StageMetrics:
+    """Thread-safe per (page, stage) duration histograms and peak memory, as Prometheus text"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, page, stage, seconds, peak_rss=None):
+        """Record one stage duration (and the peak RSS seen during it)"""
+        with self._lock:
+            series = self._series.setdefault((page, stage), {
+                "count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets), "peak_rss_bytes": None,
+            })
+            series["count"] += 1
+            series["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["buckets"][i] += 1
+            if peak_rss is not None:
+                series["peak_rss_bytes"] = max(series["peak_rss_bytes"] or 0, peak_rss)
+
+    def snapshot(self):
+        """{(page, stage): {"count", "sum", "buckets", "peak_rss_bytes"}} copied under the lock"""
+        with self._lock:
+            return {key: dict(series, buckets=list(series["buckets"])) for key, series in self._series.items()}
+
+    def to_prometheus(self):
+        """Prometheus text exposition format of every series plus current process memory"""
+        series = sorted(self.snapshot().items())
+        lines = [
+            "# HELP crystalviz_stage_seconds Wall time of a page stage",
+            "# TYPE crystalviz_stage_seconds histogram",
+        ]
+        for (page, stage), values in series:
+            labels = f'page="{_escape(page)}",stage="{_escape(stage)}"'
+            for bound, count in zip(self.buckets, values["buckets"]):
+                lines.append(f'crystalviz_stage_seconds_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'crystalviz_stage_seconds_bucket{{{labels},le="+Inf"}} {values["count"]}')
+            lines.append(f"crystalviz_stage_seconds_sum{{{labels}}} {values['sum']:.6f}")
+            lines.append(f"crystalviz_stage_seconds_count{{{labels}}} {values['count']}")
+        lines += [
+            "# HELP crystalviz_stage_peak_rss_bytes Highest resident set size observed during a stage",
+            "# TYPE crystalviz_stage_peak_rss_bytes gauge",
+        ]
+        for (page, stage), values in series:
+            if values["peak_rss_bytes"] is not None:
+                lines.append(f'crystalviz_stage_peak_rss_bytes{{page="{_escape(page)}",stage="{_escape(stage)}"}} '
+                             f'{values["peak_rss_bytes"]}')
+        rss = current_rss_bytes()
+        if rss is not None:
+            lines += [
+                "# HELP crystalviz_resident_memory_bytes Current resident set size of the process",
+                "# TYPE crystalviz_resident_memory_bytes gauge",
+                f"crystalviz_resident_memory_bytes {rss}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically replace path with the current metrics"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = StageMetrics()
+
+
+class Trace:
+    """Stages of one page run, each with wall time and resident memory
+
+    peak_rss_bytes is exact when a stage raised the process high-water mark;
+    otherwise it is the larger of the RSS at the start and end of the stage.
+    """
+
+    def __init__(self, page, metrics=METRICS):
+        self.page = page
+        self.metrics = metrics
+        self.stages = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one stage; blocks that raise are not recorded"""
+        rss_before = current_rss_bytes()
+        high_before = peak_rss_bytes()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        rss_after = current_rss_bytes()
+        high_after = peak_rss_bytes()
+        samples = [value for value in (rss_before, rss_after) if value is not None]
+        if high_after is not None and high_before is not None and high_after > high_before:
+            samples.append(high_after)
+        peak = max(samples, default=None)
+        self.add(name, seconds, rss_after,
+                 rss_after - rss_before if None not in (rss_before, rss_after) else None, peak)
+
+    def add(self, name, seconds, rss_bytes=None, rss_delta_bytes=None, peak_rss=None):
+        """Record a stage measured elsewhere (e.g. by a background job)"""
+        with self._lock:
+            self.stages.append({"stage": name, "seconds": seconds, "rss_bytes": rss_bytes,
+                                "rss_delta_bytes": rss_delta_bytes, "peak_rss_bytes": peak_rss})
+        if self.metrics is not None:
+            self.metrics.observe(self.page, name, seconds, peak_rss)
+
+    def total_seconds(self):
+        """Wall time since the trace started"""
+        return time.perf_counter() - self.started
+
+    def rows(self):
+        """Stages as display rows: milliseconds and memory in MB"""
+        megabytes = lambda value: round(value / 1e6, 1) if value is not None else None
+        return [{
+            "stage": stage["stage"],
+            "ms": round(stage["seconds"] * 1000, 1),
+            "rss_mb": megabytes(stage["rss_bytes"]),
+            "rss_delta_mb": megabytes(stage["rss_delta_bytes"]),
+            "peak_rss_mb": megabytes(stage["peak_rss_bytes"]),
+        } for stage in self.stages]
+
+    def finish(self):
+        """Record the whole run as a "total" stage and refresh the metrics file if one is configured"""
+        self.add("total", self.total_seconds(), current_rss_bytes())
+        export_metrics(self.metrics)
+        return self
+
+
+@contextmanager
+def stage(name, trace=None, page="background"):
+    """Time a block into trace, or straight into the process metrics when there is no trace"""
+    if trace is None:
+        trace = Trace(page)
+    with trace.stage(name):
+        yield
+
+
+def export_metrics(metrics=METRICS, path=None):
+    """Write metrics to path (default CRYSTALVIZ_METRICS_FILE); does nothing without a path"""
+    path = path or METRICS_FILE
+    if path and metrics is not None:
+        try:
+            metrics.write(path)
+        except OSError:
+            # Metrics must never break a page
+            pass
+
+
+def start_metrics_server(port=None, metrics=METRICS, host="127.0.0.1"):
+    """Serve metrics at http://host:port/metrics from a daemon thread
+
+    Returns the server, or None (after logging a warning) if the port cannot be
+    bound, e.g. because it is already in use: metrics must never break the app.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    port = int(port if port is not None else METRICS_PORT)
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.warning("Metrics server not started on %s:%s: %s", host, port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="crystalviz-metrics", daemon=True).start()
+    return server
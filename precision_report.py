@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+CrystalViz Precision Report
+Compare latency, throughput, memory and output agreement across inference precisions
+
+Each precision is loaded in turn, run on the same inputs, and compared against the
+fp32 outputs. Examples:
+
+    python precision_report.py text_generation
+    python precision_report.py image_to_text --image chart.png --max-new-tokens 64
+    python precision_report.py text_generation --modes fp32 int8 --json report.json
+"""
+
+import argparse
+import difflib
+import json
+import sys
+import time
+
+from model_registry import ModelRegistry, PRECISION_MODES
+
+DEFAULT_TEXT_PROMPTS = [
+    "What makes a bar chart easy to read?",
+    "When should I use a table instead of a graph?",
+    "Why should a y-axis start at zero?",
+]
+
+
+def agreement(reference, candidate):
+    """Word-level similarity between two generations (1.0 means identical)"""
+    return difflib.SequenceMatcher(None, reference.split(), candidate.split()).ratio()
+
+
+def run_text_generation(pipe, prompts, max_new_tokens):
+    """Generate for each prompt; returns (outputs, seconds, new_tokens)"""
+    outputs = []
+    new_tokens = 0
+    start = time.perf_counter()
+    for prompt in prompts:
+        text = pipe(prompt, max_new_tokens=max_new_tokens, do_sample=False,
+                    return_full_text=False)[0]["generated_text"]
+        outputs.append(text)
+        new_tokens += len(pipe.tokenizer(text)["input_ids"])
+    return outputs, time.perf_counter() - start, new_tokens
+
+
+def run_image_to_text(pipe, image_path, prompts, max_new_tokens):
+    """Analyze one image with every prompt; returns (outputs, seconds, new_tokens)"""
+    import cv2
+    from analysis_engine import analyze_image
+
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    start = time.perf_counter()
+    outputs = list(analyze_image(pipe, image, prompts, max_new_tokens=max_new_tokens).values())
+    seconds = time.perf_counter() - start
+    tokenizer = getattr(getattr(pipe, "processor", None), "tokenizer", None) or pipe.tokenizer
+    new_tokens = sum(len(tokenizer(text)["input_ids"]) for text in outputs)
+    return outputs, seconds, new_tokens
+
+
+def build_report(name, modes, runner):
+    """Load the model at each precision, run it, and compare against the first mode"""
+    rows = []
+    reference = None
+    for mode in modes:
+        registry = ModelRegistry(precisions={name: mode})
+        pipe = registry.get(name)
+        model_stats = next(row for row in registry.stats() if row["name"] == name)
+        outputs, seconds, new_tokens = runner(pipe)
+        if reference is None:
+            reference = outputs
+        rows.append({
+            "precision": mode,
+            "load_seconds": round(model_stats["load_seconds"], 2),
+            "weight_gb": round(model_stats["resident_bytes"] / 1e9, 3),
+            "rss_delta_gb": (
+                round(model_stats["rss_delta_bytes"] / 1e9, 3)
+                if model_stats["rss_delta_bytes"] is not None else None
+            ),
+            "seconds": round(seconds, 2),
+            "tokens_per_second": round(new_tokens / seconds, 2) if seconds else None,
+            "agreement": round(
+                sum(agreement(r, c) for r, c in zip(reference, outputs)) / len(outputs), 3
+            ),
+        })
+        registry.unload_all()
+    return rows
+
+
+def format_table(rows):
+    """Render report rows as a Markdown table"""
+    columns = list(rows[0])
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in rows:
+        lines.append("| " + " | ".join(str(row[c]) for c in columns) + " |")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare model inference precisions on CPU")
+    parser.add_argument("model", choices=["image_to_text", "text_generation"])
+    parser.add_argument("--modes", nargs="+", choices=PRECISION_MODES, default=list(PRECISION_MODES),
+                        help="Precisions to compare; the first is the accuracy reference")
+    parser.add_argument("--image", help="Chart image used for image_to_text")
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--json", help="Also write the report rows to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.model == "image_to_text":
+        if not args.image:
+            print("--image is required for image_to_text", file=sys.stderr)
+            return 2
+        from design_rules import get_general_analysis_prompts
+        prompts = get_general_analysis_prompts()
+        runner = lambda pipe: run_image_to_text(pipe, args.image, prompts, args.max_new_tokens)
+    else:
+        runner = lambda pipe: run_text_generation(pipe, DEFAULT_TEXT_PROMPTS, args.max_new_tokens)
+
+    rows = build_report(args.model, args.modes, runner)
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
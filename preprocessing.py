@@ -0,0 +1,110 @@
+"""
+Image Preprocessing
+Decode uploads once and prepare separate inputs for the vision model and for OCR
+"""
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# LLaVA 1.5's CLIP vision tower works on 336x336 crops of the short side
+MODEL_INPUT_SIZE = 336
+# Larger images are decoded at 1/2, 1/4 or 1/8 scale to bound memory
+MAX_DECODE_PIXELS = 40_000_000
+# Beyond this, extra resolution no longer helps Tesseract on screenshots
+MAX_OCR_SIDE = 4000
+MAX_SKEW_DEGREES = 10.0
+
+# Each flag halves the decoded size again
+_REDUCED_FLAGS = (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_COLOR_8)
+
+
+def decode_image(data, max_pixels=MAX_DECODE_PIXELS):
+    """Decode encoded image bytes to an OpenCV BGR array
+
+    Very large images are decoded directly at a reduced scale, using only the
+    header to find their size, so the full-resolution bitmap is never allocated.
+    """
+    flag = cv2.IMREAD_COLOR
+    try:
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        width = height = 0
+    for reduced_flag in _REDUCED_FLAGS:
+        if width * height <= max_pixels:
+            break
+        flag = reduced_flag
+        width, height = width // 2, height // 2
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image
+
+
+def cap_resolution(image, max_side=None, min_side=None):
+    """Downscale (never upscale) so the long side is <= max_side or the short side is <= min_side"""
+    height, width = image.shape[:2]
+    scales = [1.0]
+    if max_side:
+        scales.append(max_side / max(height, width))
+    if min_side:
+        scales.append(min_side / min(height, width))
+    scale = min(scales)
+    if scale >= 1.0:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def prepare_model_image(image, size=MODEL_INPUT_SIZE):
+    """RGB PIL image for the vision model, shrunk to the model's native input size
+
+    The short side is capped at size: the processor would resize to that anyway,
+    so doing it here with area interpolation saves memory and preprocessing time.
+    """
+    resized = cap_resolution(image, min_side=size)
+    if resized.ndim == 2:
+        return Image.fromarray(cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB))
+    return Image.fromarray(cv2.cvtColor(resized, cv2.COLOR_BGR2RGB))
+
+
+def estimate_skew(gray):
+    """Median angle (degrees) of long near-horizontal lines such as axes and gridlines"""
+    edges = cv2.Canny(gray, 50, 150)
+    lines = cv2.HoughLinesP(
+        edges, 1, np.pi / 180, threshold=100,
+        minLineLength=max(gray.shape[1] // 4, 20), maxLineGap=10
+    )
+    if lines is None:
+        return 0.0
+    x1, y1, x2, y2 = lines.reshape(-1, 4).T.astype(float)
+    angles = np.degrees(np.arctan2(y2 - y1, x2 - x1))
+    angles = angles[np.abs(angles) <= MAX_SKEW_DEGREES]
+    return float(np.median(angles)) if len(angles) else 0.0
+
+
+def deskew(gray, min_angle=0.5):
+    """Rotate a grayscale image so its dominant horizontal lines are level"""
+    angle = estimate_skew(gray)
+    if abs(angle) < min_angle:
+        return gray
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+
+def prepare_ocr_image(image, max_side=MAX_OCR_SIDE, binarize=True, straighten=True):
+    """Grayscale, size-capped, optionally deskewed and binarized image for Tesseract"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cap_resolution(gray, max_side=max_side)
+    if straighten:
+        gray = deskew(gray)
+    if binarize:
+        gray = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+        )
+    return gray
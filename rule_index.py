@@ -0,0 +1,136 @@
+"""
+Design Rule Index
+BM25 search over every design rule, so assistant prompts carry only the guidance a question needs
+
+Each entry of TABLE_RULES, GRAPH_RULES, CHART_TYPES_TO_AVOID, MISLEADING_ELEMENTS,
+EVALUATION_CRITERIA and get_design_scorecard() is one document, indexed together
+with its source and section names ("Table rules / multi page"). The index is
+built once per process and answers a query in well under a millisecond.
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+DEFAULT_K = 6
+# Hits scoring below this fraction of the best hit share only a generic term ("table") with the query
+MIN_RELATIVE_SCORE = 0.25
+# Shown when no rule shares a term with the question
+FALLBACK_SECTION = ("Graph rules", "general tips")
+
+STOP_WORDS = frozenset("""
+a about an and are as at be by can do does for from how i if in into is it its me my of on or
+should so than that the their there these this to use used using what when where which who why
+will with would you your
+""".split())
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercase word stems without stop words ("Pages" and "page" match)"""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def rule_entries():
+    """Every design rule as {"source", "section", "text"}, in design_rules order"""
+    from design_rules import (TABLE_RULES, GRAPH_RULES, CHART_TYPES_TO_AVOID, MISLEADING_ELEMENTS,
+                              EVALUATION_CRITERIA, get_design_scorecard)
+
+    entries = []
+    for source, rules in (("Table rules", TABLE_RULES), ("Graph rules", GRAPH_RULES),
+                          ("Misleading elements", MISLEADING_ELEMENTS),
+                          ("Evaluation criteria", EVALUATION_CRITERIA)):
+        for section, items in rules.items():
+            entries += [{"source": source, "section": section.replace("_", " "), "text": item}
+                        for item in items]
+    # One entry, as in the original prompt, so chart questions don't fill k with it
+    entries.append({"source": "Chart types to avoid", "section": "",
+                    "text": f"Avoid {', '.join(CHART_TYPES_TO_AVOID)}"})
+    for scorecard, categories in get_design_scorecard().items():
+        source = scorecard.replace("_", " ").capitalize()
+        for category, criteria in categories.items():
+            entries += [{"source": source, "section": category, "text": criterion} for criterion in criteria]
+    return entries
+
+
+def rule_label(entry):
+    """"Table rules / multi page: Repeat column headers..." for prompts and display"""
+    heading = f"{entry['source']} / {entry['section']}" if entry["section"] else entry["source"]
+    return f"{heading}: {entry['text']}"
+
+
+class RuleIndex:
+    """Okapi BM25 over a list of rule entries"""
+
+    def __init__(self, entries, k1=1.5, b=0.75):
+        self.entries = list(entries)
+        self.k1 = k1
+        self.b = b
+        self._terms = [Counter(tokenize(f"{e['source']} {e['section']} {e['text']}")) for e in self.entries]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        document_frequency = Counter(term for terms in self._terms for term in terms)
+        count = len(self.entries)
+        self._idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+                     for term, df in document_frequency.items()}
+        # term -> [(entry position, term frequency)], so a query only touches matching entries
+        self._postings = {}
+        for position, terms in enumerate(self._terms):
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, []).append((position, frequency))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def scores(self, query):
+        """{entry position: BM25 score} of the entries sharing a term with query"""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position, frequency in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / self._average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query, k=DEFAULT_K, min_relative_score=MIN_RELATIVE_SCORE):
+        """Up to k best-matching entries, highest score first (ties keep design_rules order)"""
+        scores = self.scores(query)
+        ranked = sorted(scores, key=lambda position: (-scores[position], position))[:k]
+        if ranked:
+            cutoff = scores[ranked[0]] * min_relative_score
+            ranked = [position for position in ranked if scores[position] >= cutoff]
+        return [dict(self.entries[position], score=round(scores[position], 3)) for position in ranked]
+
+
+def get_rule_index():
+    """The process-wide index over design_rules, built on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RuleIndex(rule_entries())
+        return _index
+
+
+def relevant_rules(question, k=DEFAULT_K):
+    """Top-k rules for a question, or the general graph tips when nothing matches"""
+    index = get_rule_index()
+    hits = index.search(question, k)
+    if hits:
+        return hits
+    source, section = FALLBACK_SECTION
+    return [dict(entry, score=0.0) for entry in index.entries
+            if entry["source"] == source and entry["section"] == section][:k]
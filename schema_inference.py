@@ -0,0 +1,186 @@
+"""
+Schema Inference
+Profiles uploaded DataFrames and proposes column mappings for each chart type
+"""
+
+import warnings
+
+import pandas as pd
+
+DEFAULT_SAMPLE_ROWS = 10_000
+# Values checked per text column when testing for dates or numbers stored as text
+PARSE_PROBE_VALUES = 200
+PARSE_MIN_RATIO = 0.9
+# Parse ratios in this band are too close to call from a sample
+AMBIGUOUS_PARSE_RATIO = (0.5, PARSE_MIN_RATIO)
+MAX_CATEGORIES = 50
+
+NUMERIC = "numeric"
+DATETIME = "datetime"
+CATEGORICAL = "categorical"
+BOOLEAN = "boolean"
+TEXT = "text"
+
+CHART_TYPES = ("line", "bar", "scatter", "pie", "box")
+
+
+def _parse_ratio(values, parser):
+    """Fraction of non-null values that parse with parser"""
+    values = values.dropna()
+    if values.empty:
+        return 0.0
+    with warnings.catch_warnings():
+        # Date inference warns when it falls back to per-element parsing
+        warnings.simplefilter("ignore")
+        parsed = parser(values)
+    return float(parsed.notna().mean())
+
+
+def _to_datetime(values):
+    return pd.to_datetime(values.astype(str), errors="coerce", format="mixed")
+
+
+def _to_numeric(values):
+    return pd.to_numeric(values, errors="coerce")
+
+
+def _text_kind(values, cardinality):
+    """Classify a text column; returns (kind, ambiguous)"""
+    probe = values.dropna().head(PARSE_PROBE_VALUES)
+    numeric_ratio = _parse_ratio(probe, _to_numeric)
+    if numeric_ratio >= PARSE_MIN_RATIO:
+        return NUMERIC, False
+    date_ratio = _parse_ratio(probe, _to_datetime)
+    if date_ratio >= PARSE_MIN_RATIO:
+        return DATETIME, False
+    ambiguous = any(AMBIGUOUS_PARSE_RATIO[0] <= r < AMBIGUOUS_PARSE_RATIO[1]
+                    for r in (numeric_ratio, date_ratio))
+    if cardinality <= MAX_CATEGORIES:
+        return CATEGORICAL, ambiguous
+    return TEXT, ambiguous
+
+
+def profile_frame(frame, sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+    """Profile every column: kind, dtype, cardinality and null ratio
+
+    Null ratios and cardinalities come from one vectorized pass over a row sample.
+    Columns whose classification is ambiguous on the sample (borderline parse
+    ratios, or a cardinality near the categorical limit) are re-profiled on the
+    full data. Returns {"rows": int, "sampled": bool, "columns": {name: profile}}.
+    """
+    sampled = len(frame) > sample_rows
+    sample = frame.sample(sample_rows, random_state=seed) if sampled else frame
+
+    null_ratios = sample.isna().mean()
+    cardinalities = sample.nunique(dropna=True)
+
+    columns = {}
+    for name in frame.columns:
+        series = sample[name]
+        cardinality = int(cardinalities[name])
+        exact = not sampled
+        ambiguous = False
+
+        if pd.api.types.is_bool_dtype(series):
+            kind = BOOLEAN
+        elif pd.api.types.is_numeric_dtype(series):
+            kind = NUMERIC
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kind = DATETIME
+        else:
+            kind, ambiguous = _text_kind(series, cardinality)
+            # A sample can hide extra categories; check the full column near the limit
+            ambiguous = ambiguous or (sampled and kind == CATEGORICAL and cardinality >= MAX_CATEGORIES // 2)
+
+        profile = {
+            "kind": kind,
+            "dtype": str(frame[name].dtype),
+            "cardinality": cardinality,
+            "null_ratio": float(null_ratios[name]),
+            "exact": exact,
+        }
+        if ambiguous and sampled:
+            full = frame[name]
+            profile["cardinality"] = int(full.nunique(dropna=True))
+            profile["null_ratio"] = float(full.isna().mean())
+            profile["kind"], _ = _text_kind(full, profile["cardinality"])
+            profile["exact"] = True
+        columns[name] = profile
+
+    return {"rows": len(frame), "sampled": sampled, "columns": columns}
+
+
+def _columns_of(profile, *kinds):
+    return [name for name, column in profile["columns"].items() if column["kind"] in kinds]
+
+
+def _best_category(profile):
+    """Lowest-cardinality categorical column with at least two values"""
+    candidates = [
+        (column["cardinality"], name)
+        for name, column in profile["columns"].items()
+        if column["kind"] in (CATEGORICAL, BOOLEAN) and 2 <= column["cardinality"] <= MAX_CATEGORIES
+    ]
+    return min(candidates)[1] if candidates else None
+
+
+def propose_mappings(profile):
+    """Suggested {"x", "y", "color"} column mapping for each chart type
+
+    A value of None means no suitable column was found for that role.
+    """
+    numeric = _columns_of(profile, NUMERIC)
+    dates = _columns_of(profile, DATETIME)
+    category = _best_category(profile)
+    first_numeric = numeric[0] if numeric else None
+
+    line_x = dates[0] if dates else (numeric[0] if len(numeric) > 1 else None)
+    line_y = next((name for name in numeric if name != line_x), None)
+
+    return {
+        "line": {"x": line_x, "y": line_y, "color": None},
+        "bar": {"x": category, "y": first_numeric, "color": None},
+        "scatter": {
+            "x": first_numeric,
+            "y": numeric[1] if len(numeric) > 1 else None,
+            "color": category,
+        },
+        "pie": {"x": category, "y": first_numeric, "color": None},
+        "box": {"x": category, "y": first_numeric, "color": None},
+    }
+
+
+def columns_for_role(profile, chart_type, role):
+    """Columns that make sense for a chart role, used to populate selectors"""
+    if role == "x" and chart_type == "line":
+        return _columns_of(profile, DATETIME, NUMERIC)
+    if role == "x" and chart_type in ("bar", "pie", "box"):
+        return _columns_of(profile, CATEGORICAL, BOOLEAN, NUMERIC)
+    if role == "color":
+        return _columns_of(profile, CATEGORICAL, BOOLEAN)
+    return _columns_of(profile, NUMERIC)
+
+
+def apply_schema(frame, profile, columns):
+    """Copy of frame[columns] with text columns converted to their inferred kind"""
+    frame = frame[list(dict.fromkeys(columns))].copy()
+    for name in frame.columns:
+        kind = profile["columns"][name]["kind"]
+        series = frame[name]
+        if kind == DATETIME and not pd.api.types.is_datetime64_any_dtype(series):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                frame[name] = _to_datetime(series)
+        elif kind == NUMERIC and not pd.api.types.is_numeric_dtype(series):
+            frame[name] = _to_numeric(series)
+    return frame
+
+
+def category_totals(frame, profile, category, value):
+    """Sum of value per category, after converting both columns to their inferred kinds
+
+    Numeric columns stored as text are parsed first, so they are added rather
+    than concatenated; values that do not parse are skipped.
+    """
+    typed = apply_schema(frame, profile, [category, value])
+    return typed.groupby(category, observed=True)[value].sum()
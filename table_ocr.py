@@ -0,0 +1,182 @@
+"""
+Table OCR
+Rebuild table grids from OCR word boxes and check them against the table formatting rules
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from chart_lint import INFO, WARNING
+from design_rules import TABLE_RULES
+from misleading_detector import parse_number
+
+MIN_ROWS = 2
+MIN_COLUMNS = 2
+# Fraction of a column's numeric cells that must share an edge to count as aligned
+ALIGNED_FRACTION = 0.8
+# Numbers at least this large should use thousands separators
+COMMA_THRESHOLD = 10_000
+
+
+def _finding(rule, severity, message, guideline):
+    return {"rule": rule, "severity": severity, "message": message, "guideline": guideline}
+
+
+def group_rows(words):
+    """Split words into text rows by their vertical centres, top to bottom"""
+    if not words:
+        return []
+    centers = np.array([word["top"] + word["height"] / 2.0 for word in words])
+    heights = np.array([word["height"] for word in words], dtype=float)
+    order = np.argsort(centers, kind="stable")
+    # A new row starts where the gap between consecutive centres exceeds half a text height
+    gaps = np.diff(centers[order]) > 0.5 * max(np.median(heights), 1.0)
+    row_ids = np.concatenate([[0], np.cumsum(gaps)])
+    rows = [[] for _ in range(int(row_ids[-1]) + 1)]
+    for index, row_id in zip(order, row_ids):
+        rows[row_id].append(words[index])
+    return [sorted(row, key=lambda word: word["left"]) for row in rows]
+
+
+def column_bounds(words, min_gap=None):
+    """(left, right) extents of columns separated by vertical strips free of text on every row"""
+    lefts = np.array([word["left"] for word in words])
+    rights = np.array([word["left"] + word["width"] for word in words])
+    if min_gap is None:
+        # Wider than the space between words of one cell, narrower than column gutters
+        min_gap = max(np.median([word["height"] for word in words]), 1.0)
+    origin = lefts.min()
+    occupied = np.zeros(rights.max() - origin + 1, dtype=np.int32)
+    np.add.at(occupied, lefts - origin, 1)
+    np.add.at(occupied, rights - origin, -1)
+    occupied = np.cumsum(occupied) > 0
+
+    bounds = []
+    start = None
+    gap = 0
+    for x, filled in enumerate(occupied):
+        if filled:
+            if start is None:
+                start = x
+            elif gap >= min_gap:
+                bounds.append((int(start + origin), int(x - gap + origin)))
+                start = x
+            gap = 0
+        else:
+            gap += 1
+    if start is not None:
+        bounds.append((int(start + origin), int(len(occupied) - gap + origin)))
+    return bounds
+
+
+def _cell(words):
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "left": min(word["left"] for word in words),
+        "right": max(word["left"] + word["width"] for word in words),
+        "conf": float(np.mean([word["conf"] for word in words])),
+    }
+
+
+def reconstruct_table(words, min_rows=MIN_ROWS, min_columns=MIN_COLUMNS):
+    """Rebuild a table from OCR word boxes; None if the words do not form a grid
+
+    Returns {"frame": DataFrame, "cells": [[cell or None, ...], ...], "bounds": [...],
+    "header": bool}. Cells keep their text, left/right edges and mean confidence
+    so formatting rules can be checked. Numeric columns are parsed to numbers.
+    """
+    words = [word for word in words if word["text"].strip()]
+    if not words:
+        return None
+    bounds = column_bounds(words)
+    rows = group_rows(words)
+    if len(bounds) < min_columns or len(rows) < min_rows:
+        return None
+
+    starts = np.array([left for left, _ in bounds])
+    cells = []
+    for row in rows:
+        by_column = {}
+        for word in row:
+            center = word["left"] + word["width"] / 2.0
+            column = int(np.clip(np.searchsorted(starts, center, side="right") - 1, 0, len(bounds) - 1))
+            by_column.setdefault(column, []).append(word)
+        cells.append([_cell(by_column[c]) if c in by_column else None for c in range(len(bounds))])
+
+    texts = [[cell["text"] if cell else "" for cell in row] for row in cells]
+    numeric = [[parse_number(text) is not None for text in row] for row in texts]
+    # A first row of labels above mostly numeric rows is a header
+    header = len(cells) > 1 and not any(numeric[0]) and any(any(row) for row in numeric[1:])
+    columns = texts[0] if header else [f"Column {i + 1}" for i in range(len(bounds))]
+    columns = [name or f"Column {i + 1}" for i, name in enumerate(columns)]
+    frame = pd.DataFrame(texts[1:] if header else texts, columns=pd.Index(columns).astype(str))
+    frame.columns = _dedupe(list(frame.columns))
+
+    for name in frame.columns:
+        parsed = frame[name].map(parse_number)
+        filled = frame[name] != ""
+        if filled.any() and parsed[filled].notna().all():
+            frame[name] = parsed
+    return {"frame": frame, "cells": cells, "bounds": bounds, "header": header}
+
+
+def _dedupe(names):
+    seen = {}
+    result = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        result.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return result
+
+
+def _decimals(text):
+    match = re.search(r"\.(\d+)", text)
+    return len(match.group(1)) if match else 0
+
+
+def check_table_rules(table):
+    """Findings for TABLE_RULES formatting guidelines measurable from a reconstructed table
+
+    Checks right alignment of numbers, consistent decimal precision and
+    thousands separators, column by column.
+    """
+    if table is None:
+        return []
+    formatting = TABLE_RULES["formatting"]
+    body = table["cells"][1:] if table["header"] else table["cells"]
+    findings = []
+    for index, name in enumerate(table["frame"].columns):
+        cells = [row[index] for row in body if row[index] is not None]
+        numbers = [cell for cell in cells if parse_number(cell["text"]) is not None]
+        if len(numbers) < 2 or len(numbers) < 0.8 * len(cells):
+            continue
+
+        lefts = np.array([cell["left"] for cell in numbers], dtype=float)
+        rights = np.array([cell["right"] for cell in numbers], dtype=float)
+        widths = rights - lefts
+        tolerance = max(np.median(widths) * 0.15, 2.0)
+        right_aligned = (np.abs(rights - np.median(rights)) <= tolerance).mean() >= ALIGNED_FRACTION
+        left_aligned = (np.abs(lefts - np.median(lefts)) <= tolerance).mean() >= ALIGNED_FRACTION
+        # Equal-width numbers line up on both edges, so only varying widths are conclusive
+        if not right_aligned and np.ptp(widths) > tolerance:
+            how = "left-aligned" if left_aligned else "not aligned"
+            findings.append(_finding("right_align_numbers", WARNING,
+                                     f"Numbers in column '{name}' are {how}", formatting[0]))
+
+        decimals = {_decimals(cell["text"]) for cell in numbers}
+        if len(decimals) > 1:
+            findings.append(_finding(
+                "consistent_precision", WARNING,
+                f"Column '{name}' mixes {', '.join(str(d) for d in sorted(decimals))} decimal places",
+                formatting[2]))
+
+        missing_commas = [cell["text"] for cell in numbers
+                          if abs(parse_number(cell["text"])) >= COMMA_THRESHOLD and "," not in cell["text"]]
+        if missing_commas:
+            findings.append(_finding(
+                "thousands_separators", INFO,
+                f"Column '{name}' has large numbers without commas (e.g. {missing_commas[0]})",
+                formatting[3]))
+    return findings
@@ -2,6 +2,8 @@
 """
 Test script for CrystalViz AI Agent
 Verifies that all modules can be imported and basic functionality works
+
+Run with pytest, or directly for a summary of every check.
 """
 
 def test_imports():
@@ -65,6 +67,1084 @@ def test_design_rules():
         print(f"❌ Design rules error: {e}")
         return False
 
+def test_batched_analysis():
+    """Test that analysis prompts run as one padded generate call returning only the answers"""
+    import numpy as np
+    import torch
+    from types import SimpleNamespace
+    from analysis_engine import DEFAULT_MAX_NEW_TOKENS, analyze_image, analyze_requests
+    
+    vocabulary = {}
+    def token_ids(text):
+        return [vocabulary.setdefault(word, len(vocabulary) + 1) for word in text.split()]
+    
+    class FakeProcessor:
+        tokenizer = SimpleNamespace(padding_side="right")
+        
+        def __call__(self, images, text, padding, return_tensors):
+            assert len(images) == len(text) and self.tokenizer.padding_side == "left"
+            rows = [token_ids(prompt) for prompt in text]
+            width = max(len(row) for row in rows)
+            input_ids = torch.tensor([[0] * (width - len(row)) + row for row in rows])
+            return SimpleNamespace(input_ids=input_ids, to=lambda device: {"input_ids": input_ids})
+        
+        def batch_decode(self, ids, skip_special_tokens):
+            words = {index: word for word, index in vocabulary.items()}
+            return [" ".join(words[i] for i in row.tolist() if i) for row in ids]
+    
+    class FakeModel:
+        device = "cpu"
+        calls = []
+        
+        def generate(self, input_ids, max_new_tokens):
+            self.calls.append((input_ids.shape[0], max_new_tokens))
+            answers = torch.tensor([token_ids(f"answer {i}") for i in range(input_ids.shape[0])])
+            return torch.cat([input_ids, answers], dim=1)
+    
+    pipe = SimpleNamespace(processor=FakeProcessor(), model=FakeModel())
+    image = np.zeros((40, 60, 3), np.uint8)
+    results = analyze_image(pipe, image, ["Rate it", "Is the axis at zero?", "Improve it"])
+    assert results == {"Analysis 1": "answer 0", "Analysis 2": "answer 1", "Analysis 3": "answer 2"}
+    assert FakeModel.calls == [(3, DEFAULT_MAX_NEW_TOKENS)]
+    
+    # Rows from several requests share bounded batches and come back per request
+    results = analyze_requests(pipe, [(image, ["a", "b"]), (image, ["c"])], batch_size=2, max_new_tokens=8)
+    assert [list(result) for result in results] == [["Analysis 1", "Analysis 2"], ["Analysis 1"]]
+    assert FakeModel.calls[1:] == [(2, 8), (1, 8)]
+    
+    # A broken batched path is reported, not silently replaced by per-prompt calls
+    def fail(**kwargs):
+        raise ValueError("input longer than max_length")
+    pipe.model.generate = fail
+    try:
+        analyze_image(pipe, image, ["Rate it"])
+        raise AssertionError("generate error was swallowed")
+    except ValueError:
+        pass
+    
+    # Pipelines without a processor use one call per prompt
+    calls = []
+    def sequential_pipe(image, prompt, max_new_tokens):
+        calls.append(max_new_tokens)
+        return [{"generated_text": prompt.upper()}]
+    assert analyze_image(sequential_pipe, image, ["a", "b"]) == {"Analysis 1": "A", "Analysis 2": "B"}
+    assert calls == [DEFAULT_MAX_NEW_TOKENS] * 2
+    
+    print("✅ Batched analysis verified!")
+
+def tiny_llava_pipe():
+    """Offline stand-in for the LLaVA pipeline: a random 2-layer LLaVA, byte-level tokenizer, 28px images"""
+    import types
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import (
+        CLIPImageProcessor, CLIPVisionConfig, LlamaConfig, LlavaConfig, LlavaForConditionalGeneration,
+        LlavaProcessor, PreTrainedTokenizerFast
+    )
+    
+    vocab = {char: i for i, char in enumerate(sorted(pre_tokenizers.ByteLevel.alphabet()))}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, eos_token=next(iter(vocab)),
+                                        pad_token=next(iter(vocab)))
+    tokenizer.add_special_tokens({"additional_special_tokens": ["<image>"]})
+    image_processor = CLIPImageProcessor(size={"shortest_edge": 28}, crop_size={"height": 28, "width": 28})
+    processor = LlavaProcessor(image_processor=image_processor, tokenizer=tokenizer, patch_size=14,
+                               vision_feature_select_strategy="default", num_additional_image_tokens=1)
+    torch.manual_seed(0)
+    config = LlavaConfig(
+        vision_config=CLIPVisionConfig(hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                                       num_attention_heads=2, image_size=28, patch_size=14),
+        text_config=LlamaConfig(hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2,
+                                num_key_value_heads=2, vocab_size=len(tokenizer), pad_token_id=0,
+                                bos_token_id=0, eos_token_id=0),
+        image_token_id=tokenizer.convert_tokens_to_ids("<image>"),
+    )
+    return types.SimpleNamespace(processor=processor, model=LlavaForConditionalGeneration(config).eval())
+
+def test_shared_image_features():
+    """Test that an image's prompt rows share one vision-tower pass and generate the same answers"""
+    import numpy as np
+    import torch
+    from PIL import Image
+    from analysis_engine import format_llava_prompt, generate_batch
+    
+    pipe = tiny_llava_pipe()
+    rng = np.random.default_rng(0)
+    chart, table = (Image.fromarray(rng.integers(0, 255, (40, 50, 3), dtype=np.uint8)) for _ in range(2))
+    images, prompts = [chart, chart, table], ["Rate it", "Is the axis at zero?", "Check the fonts"]
+    
+    # Reference: the processor encodes every row's image
+    pipe.processor.tokenizer.padding_side = "left"
+    inputs = pipe.processor(images=images, text=[format_llava_prompt(p) for p in prompts], padding=True,
+                            return_tensors="pt")
+    with torch.inference_mode():
+        output_ids = pipe.model.generate(**inputs, max_new_tokens=6)
+    expected = [text.strip() for text in pipe.processor.batch_decode(
+        output_ids[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)]
+    
+    encoded = []
+    vision_forward = pipe.model.model.vision_tower.forward
+    def counting_forward(pixel_values, *args, **kwargs):
+        encoded.append(pixel_values.shape[0])
+        return vision_forward(pixel_values, *args, **kwargs)
+    pipe.model.model.vision_tower.forward = counting_forward
+    assert generate_batch(pipe, images, prompts, max_new_tokens=6) == expected
+    # One vision pass over the two distinct images, not one per row
+    assert encoded == [2]
+    
+    print("✅ Shared image features verified!")
+
+def test_analysis_cache():
+    """Test that analysis results round-trip through the on-disk cache"""
+    import os
+    import tempfile
+    import numpy as np
+    from analysis_cache import AnalysisCache, analysis_key
+    from inference_server import make_vision_batcher
+    from model_registry import LLAVA_MODEL_ID, ModelRegistry
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "analysis.sqlite")
+        cache = AnalysisCache(path, max_bytes=200, rules_version="v1")
+        key = analysis_key(b"image-bytes", "model", ["prompt"])
+        assert cache.get(key) is None
+        
+        cache.put(key, {"Analysis 1": "Looks good"})
+        assert cache.get(key) == {"Analysis 1": "Looks good"}
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+        
+        # Filling past max_bytes evicts the least recently used entries
+        for i in range(10):
+            cache.put(analysis_key(b"other", "model", [str(i)]), {"text": "x" * 40})
+        assert cache.stats()["bytes"] <= 200
+        
+        # A new rules version invalidates everything
+        assert AnalysisCache(path, rules_version="v2").stats()["entries"] == 0
+    
+    # Answers from another precision or answer length are separate entries
+    image = np.zeros((20, 30, 3), np.uint8)
+    registry = ModelRegistry(loader=lambda spec: None, precisions={"image_to_text": "fp32"})
+    batcher = make_vision_batcher(registry, max_new_tokens=200)
+    fp32_key = batcher.cache_key(image, ["prompt"])
+    assert fp32_key == analysis_key(image, LLAVA_MODEL_ID, ["prompt"], "fp32", 200)
+    assert fp32_key != analysis_key(image, LLAVA_MODEL_ID, ["prompt"], "fp32", 50)
+    registry.set_precision("image_to_text", "int8")
+    assert batcher.cache_key(image, ["prompt"]) != fp32_key
+    batcher.close()
+    
+    print("✅ Analysis cache verified!")
+
+def test_model_registry():
+    """Test lazy loading, unloading and memory-limit eviction in the model registry"""
+    import os
+    import time
+    import types
+    import torch
+    from model_registry import ModelRegistry
+    
+    loaded = []
+    def fake_loader(spec):
+        loaded.append(spec["model"])
+        return object()
+    
+    specs = {"a": {"task": "t", "model": "model-a"}, "b": {"task": "t", "model": "model-b"}}
+    registry = ModelRegistry(specs, loader=fake_loader)
+    assert loaded == []
+    
+    first = registry.get("a")
+    assert registry.get("a") is first and loaded == ["model-a"]
+    assert registry.is_loaded("a") and not registry.is_loaded("b")
+    
+    assert registry.unload("a") and not registry.is_loaded("a")
+    assert [row["loaded"] for row in registry.stats()] == [False, False]
+    
+    # Changing precision unloads the model so it reloads at the new precision
+    registry.get("b")
+    registry.set_precision("b", "int8")
+    assert not registry.is_loaded("b")
+    assert registry.stats()[1]["precision"] == "int8"
+    
+    # Over the memory budget, the least recently used other model is unloaded first
+    def sized_loader(spec):
+        weights = torch.zeros(100, dtype=torch.uint8)
+        return types.SimpleNamespace(model=types.SimpleNamespace(state_dict=lambda: {"weight": weights}))
+    
+    specs["c"] = {"task": "t", "model": "model-c"}
+    previous = os.environ.pop("CRYSTALVIZ_MAX_MODEL_BYTES", None)
+    try:
+        assert ModelRegistry(specs, loader=sized_loader).max_resident_bytes is None
+        os.environ["CRYSTALVIZ_MAX_MODEL_BYTES"] = "250"
+        registry = ModelRegistry(specs, loader=sized_loader)
+    finally:
+        os.environ.pop("CRYSTALVIZ_MAX_MODEL_BYTES", None)
+        if previous is not None:
+            os.environ["CRYSTALVIZ_MAX_MODEL_BYTES"] = previous
+    assert registry.max_resident_bytes == 250
+    for name in ("a", "b", "a", "c"):
+        registry.get(name)
+        time.sleep(0.01)
+    assert [registry.is_loaded(name) for name in "abc"] == [True, False, True]
+    assert registry.resident_bytes() == 200
+    
+    print("✅ Model registry verified!")
+
+def test_int8_quantization():
+    """Test that int8 mode quantizes GPT-2's Conv1D layers and leaves the tied output layer alone"""
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel
+    from transformers.pytorch_utils import Conv1D
+    from model_registry import quantize_int8
+    
+    torch.manual_seed(0)
+    config = GPT2Config(n_layer=2, n_embd=32, n_head=2, vocab_size=50, n_positions=32,
+                        bos_token_id=0, eos_token_id=0)
+    model = GPT2LMHeadModel(config).eval()
+    input_ids = torch.randint(0, 50, (1, 8))
+    with torch.inference_mode():
+        expected = model(input_ids).logits
+    
+    # Four Conv1D layers per block: attention in/out projections and the two MLP layers
+    assert quantize_int8(model) == 8
+    assert not any(isinstance(module, Conv1D) for module in model.modules())
+    assert isinstance(model.transformer.h[0].mlp.c_fc, torch.ao.nn.quantized.dynamic.Linear)
+    assert model.lm_head.weight.data_ptr() == model.transformer.wte.weight.data_ptr()
+    with torch.inference_mode():
+        assert torch.allclose(model(input_ids).logits, expected, atol=0.1)
+    
+    try:
+        quantize_int8(torch.nn.Sequential(torch.nn.ReLU()))
+        raise AssertionError("model without Linear layers was accepted")
+    except ValueError:
+        pass
+    
+    print("✅ int8 quantization verified!")
+
+def test_job_queue():
+    """Test that background jobs run, persist results, deduplicate by id, expire and recover"""
+    import os
+    import tempfile
+    import time
+    from job_queue import JobQueue, default_workers
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, "jobs.sqlite"), workers=2)
+        calls = []
+        def handler(payload):
+            calls.append(payload)
+            if payload.get("fail"):
+                raise ValueError("bad image")
+            return {"Analysis 1": payload["text"]}
+        queue.register("design_analysis", handler)
+        
+        job_id = queue.submit("design_analysis", {"text": "ok"}, job_id="same-image")
+        assert queue.wait(job_id, timeout=5)["result"] == {"Analysis 1": "ok"}
+        
+        # Resubmitting a finished job id does not run it again
+        queue.submit("design_analysis", {"text": "ok"}, job_id="same-image")
+        assert len(calls) == 1
+        
+        failed = queue.wait(queue.submit("design_analysis", {"fail": True}), timeout=5)
+        assert failed["status"] == "failed" and "bad image" in failed["error"]
+        
+        # Finished jobs are pruned after their TTL, so the same id runs again
+        assert queue.prune() == 0 and queue.status("same-image") is not None
+        assert queue.prune(now=time.time() + queue.ttl_seconds + 1) == 2
+        assert queue.status("same-image") is None
+        queue.wait(queue.submit("design_analysis", {"text": "ok"}, job_id="same-image"), timeout=5)
+        assert len(calls) == 3
+        
+        # Opening the database again only fails pending jobs whose process has exited
+        import subprocess
+        import sys
+        exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                                capture_output=True, text=True).stdout.strip()
+        for job_id, owner in (("live", os.getpid()), ("orphan", int(exited)), ("legacy", None)):
+            queue._conn.execute(
+                "INSERT INTO jobs (id, kind, status, created, owner) VALUES (?, 'design_analysis', 'running', ?, ?)",
+                (job_id, time.time(), owner)
+            )
+        queue._conn.commit()
+        JobQueue(queue.path)
+        assert queue.status("live")["status"] == "running"
+        assert queue.status("orphan")["status"] == "failed"
+        assert queue.status("legacy")["error"] == "Interrupted by restart"
+    
+    # CRYSTALVIZ_JOB_WORKERS overrides the caller's default worker count
+    previous = os.environ.pop("CRYSTALVIZ_JOB_WORKERS", None)
+    try:
+        assert default_workers(fallback=4) == 4
+        os.environ["CRYSTALVIZ_JOB_WORKERS"] = "2"
+        assert default_workers(fallback=4) == 2
+    finally:
+        os.environ.pop("CRYSTALVIZ_JOB_WORKERS", None)
+        if previous is not None:
+            os.environ["CRYSTALVIZ_JOB_WORKERS"] = previous
+    
+    print("✅ Job queue verified!")
+
+def test_micro_batcher():
+    """Test that concurrent requests are coalesced into a single batch"""
+    from types import SimpleNamespace
+    import numpy as np
+    from benchmark import StubBatchingPipeline
+    from inference_server import MicroBatcher, make_vision_batcher
+    
+    batch_sizes = []
+    def run_batch(requests):
+        batch_sizes.append(len(requests))
+        return [request * 2 for request in requests]
+    
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(3)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4]
+    assert batch_sizes == [3]
+    
+    # Requests beyond max_batch_size spill into a second batch
+    futures = [batcher.submit(i) for i in range(6)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8, 10]
+    assert batch_sizes[1:] == [4, 2]
+    batcher.close()
+    
+    # Coalesced vision requests are split into generate calls of bounded rows
+    pipe = StubBatchingPipeline()
+    registry = SimpleNamespace(get=lambda name: pipe)
+    vision = make_vision_batcher(registry, max_batch_size=4, max_wait_ms=200, max_batch_rows=3)
+    image = np.zeros((20, 30, 3), np.uint8)
+    futures = [vision.submit((image, ["a", "b", "c"])) for _ in range(4)]
+    assert all(len(future.result(timeout=5)) == 3 for future in futures)
+    assert vision.stats()["batches"] == 1 and pipe.calls == 4 and pipe.rows == 12
+    vision.close()
+    
+    print("✅ Micro-batcher verified!")
+
+def test_downsampling():
+    """Test that LTTB keeps endpoints and peaks while capping the point count"""
+    import numpy as np
+    import pandas as pd
+    from downsampling import lttb_indices, downsample_scatter
+    
+    y = np.sin(np.linspace(0, 20, 100000))
+    y[54321] = 5.0
+    indices = lttb_indices(np.arange(len(y)), y, 500)
+    assert len(indices) <= 500 and indices[0] == 0 and indices[-1] == len(y) - 1
+    assert 54321 in indices
+    
+    frame = pd.DataFrame({
+        "x": np.random.rand(100000), "y": np.random.rand(100000),
+        "c": np.random.choice(["A", "B"], 100000)
+    })
+    reduced = downsample_scatter(frame, "x", "y", color="c", max_points=5000, bins=40)
+    assert len(reduced) <= 5000 and set(reduced["c"]) == {"A", "B"}
+    
+    print("✅ Downsampling verified!")
+
+def test_dataset_cache():
+    """Test that datasets round-trip through the Parquet cache and are evicted by size"""
+    import shutil
+    import tempfile
+    import pandas as pd
+    from dataset_cache import DatasetCache, fingerprint
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DatasetCache(tmp)
+        frame = pd.DataFrame({"Sales": [1.0, 2.0, 3.0], "Category": ["A", "B", "A"]})
+        key = fingerprint(b"Sales,Category\n1,A\n2,B\n3,A\n")
+        assert not cache.contains(key) and cache.load(key) is None
+        
+        with cache.writer(key) as part_writer:
+            part_writer.write(frame.iloc[:2])
+            part_writer.write(frame.iloc[2:])
+        assert cache.load(key).equals(frame)
+        assert sum(len(chunk) for chunk in cache.iter_frames(key)) == 3
+        
+        # A store that pushes the cache over its limit evicts older datasets
+        cache.max_bytes = cache.total_bytes()
+        cache.store("newer", frame)
+        assert cache.contains("newer") and not cache.contains(key)
+        
+        # A dataset evicted by another session while this one lists or reads it is skipped
+        class RacingCache(DatasetCache):
+            def _parts(self, key):
+                shutil.rmtree(self.path_for(key))
+                return super()._parts(key)
+        racing = RacingCache(tmp)
+        assert racing.load("newer") is None
+        racing.store("newer", frame)
+        assert racing.total_bytes() == 0
+        racing._touch("newer")
+    
+    print("✅ Dataset cache verified!")
+
+def test_figure_cache():
+    """Test that figures are memoized per key with bounded LRU eviction"""
+    from figure_cache import FigureCache
+    
+    cache = FigureCache(max_figures=2)
+    builds = []
+    def build(name):
+        builds.append(name)
+        return {"title": name}
+    
+    bar = cache.figure(("data", "bar"), lambda: build("bar"))
+    assert cache.figure(("data", "bar"), lambda: build("bar")) is bar
+    cache.figure(("data", "pie"), lambda: build("pie"))
+    cache.figure(("data", "box"), lambda: build("box"))
+    cache.figure(("data", "bar"), lambda: build("bar"))
+    assert builds == ["bar", "pie", "box", "bar"]
+    assert cache.stats()["figures"] == 2 and cache.stats()["figure_hits"] == 1
+    
+    print("✅ Figure cache verified!")
+
+def test_schema_inference():
+    """Test column profiling and the proposed chart mappings"""
+    import numpy as np
+    import pandas as pd
+    from data_ingest import StreamingAggregator, downcast_frame
+    from schema_inference import category_totals, profile_frame, propose_mappings
+    
+    rows = 200
+    data = pd.DataFrame({
+        'when': pd.date_range('2023-01-01', periods=rows, freq='D').astype(str),
+        'revenue': np.arange(rows, dtype=float),
+        'cost': np.arange(rows) * 0.5,
+        'region': np.random.default_rng(0).choice(['N', 'S', 'E'], rows),
+        'note': [f"row {i}" for i in range(rows)],
+    })
+    data.loc[::10, 'revenue'] = np.nan
+    
+    profile = profile_frame(data, sample_rows=100)
+    columns = profile["columns"]
+    assert columns['when']['kind'] == 'datetime'
+    assert columns['region']['kind'] == 'categorical'
+    assert columns['note']['kind'] == 'text'
+    assert profile["sampled"] and 0 < columns['revenue']['null_ratio'] < 0.5
+    
+    mappings = propose_mappings(profile)
+    assert mappings['line'] == {'x': 'when', 'y': 'revenue', 'color': None}
+    assert mappings['bar']['x'] == 'region'
+    assert mappings['scatter'] == {'x': 'revenue', 'y': 'cost', 'color': 'region'}
+    
+    # Numbers stored as text are added, not concatenated, in both the in-memory and streaming paths
+    text_numbers = pd.DataFrame({
+        'region': ['N', 'S', 'N', 'S', 'N'] * 20,
+        'sales': [str(i) for i in range(99)] + ['n/a'],
+    })
+    text_profile = profile_frame(text_numbers)
+    assert text_profile["columns"]['sales']['kind'] == 'numeric'
+    totals = category_totals(text_numbers, text_profile, 'region', 'sales')
+    expected = {'N': float(sum(range(0, 99, 5)) + sum(range(2, 99, 5)) + sum(range(4, 99, 5))),
+                'S': float(sum(range(1, 99, 5)) + sum(range(3, 99, 5)))}
+    assert totals.to_dict() == expected
+    aggregator = StreamingAggregator(value='sales', category='region')
+    for start in range(0, 100, 30):
+        aggregator.update(downcast_frame(text_numbers.iloc[start:start + 30].copy()))
+    assert aggregator.category_totals().to_dict() == expected
+    
+    print("✅ Schema inference verified!")
+
+def test_streaming_ingest():
+    """Test chunked CSV ingest: compact dtypes, exact category totals and an ordered sample"""
+    import io
+    import numpy as np
+    import pandas as pd
+    from data_ingest import StreamingAggregator, downcast_frame, read_csv_streaming
+    
+    frame = downcast_frame(pd.DataFrame({
+        'Date': ['2024-01-01', '2024-01-02', 'not a date', '2024-01-04'],
+        'Units': [1, 2, 3, 4],
+        'Sales': [1.5, 2.5, 3.5, 4.5],
+        'Category': ['A', 'B', 'A', 'B'],
+        'Note': ['w', 'x', 'y', 'z'],
+    }), date_columns=['Date'])
+    assert frame['Units'].dtype == np.int8 and frame['Sales'].dtype == np.float32
+    assert frame['Category'].dtype == 'category' and frame['Note'].dtype != 'category'
+    assert pd.api.types.is_datetime64_any_dtype(frame['Date']) and frame['Date'].isna().sum() == 1
+    
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'Id': np.arange(1000),
+        'Category': rng.choice(['North', 'South', 'East', 'West'], 1000),
+        'Sales': rng.integers(0, 100, 1000).astype(float),
+    })
+    # The first chunk has no West rows, so category sets differ between chunks
+    data.loc[:199, 'Category'] = data.loc[:199, 'Category'].replace('West', 'East')
+    aggregator = StreamingAggregator(sample_rows=50)
+    stats = read_csv_streaming(io.StringIO(data.to_csv(index=False)), aggregator, chunk_rows=200)
+    assert stats['rows'] == aggregator.rows == 1000
+    
+    expected = data.groupby('Category')['Sales']
+    pd.testing.assert_series_equal(aggregator.category_totals(), expected.sum(), check_names=False,
+                                   check_index_type=False)
+    assert aggregator.category_counts().to_dict() == expected.count().to_dict()
+    
+    sample = aggregator.sample()
+    assert len(sample) == 50 and list(sample.columns) == ['Id', 'Category', 'Sales']
+    # Sampled rows keep their file order and values
+    assert sample['Id'].is_monotonic_increasing
+    original = data.set_index('Id').loc[sample['Id']]
+    assert (original['Sales'].to_numpy() == sample['Sales'].to_numpy()).all()
+    assert StreamingAggregator().sample().empty and StreamingAggregator().category_totals().empty
+    
+    print("✅ Streaming ingest verified!")
+
+def test_chart_lint():
+    """Test that the lint rules flag misleading figure specs"""
+    from chart_lint import lint_figure, registered_rules
+    
+    spec = {
+        "data": [
+            {"type": "bar", "x": ["A", "B"], "y": [90, 100]},
+            {"type": "scatter", "x": ["A", "B"], "y": [1, 2], "yaxis": "y2"},
+        ],
+        "layout": {
+            "title": {"text": "Sales"},
+            "xaxis": {"title": {"text": "Region"}, "showgrid": False},
+            "yaxis": {"title": {"text": "Sales"}, "range": [80, 105], "showgrid": False},
+            "yaxis2": {"overlaying": "y"},
+            "showlegend": False,
+        },
+    }
+    result = lint_figure(spec)
+    rules = {finding["rule"] for finding in result["findings"]}
+    assert rules == {"truncated_value_axis", "dual_axes"}
+    assert set(result["timings"]) == set(registered_rules())
+    
+    pie = {"data": [{"type": "pie", "values": [1, 2], "hole": 0.4}], "layout": {"title": "Share"}}
+    assert [f["rule"] for f in lint_figure(pie)["findings"]] == ["avoided_chart_type"]
+    
+    print("✅ Chart lint verified!")
+
+def test_image_classifier():
+    """Test that synthetic tables and charts are routed to the right prompt sets"""
+    import cv2
+    import numpy as np
+    from design_rules import get_graph_analysis_prompts, get_table_analysis_prompts
+    from image_classifier import classify_image, prompts_for, rule_based_results
+    
+    table = np.full((600, 800, 3), 255, np.uint8)
+    for row in range(12):
+        y = 40 + row * 42
+        cv2.line(table, (20, y - 28), (780, y - 28), (0, 0, 0), 1)
+        for col in range(5):
+            cv2.putText(table, f"{(row + 1) * (col + 3) * 137:,}", (35 + col * 150, y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 1)
+    
+    bars = np.full((600, 800, 3), 255, np.uint8)
+    cv2.line(bars, (60, 550), (780, 550), (0, 0, 0), 2)
+    for i, value in enumerate([120, 300, 220, 410, 90]):
+        cv2.rectangle(bars, (90 + i * 130, 550 - value), (170 + i * 130, 549), (180, 119, 31), -1)
+    
+    pie = np.full((600, 800, 3), 255, np.uint8)
+    colors = [(180, 119, 31), (14, 127, 255), (44, 160, 44)]
+    for i, (start, end) in enumerate([(0, 150), (150, 260), (260, 360)]):
+        cv2.ellipse(pie, (400, 300), (220, 220), 0, start, end, colors[i], -1)
+    
+    assert classify_image(table)["label"] == "table"
+    assert prompts_for("table") == get_table_analysis_prompts()
+    bar_result = classify_image(bars)
+    assert bar_result["label"] == "bar" and rule_based_results(bar_result) is None
+    assert prompts_for("bar") == get_graph_analysis_prompts()
+    pie_result = classify_image(pie)
+    assert pie_result["label"] == "pie" and rule_based_results(pie_result) is not None
+    
+    print("✅ Image classifier verified!")
+
+def test_misleading_detector():
+    """Test aspect ratio, zero-baseline and tick parsing measurements"""
+    import cv2
+    import numpy as np
+    from misleading_detector import detect_misleading, parse_number
+    
+    chart = np.full((600, 800, 3), 255, np.uint8)
+    cv2.line(chart, (60, 550), (780, 550), (0, 0, 0), 2)
+    cv2.line(chart, (60, 20), (60, 550), (0, 0, 0), 2)
+    for i, value in enumerate([120, 300, 220, 410]):
+        cv2.rectangle(chart, (90 + i * 150, 550 - value), (190 + i * 150, 549), (180, 119, 31), -1)
+    
+    def tick_words(labels):
+        # OCR words for y-axis labels every 100 px, right-aligned against the axis
+        return [{"text": text, "left": 55 - 8 * len(text), "top": 544 - i * 100,
+                 "width": 8 * len(text), "height": 12, "conf": 90.0, "line": (1, 1, i)}
+                for i, text in enumerate(labels)]
+    
+    zero_based = detect_misleading(chart, tick_words(["0", "10", "20", "30"]), label="bar")
+    assert zero_based["findings"] == [] and abs(zero_based["measurements"]["baseline"]) < 1
+    truncated = detect_misleading(chart, tick_words(["80", "85", "90", "95"]), label="bar")
+    assert [f["rule"] for f in truncated["findings"]] == ["truncated_axis"]
+    
+    tall = cv2.resize(chart, (250, 800))
+    assert "tall_narrow" in [f["rule"] for f in detect_misleading(tall)["findings"]]
+    assert parse_number("$1,200") == 1200 and parse_number("40%") == 40 and parse_number("Q1") is None
+    
+    print("✅ Misleading element detector verified!")
+
+def test_table_ocr():
+    """Test table reconstruction from word boxes and the table formatting checks"""
+    from table_ocr import reconstruct_table, check_table_rules
+    
+    def word(text, left, top):
+        return {"text": text, "left": left, "top": top, "width": 9 * len(text),
+                "height": 14, "conf": 90.0, "line": (1, 1, 1)}
+    
+    words = [word("Region", 20, 10), word("Sales", 215, 10), word("Growth", 340, 10)]
+    for i, (region, sales, growth) in enumerate([("North", "12,400", "3.5%"),
+                                                 ("South", "9,800", "12.25%"),
+                                                 ("East", "15000", "1.0%")]):
+        top = 40 + i * 30
+        words += [word(region, 20, top), word(sales, 260 - 9 * len(sales), top), word(growth, 340, top)]
+    
+    table = reconstruct_table(words)
+    frame = table["frame"]
+    assert list(frame.columns) == ["Region", "Sales", "Growth"] and table["header"]
+    assert frame["Sales"].tolist() == [12400, 9800, 15000]
+    rules = {(f["rule"], f["message"].split("'")[1]) for f in check_table_rules(table)}
+    assert rules == {("thousands_separators", "Sales"), ("right_align_numbers", "Growth"),
+                     ("consistent_precision", "Growth")}
+    assert reconstruct_table([word("Hello", 0, 0), word("world", 60, 0)]) is None
+    
+    print("✅ Table OCR verified!")
+
+def test_batch_analyze():
+    """Test batch CLI discovery, checkpoints, an end-to-end run without model or OCR and classification reuse"""
+    import json
+    import os
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+    from PIL import Image
+    import image_classifier
+    from analysis_cache import AnalysisCache
+    from batch_analyze import analyze_batch, find_images, load_checkpoint, main, submit_ahead
+    from benchmark import StubBatchingPipeline
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "nested"))
+        for name in ("b.png", "a.jpg", os.path.join("nested", "c.PNG")):
+            Image.new("RGB", (80, 60), "white").save(os.path.join(tmp, name))
+        open(os.path.join(tmp, "notes.txt"), "w").close()
+        images = find_images(tmp)
+        assert [os.path.relpath(p, tmp) for p in images] == ["a.jpg", "b.png", os.path.join("nested", "c.PNG")]
+        
+        manifest = os.path.join(tmp, "manifest.txt")
+        with open(manifest, "w") as f:
+            f.write("# comment\n\na.jpg\n" + json.dumps({"path": os.path.join(tmp, "b.png")}) + "\n")
+        assert find_images(manifest) == [os.path.join(tmp, "a.jpg"), os.path.join(tmp, "b.png")]
+        
+        output = os.path.join(tmp, "results.jsonl")
+        assert load_checkpoint(output) == set()
+        with open(output, "w") as f:
+            f.write(json.dumps({"path": images[0], "analysis": {}}) + "\n")
+            f.write(json.dumps({"path": images[1], "error": "Could not read image"}) + "\n")
+            f.write(json.dumps({"path": images[2], "analysis": {"Analysis 1": "Error: out of memory"}}) + "\n")
+            f.write(json.dumps({"path": manifest, "analysis": {}, "ocr_error": "tesseract not found"}) + "\n")
+            f.write('{"path": "trunc')
+        assert load_checkpoint(output) == {images[0]}
+        
+        # Batches come back in input order with later items already submitted
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            batches = list(submit_ahead(pool, lambda x: x * 10, range(7), batch_size=3, window=5))
+        assert [[item for item, _ in batch] for batch in batches] == [[0, 1, 2], [3, 4, 5], [6]]
+        assert [future.result() for _, future in batches[1]] == [30, 40, 50]
+        
+        assert main([tmp, "-o", output, "--resume", "--no-model", "--no-ocr", "--workers", "1",
+                     "--batch-size", "2"]) == 0
+        with open(output) as f:
+            lines = f.read().splitlines()
+        records = [json.loads(line) for line in lines[-2:]]
+        assert [r["path"] for r in records] == images[1:]
+        assert all("classification" in r and "misleading" in r for r in records)
+        assert load_checkpoint(output) == set(images)
+        
+        # Classifications from the OCR workers are reused rather than recomputed
+        pipe = StubBatchingPipeline()
+        registry = SimpleNamespace(get=lambda name: pipe, precision=lambda name: "auto")
+        cache = AnalysisCache(os.path.join(tmp, "analysis.sqlite"))
+        classify_image = image_classifier.classify_image
+        image_classifier.classify_image = None
+        try:
+            table = {"label": "table", "confidence": 0.9, "scores": {}}
+            records = analyze_batch(images[:2], {}, registry, cache, None, None,
+                                    classifications=dict.fromkeys(images[:2], table))
+        finally:
+            image_classifier.classify_image = classify_image
+        assert [r["classification"] for r in records] == [table, table]
+        assert pipe.calls == 2 and not any(r["cached"] for r in records)
+    
+    print("✅ Batch analyzer verified!")
+
+def test_preprocessing():
+    """Test image decoding and the separate model and OCR inputs derived from it"""
+    import cv2
+    import numpy as np
+    from preprocessing import (MODEL_INPUT_SIZE, decode_image, deskew, estimate_skew, prepare_model_image,
+                               prepare_ocr_image)
+    
+    image = np.zeros((400, 600, 3), np.uint8)
+    image[:, :, 0] = 255  # BGR blue
+    data = cv2.imencode(".png", image)[1].tobytes()
+    assert decode_image(data).shape == (400, 600, 3)
+    # Over the pixel budget, the image is decoded at a reduced scale
+    assert decode_image(data, max_pixels=600 * 400 // 4).shape == (200, 300, 3)
+    assert decode_image(data, max_pixels=600 * 400 // 10).shape == (100, 150, 3)
+    try:
+        decode_image(b"not an image")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    
+    model_image = prepare_model_image(np.ascontiguousarray(np.tile(image, (3, 3, 1))))
+    assert model_image.mode == "RGB" and min(model_image.size) == MODEL_INPUT_SIZE
+    assert model_image.getpixel((0, 0)) == (0, 0, 255)
+    # Small images are never upscaled, and grayscale input becomes RGB
+    assert prepare_model_image(image[:100, :200]).size == (200, 100)
+    assert prepare_model_image(np.zeros((50, 60), np.uint8)).mode == "RGB"
+    
+    # Horizontal gridlines rotated by 3 degrees are detected and levelled
+    lines = np.full((400, 600), 255, np.uint8)
+    for y in range(60, 400, 60):
+        cv2.line(lines, (40, y), (560, y), 0, 2)
+    rotated = cv2.warpAffine(lines, cv2.getRotationMatrix2D((300, 200), 3, 1.0), (600, 400), borderValue=255)
+    assert abs(estimate_skew(rotated) + 3) < 0.5
+    assert abs(estimate_skew(deskew(rotated))) < 0.5
+    assert deskew(lines) is lines
+    
+    ocr_image = prepare_ocr_image(cv2.cvtColor(rotated, cv2.COLOR_GRAY2BGR), max_side=300)
+    assert ocr_image.ndim == 2 and ocr_image.shape == (200, 300)
+    assert set(np.unique(ocr_image)) <= {0, 255}
+    assert prepare_ocr_image(rotated, binarize=False, straighten=False) is rotated
+    
+    print("✅ Image preprocessing verified!")
+
+def test_ocr_cache():
+    """Test OCR cache keys and that OCR results live in their own cache file"""
+    import os
+    import tempfile
+    import numpy as np
+    from ocr_engine import ocr_key, open_ocr_cache
+    
+    image = np.zeros((20, 30), dtype=np.uint8)
+    assert ocr_key(image) == ocr_key(image.copy())
+    assert ocr_key(image) != ocr_key(image + 1)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ocr.sqlite")
+        cache = open_ocr_cache(path)
+        cache.put(ocr_key(image), {"text": "Sales", "words": []})
+        assert open_ocr_cache(path).get(ocr_key(image))["text"] == "Sales"
+    
+    print("✅ OCR cache verified!")
+
+def test_ocr_tiling():
+    """Test that tiles are cut only between text regions and their words stitch back in order"""
+    from ocr_engine import plan_tiles, stitch_text
+    
+    # Text regions as (x, y, w, h) cover rows 100-200, 230-530 and 800-840
+    regions = [(0, 100, 50, 100), (0, 230, 50, 300), (0, 800, 50, 40)]
+    tiles = plan_tiles(1000, regions, n_tiles=4)
+    # The band 530-750 holds no text and is dropped
+    assert tiles == [(0, 229), (229, 530), (750, 1000)]
+    for top, bottom in tiles:
+        assert not any(y < top < y + h or y < bottom < y + h for _, y, _, h in regions)
+    # Without a free row to cut at, the whole image is one tile
+    assert plan_tiles(300, [(0, 0, 10, 300)], n_tiles=3) == [(0, 300)]
+    
+    words = [
+        {"text": "Sales", "line": (0, 1, 1, 1)}, {"text": "2024", "line": (0, 1, 1, 1)},
+        {"text": "North", "line": (0, 1, 1, 2)},
+        {"text": "South", "line": (1, 1, 1, 1)},
+    ]
+    assert stitch_text(words) == "Sales 2024\nNorth\n\nSouth"
+    assert stitch_text([]) == ""
+    
+    print("✅ OCR tiling verified!")
+
+def test_ocr_backend_routing():
+    """Test that OCR off the main thread goes to a spawned pool only when tesserocr works there"""
+    import sys
+    import threading
+    import ocr_engine
+    
+    routed = {}
+    def probe():
+        routed["module"] = ocr_engine._import_tesserocr()
+        routed["uses_pool"] = ocr_engine._uses_pool()
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    if "tesserocr" in sys.modules or not ocr_engine._tesserocr_installed():
+        # Already importable everywhere in this process, or not available at all: OCR stays local
+        assert not routed["uses_pool"]
+    else:
+        assert routed["module"] is None
+        assert routed["uses_pool"] == (ocr_engine._pool_backend_info()[0] == "tesserocr")
+    
+    pool = ocr_engine.get_pool(1)
+    assert pool._mp_context.get_start_method() == "spawn"
+    
+    # Pool workers run OCR themselves instead of submitting it to a pool of their own
+    saved_worker = ocr_engine._in_pool_worker
+    try:
+        ocr_engine._warm_worker()
+        assert ocr_engine._in_pool_worker and not ocr_engine._uses_pool()
+    finally:
+        ocr_engine._in_pool_worker = saved_worker
+    
+    # An installed but broken tesserocr falls back to pytesseract instead of routing to the pool
+    saved = (ocr_engine._tesserocr_installed, ocr_engine._tesserocr_failed, sys.modules.get("tesserocr"),
+             getattr(ocr_engine._local, "api", None))
+    try:
+        ocr_engine._tesserocr_installed = lambda: True
+        ocr_engine._tesserocr_failed = False
+        ocr_engine._local.api = None
+        sys.modules["tesserocr"] = None  # makes "import tesserocr" raise ImportError
+        assert ocr_engine._tess_api() is None and ocr_engine._tesserocr_failed
+        assert not ocr_engine._uses_pool() and ocr_engine.ocr_backend() == "pytesseract"
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        assert not routed["uses_pool"]
+    finally:
+        installed, failed, module, api = saved
+        ocr_engine._tesserocr_installed, ocr_engine._tesserocr_failed = installed, failed
+        ocr_engine._local.api = api
+        if module is None:
+            sys.modules.pop("tesserocr", None)
+        else:
+            sys.modules["tesserocr"] = module
+    
+    print("✅ OCR backend routing verified!")
+
+def test_benchmark():
+    """Test the benchmark corpus, timing helper and baseline comparison"""
+    from analysis_engine import analyze_image, analyze_requests, format_llava_prompt
+    from benchmark import (
+        IMAGE_KINDS, StubBatchingPipeline, StubVisionPipeline, compare_results, synthetic_frame,
+        synthetic_image, time_call
+    )
+    from image_classifier import classify_image
+    
+    assert all(classify_image(synthetic_image(kind))["label"] == kind for kind in IMAGE_KINDS)
+    assert (synthetic_image("bar", seed=3) == synthetic_image("bar", seed=3)).all()
+    assert synthetic_frame(100).equals(synthetic_frame(100)) and len(synthetic_frame(100)) == 100
+    
+    stub = StubVisionPipeline()
+    results = analyze_image(stub, synthetic_image("line"), ["Q1", "Q2"])
+    assert list(results) == ["Analysis 1", "Analysis 2"] and stub.calls == 2
+    
+    # The processor-bearing stub goes through generate_batch: one call for all three rows
+    batching = StubBatchingPipeline()
+    requests = [(synthetic_image("bar"), ["Q1", "Q2"]), (synthetic_image("pie"), ["Q3"])]
+    results = analyze_requests(batching, requests, batch_size=3, max_new_tokens=5)
+    assert batching.calls == 1 and batching.rows == 3
+    answer = lambda q: f"Stub analysis (5 tokens) of: {format_llava_prompt(q)}"
+    assert [list(r.values()) for r in results] == [[answer("Q1"), answer("Q2")], [answer("Q3")]]
+    
+    timing = time_call(lambda: sum(range(1000)), repeat=3, items=1000)
+    assert timing["runs"] == 3 and timing["min_seconds"] <= timing["median_seconds"]
+    
+    baseline = {"fast": {"median_seconds": 1.0}, "gone": {"median_seconds": 1.0}}
+    current = {"fast": {"median_seconds": 1.5}, "new": {"median_seconds": 1.0}}
+    rows = compare_results(current, baseline, tolerance=0.25)
+    assert [(row["benchmark"], row["regressed"]) for row in rows] == [("fast", True)]
+    assert not compare_results(current, baseline, tolerance=0.6)[0]["regressed"]
+    
+    print("✅ Benchmark harness verified!")
+
+def test_perf_trace():
+    """Test stage tracing and the Prometheus text export"""
+    import os
+    import tempfile
+    import urllib.request
+    from perf_trace import StageMetrics, Trace, export_metrics, start_metrics_server
+    
+    metrics = StageMetrics(buckets=(0.1, 1.0))
+    trace = Trace("Design Analyzer", metrics=metrics)
+    with trace.stage("decode"):
+        sum(range(1000))
+    trace.add("model", 0.5)
+    try:
+        with trace.stage("ocr"):
+            raise RuntimeError("tesseract missing")
+    except RuntimeError:
+        pass
+    trace.finish()
+    assert [row["stage"] for row in trace.rows()] == ["decode", "model", "total"]
+    
+    text = metrics.to_prometheus()
+    assert 'crystalviz_stage_seconds_bucket{page="Design Analyzer",stage="model",le="0.1"} 0' in text
+    assert 'crystalviz_stage_seconds_bucket{page="Design Analyzer",stage="model",le="1"} 1' in text
+    assert 'crystalviz_stage_seconds_count{page="Design Analyzer",stage="decode"} 1' in text
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metrics", "crystalviz.prom")
+        export_metrics(metrics, path)
+        with open(path) as f:
+            assert "crystalviz_stage_seconds_sum" in f.read()
+    
+    # A port that is already taken logs a warning instead of raising
+    server = start_metrics_server(port=0, metrics=metrics)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert b"crystalviz_stage_seconds_count" in response.read()
+        assert start_metrics_server(port=port, metrics=metrics) is None
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    print("✅ Performance tracing verified!")
+
+def test_import_budget():
+    """Test that heavy libraries stay out of the apps' startup imports"""
+    import import_budget
+    from import_budget import import_blocks, import_report, timed_imports
+    
+    blocks = import_blocks("enhanced_ai_agent.py")
+    assert set(blocks) == {"startup", "Design Analyzer", "Text Extractor", "Data Visualizer"}
+    for app in ("enhanced_ai_agent.py", "app.py"):
+        startup = import_blocks(app)["startup"]
+        for heavy in ("pandas", "cv2", "plotly", "ocr_engine", "preprocessing", "transformers"):
+            assert heavy not in startup, f"{heavy} imported at startup by {app}"
+    assert "plotly.express" in blocks["Data Visualizer"]
+    
+    import_budget._records.pop("test page", None)
+    with timed_imports("test page"):
+        import colorsys
+    with timed_imports("test page"):
+        import colorsys
+    assert [row["page"] for row in import_report()].count("test page") <= 1
+    
+    print("✅ Import budget verified!")
+
+def test_assistant_prompt():
+    """Test that assistant prompts share one fixed prefix ahead of their retrieved rules"""
+    from assistant import ASSISTANT_PREFIX, build_assistant_prompt
+    
+    first = build_assistant_prompt("Should a bar chart start at zero?")
+    second = build_assistant_prompt("When is a table better than a graph?")
+    assert first.startswith(ASSISTANT_PREFIX) and second.startswith(ASSISTANT_PREFIX)
+    assert first.endswith("Should a bar chart start at zero?\nAnswer:")
+    assert "start at zero" in first and "start at zero" not in ASSISTANT_PREFIX
+    
+    print("✅ Assistant prompt prefix verified!")
+
+def tiny_text_pipe():
+    """Offline stand-in for the GPT-2 pipeline: a random 2-layer GPT-2 and a byte-level tokenizer"""
+    import types
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+    
+    # Byte-level tokenizer without merges, built in memory so no download is needed
+    vocab = {char: i for i, char in enumerate(sorted(pre_tokenizers.ByteLevel.alphabet()))}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, eos_token=next(iter(vocab)))
+    torch.manual_seed(0)
+    config = GPT2Config(n_layer=2, n_embd=32, n_head=2, vocab_size=len(vocab), n_positions=256,
+                        bos_token_id=0, eos_token_id=0, initializer_range=0.5)
+    return types.SimpleNamespace(model=GPT2LMHeadModel(config).eval(), tokenizer=tokenizer)
+
+def test_streaming_assistant():
+    """Test that assistant generation streams text with latency stats and surfaces errors"""
+    import types
+    from assistant import format_stats, stream_generate
+    
+    pipe = tiny_text_pipe()
+    prompt = "Question: Should bars start at zero?\nAnswer:"
+    max_length = len(pipe.tokenizer(prompt)["input_ids"]) + 12
+    stats = {}
+    chunks = list(stream_generate(pipe, prompt, max_length, stats))
+    assert chunks and all(chunks)
+    assert stats["tokens"] == 12
+    assert 0 < stats["ttft_seconds"] <= stats["total_seconds"]
+    assert stats["tokens_per_second"] > 0
+    assert "12 tokens" in format_stats(stats) and "first token" in format_stats(stats)
+    
+    # A failing generate() is raised to the caller instead of leaving the stream waiting
+    def failing_generate(**kwargs):
+        raise RuntimeError("out of memory")
+    broken = types.SimpleNamespace(model=types.SimpleNamespace(generate=failing_generate, device="cpu"),
+                                   tokenizer=pipe.tokenizer)
+    try:
+        list(stream_generate(broken, prompt, stats=stats))
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert "out of memory" in str(e)
+    
+    print("✅ Streaming assistant verified!")
+
+def test_rule_index():
+    """Test that design-rule retrieval picks the rules a question is about"""
+    import time
+    from rule_index import RuleIndex, get_rule_index, relevant_rules, rule_entries, tokenize
+    
+    assert tokenize("Repeat the column headers on multiple Pages") == ["repeat", "column", "header",
+                                                                     "multiple", "page"]
+    entries = rule_entries()
+    sources = {entry["source"] for entry in entries}
+    assert {"Table rules", "Evaluation criteria", "Graph scorecard", "Chart types to avoid"} <= sources
+    
+    start = time.perf_counter()
+    multi_page = relevant_rules("My table spans several pages, what should I repeat?")
+    assert time.perf_counter() - start < 0.05
+    assert multi_page[0]["section"] == "multi page"
+    data_issues = relevant_rules("Is it misleading to show raw numbers without rates?")
+    assert data_issues[0]["section"] == "data issues"
+    assert relevant_rules("Is a pie chart ok?")[0]["source"] == "Chart types to avoid"
+    assert len(relevant_rules("Is a pie chart ok?", k=2)) <= 2
+    
+    # Nothing in common falls back to the general graph tips
+    fallback = relevant_rules("hello there")
+    assert fallback and all(entry["section"] == "general tips" for entry in fallback)
+    assert RuleIndex([]).search("anything") == []
+    assert get_rule_index() is get_rule_index()
+    
+    print("✅ Design rule index verified!")
+
+# (label, test) pairs run by main() after the import and design-rule checks
+FUNCTIONALITY_TESTS = [
+    ("Batched analysis", test_batched_analysis),
+    ("Shared image features", test_shared_image_features),
+    ("Analysis cache", test_analysis_cache),
+    ("Model registry", test_model_registry),
+    ("int8 quantization", test_int8_quantization),
+    ("Job queue", test_job_queue),
+    ("Micro-batcher", test_micro_batcher),
+    ("Downsampling", test_downsampling),
+    ("Dataset cache", test_dataset_cache),
+    ("Figure cache", test_figure_cache),
+    ("Schema inference", test_schema_inference),
+    ("Streaming ingest", test_streaming_ingest),
+    ("Chart lint", test_chart_lint),
+    ("Image classifier", test_image_classifier),
+    ("Misleading element detector", test_misleading_detector),
+    ("Table OCR", test_table_ocr),
+    ("OCR cache", test_ocr_cache),
+    ("Image preprocessing", test_preprocessing),
+    ("Batch analyzer", test_batch_analyze),
+    ("OCR tiling", test_ocr_tiling),
+    ("OCR backend routing", test_ocr_backend_routing),
+    ("Benchmark harness", test_benchmark),
+    ("Performance tracing", test_perf_trace),
+    ("Import budget", test_import_budget),
+    ("Assistant prompt", test_assistant_prompt),
+    ("Streaming assistant", test_streaming_assistant),
+    ("Rule index", test_rule_index),
+]
+
+def run_test(label, test):
+    """Run one test function for the script summary; True when it passes"""
+    try:
+        test()
+        return True
+    except Exception as e:
+        print(f"❌ {label} error: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("🔮 CrystalViz AI Agent - System Test")
@@ -76,12 +1156,13 @@ def main():
     if imports_ok:
         # Test design rules
         rules_ok = test_design_rules()
+        results = [run_test(label, test) for label, test in FUNCTIONALITY_TESTS]
         
-        if rules_ok:
+        if all([rules_ok] + results):
             print("\n🚀 All tests passed! You can now run the AI agent:")
             print("   streamlit run enhanced_ai_agent.py")
         else:
-            print("\n❌ Design rules test failed. Please check the design_rules.py file.")
+            print("\n❌ Functionality tests failed. Please check the errors above.")
     else:
         print("\n❌ Import test failed. Please install dependencies first.")
 